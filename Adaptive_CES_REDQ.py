@@ -5,6 +5,7 @@ To use DroQ, enter the same number of M Q-functions into the algorithm (so M = 2
 enable dropout (at 0.01 or another probability), and lastly enable layer normalisation.
 """
 import argparse
+import os
 
 import joblib
 import torch
@@ -18,11 +19,17 @@ from pyro.envs import AdaptiveDesignEnv, GymEnv, normalize
 from pyro.envs.adaptive_design_env import LOWER, UPPER, TERMINAL
 from pyro.experiment import Trainer
 from pyro.models.adaptive_experiment_model import CESModel
+from pyro.models.prior_bank import PriorBank
+from pyro.modules import AdaptiveHistoryEncoder
 from pyro.policies.adaptive_tanh_gaussian_policy import AdaptiveTanhGaussianPolicy
 from pyro.q_functions.adaptive_mlp_q_function import AdaptiveMLPQFunction
 from pyro.q_functions.adaptive_lstm_q_function import AdaptiveLSTMQFunction
-from pyro.replay_buffer import PathBuffer
+from pyro.q_functions.ensemble_adaptive_mlp_q_function import \
+    EnsembleAdaptiveMLPQFunction
+from pyro.replay_buffer import EpisodeHistoryBuffer, MemmapPathBuffer, \
+    PathBuffer, PrefetchingSampler, PrioritizedPathBuffer
 from pyro.sampler.local_sampler import LocalSampler
+from pyro.sampler.multiprocessing_sampler import MultiprocessingSampler
 from pyro.sampler.vector_worker import VectorWorker
 from pyro.spaces.batch_box import BatchBox
 from pyro.util import set_seed
@@ -39,9 +46,19 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
          src_filepath=None, discount=1., d=6, alpha=None, log_info=None,
          tau=5e-3, pi_lr=3e-4, qf_lr=3e-4, buffer_capacity=int(1e6), ens_size=2,
          M=2, minibatch_size=4096, lstm_qfunction=False, dropout=0, 
-         layer_normalization=False):
+         layer_normalization=False, fused_ensemble=False,
+         shared_encoder=False, memmap_buffer=False, buffer_dir=None,
+         episode_buffer=False, sampler_workers=1,
+         async_sampling=False, max_staleness=1,
+         prefetch_batches=0, prioritized_buffer=False,
+         prior_bank_size=0, prior_bank_dir=None, prior_bank_refresh=1,
+         prior_bank_reuse=False,
+         reward_float64=False):
     if log_info is None:
         log_info = []
+    if shared_encoder and lstm_qfunction:
+        raise ValueError("a shared encoder is not supported with LSTM "
+                         "Q-functions")
 
     @wrap_experiment(log_dir=log_dir, snapshot_mode=snapshot_mode,
                      snapshot_gap=snapshot_gap)
@@ -49,7 +66,14 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
                 n_cont_samples=10, seed=0, src_filepath=None, discount=1.,
                 d=6, alpha=None, tau=5e-3, pi_lr=3e-4, qf_lr=3e-4,
                 buffer_capacity=int(1e6), ens_size=2, M=2, minibatch_size=4096, 
-                lstm_qfunction=False, dropout=0, layer_normalization=False):
+                lstm_qfunction=False, dropout=0, layer_normalization=False, fused_ensemble=False,
+                shared_encoder=False, memmap_buffer=False, buffer_dir=None,
+                episode_buffer=False, sampler_workers=1,
+                async_sampling=False, max_staleness=1,
+                prefetch_batches=0, prioritized_buffer=False,
+                prior_bank_size=0, prior_bank_dir=None, prior_bank_refresh=1,
+                prior_bank_reuse=False,
+                reward_float64=False):
         
         if log_info:
             logger.log(str(log_info))
@@ -62,6 +86,43 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
 
         set_seed(seed)
         set_rng_seed(seed)
+
+        def make_replay_buffer():
+            if memmap_buffer:
+                buffer = MemmapPathBuffer(
+                    capacity_in_transitions=buffer_capacity,
+                    directory=buffer_dir or os.path.join(ctxt.snapshot_dir,
+                                                         'replay_buffer'),
+                    persist=True)
+            elif episode_buffer:
+                buffer = EpisodeHistoryBuffer(
+                    capacity_in_transitions=buffer_capacity)
+            elif prioritized_buffer:
+                buffer = PrioritizedPathBuffer(
+                    capacity_in_transitions=buffer_capacity)
+            else:
+                buffer = PathBuffer(capacity_in_transitions=buffer_capacity)
+            if prefetch_batches > 0:
+                return PrefetchingSampler(buffer, n_prefetch=prefetch_batches)
+            return buffer
+
+        def make_sampler(policy, env):
+            if sampler_workers > 1:
+                return MultiprocessingSampler(agents=policy, envs=env,
+                                              max_episode_length=budget,
+                                              n_workers=sampler_workers)
+            return LocalSampler(agents=policy, envs=env,
+                                max_episode_length=budget,
+                                worker_class=VectorWorker)
+
+        def make_prior_bank(model):
+            if prior_bank_size > 0:
+                return PriorBank(model, prior_bank_size,
+                                 directory=prior_bank_dir,
+                                 refresh_every=prior_bank_refresh or None,
+                                 reuse=prior_bank_reuse)
+            return None
+
         # if there is a saved agent to load
         if src_filepath:
             logger.log(f"loading data from {src_filepath}")
@@ -69,12 +130,9 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
             env = data["env"]
             redq = data["algo"]
             if not hasattr(redq, "_sampler"):
-                redq._sampler = LocalSampler(agents=redq.policy, envs=env,
-                                            max_episode_length=budget,
-                                            worker_class=VectorWorker)
+                redq._sampler = make_sampler(redq.policy, env)
             if not hasattr(redq, "replay_buffer"):
-                redq.replay_buffer = PathBuffer(
-                    capacity_in_transitions=buffer_capacity)
+                redq.replay_buffer = make_replay_buffer()
             if alpha is not None:
                 redq._use_automatic_entropy_tuning = False
                 redq._fixed_alpha = alpha
@@ -95,6 +153,9 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
                         AdaptiveDesignEnv(
                             design_space, obs_space, model, budget,
                             n_cont_samples, true_model=true_model,
+                            prior_bank=make_prior_bank(model),
+                            reward_dtype=torch.float64 if reward_float64
+                            else None,
                             bound_type=bound_type),
                         normalize_obs=True
                     )
@@ -114,6 +175,7 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
                     init_std=np.sqrt(1 / 3),
                     min_std=np.exp(-20.),
                     max_std=np.exp(0.),
+                    encoder=encoder,
                 )
 
             def make_q_func():
@@ -137,17 +199,41 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
                         emitter_output_nonlinearity=None,
                         encoding_dim=layer_size//2,
                         dropout=dropout,
-                        layer_normalization=layer_normalization
+                        layer_normalization=layer_normalization,
+                        encoder=encoder
                     )
 
             env = make_env(design_space, obs_space, model, budget,
                            n_cont_samples, bound_type)
+            encoder = None
+            if shared_encoder:
+                encoder = AdaptiveHistoryEncoder(
+                    env_spec=env.spec,
+                    encoder_sizes=[layer_size, layer_size],
+                    encoder_nonlinearity=nn.ReLU,
+                    encoder_output_nonlinearity=None,
+                    encoding_dim=layer_size//2
+                )
             policy = make_policy()
-            qfs = [make_q_func() for _ in range(ens_size)]
-            replay_buffer = PathBuffer(capacity_in_transitions=buffer_capacity)
-            sampler = LocalSampler(agents=policy, envs=env,
-                                   max_episode_length=budget,
-                                   worker_class=VectorWorker)
+            if fused_ensemble:
+                qfs = EnsembleAdaptiveMLPQFunction(
+                    env_spec=env.spec,
+                    ens_size=ens_size,
+                    encoder_sizes=[layer_size, layer_size],
+                    encoder_nonlinearity=nn.ReLU,
+                    encoder_output_nonlinearity=None,
+                    emitter_sizes=[layer_size, layer_size],
+                    emitter_nonlinearity=nn.ReLU,
+                    emitter_output_nonlinearity=None,
+                    encoding_dim=layer_size//2,
+                    dropout=dropout,
+                    layer_normalization=layer_normalization,
+                    encoder=encoder
+                )
+            else:
+                qfs = [make_q_func() for _ in range(ens_size)]
+            replay_buffer = make_replay_buffer()
+            sampler = make_sampler(policy, env)
 
             redq = REDQ(env_spec=env.spec,
                       policy=policy,
@@ -166,7 +252,9 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
                       buffer_batch_size=minibatch_size,
                       reward_scale=1.,
                       M=M,
-                      ent_anneal_rate=1/1.4e4)
+                      ent_anneal_rate=1/1.4e4,
+                      async_sampling=async_sampling,
+                      max_staleness=max_staleness)
 
         redq.to()
         trainer = Trainer(snapshot_config=ctxt)
@@ -177,7 +265,19 @@ def main(n_parallel=1, budget=1, n_rl_itr=1, n_cont_samples=10, seed=0,
             n_cont_samples=n_cont_samples, seed=seed,
             src_filepath=src_filepath, discount=discount, d=d, alpha=alpha, tau=tau, pi_lr=pi_lr, qf_lr=qf_lr,
             buffer_capacity=buffer_capacity, ens_size=ens_size, M=M, minibatch_size=minibatch_size, 
-            lstm_qfunction=lstm_qfunction, dropout=dropout, layer_normalization=layer_normalization)
+            lstm_qfunction=lstm_qfunction, dropout=dropout, layer_normalization=layer_normalization,
+            fused_ensemble=fused_ensemble, shared_encoder=shared_encoder,
+               memmap_buffer=memmap_buffer, buffer_dir=buffer_dir,
+               episode_buffer=episode_buffer,
+               sampler_workers=sampler_workers,
+               async_sampling=async_sampling, max_staleness=max_staleness,
+               prefetch_batches=prefetch_batches,
+               prioritized_buffer=prioritized_buffer,
+               prior_bank_size=prior_bank_size,
+               prior_bank_dir=prior_bank_dir,
+               prior_bank_refresh=prior_bank_refresh,
+               prior_bank_reuse=prior_bank_reuse,
+               reward_float64=reward_float64)
 
     logger.dump_all()
 
@@ -219,6 +319,21 @@ if __name__ == "__main__":
     parser.add_argument("--lstm-q-function", default=False, type=str2bool)
     parser.add_argument("--layer-norm", default=False, type=str2bool)
     parser.add_argument("--dropout", default=0., type=float)
+    parser.add_argument("--fused-ensemble", default=False, type=str2bool)
+    parser.add_argument("--shared-encoder", default=False, type=str2bool)
+    parser.add_argument("--memmap-buffer", default=False, type=str2bool)
+    parser.add_argument("--buffer-dir", default=None, type=str)
+    parser.add_argument("--episode-buffer", default=False, type=str2bool)
+    parser.add_argument("--sampler-workers", default="1", type=int)
+    parser.add_argument("--async-sampling", default=False, type=str2bool)
+    parser.add_argument("--max-staleness", default="1", type=int)
+    parser.add_argument("--prefetch-batches", default="0", type=int)
+    parser.add_argument("--prioritized-buffer", default=False, type=str2bool)
+    parser.add_argument("--prior-bank-size", default="0", type=float)
+    parser.add_argument("--prior-bank-dir", default=None, type=str)
+    parser.add_argument("--prior-bank-refresh", default="1", type=int)
+    parser.add_argument("--prior-bank-reuse", default=False, type=str2bool)
+    parser.add_argument("--reward-float64", default=False, type=str2bool)
     args = parser.parse_args()
     bound_type_dict = {"lower": LOWER, "upper": UPPER, "terminal": TERMINAL}
     bound_type = bound_type_dict[args.bound_type]
@@ -234,4 +349,18 @@ if __name__ == "__main__":
          d=args.d, log_info=log_info, tau=args.tau, pi_lr=args.pi_lr,
          qf_lr=args.qf_lr, buffer_capacity=buff_cap, ens_size=args.ens_size,
          M=args.M, minibatch_size=args.minibatch_size, lstm_qfunction=args.lstm_q_function,
-         dropout=args.dropout, layer_normalization=args.layer_norm)
\ No newline at end of file
+         dropout=args.dropout, layer_normalization=args.layer_norm,
+         fused_ensemble=args.fused_ensemble,
+         shared_encoder=args.shared_encoder,
+         memmap_buffer=args.memmap_buffer, buffer_dir=args.buffer_dir,
+         episode_buffer=args.episode_buffer,
+         sampler_workers=args.sampler_workers,
+         async_sampling=args.async_sampling,
+         max_staleness=args.max_staleness,
+         prefetch_batches=args.prefetch_batches,
+         prioritized_buffer=args.prioritized_buffer,
+         prior_bank_size=int(args.prior_bank_size),
+         prior_bank_dir=args.prior_bank_dir,
+         prior_bank_refresh=args.prior_bank_refresh,
+         prior_bank_reuse=args.prior_bank_reuse,
+         reward_float64=args.reward_float64)
\ No newline at end of file
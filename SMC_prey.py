@@ -10,7 +10,6 @@ import argparse
 import datetime
 import logging
 import os
-import joblib
 
 import subprocess
 import time
@@ -19,6 +18,7 @@ import rpy2.robjects as robjects
 
 from pyro.contrib.util import rexpand
 from pyro.envs.adaptive_design_env import AdaptiveDesignEnv, UPPER, LOWER
+from pyro.experiment.results_store import ResultsStore
 from pyro.models.adaptive_experiment_model import PreyModel
 from pyro.util import set_rng_seed
 
@@ -50,6 +50,10 @@ def main(num_steps, num_reps, experiment_name, output_dir, seed, loglevel):
                                   int(1e5), bound_type=LOWER)
     env_upper = AdaptiveDesignEnv(None, torch.zeros(2), model, num_steps,
                                   int(1e5), bound_type=UPPER)
+    results_dir = os.path.join(os.path.dirname(__file__),
+                               experiment_name + '.results')
+    results_store = ResultsStore(results_dir, shard_size=num_steps)
+    results_store.clear()
     # setup R environment
     r = robjects.r
 
@@ -58,28 +62,20 @@ def main(num_steps, num_reps, experiment_name, output_dir, seed, loglevel):
         r(f'I <- {num_steps}')
         r(f'set.seed({seed+rep})')
         print(f"Begin {rep}th replicate")
-        rep_name = experiment_name + f"_{rep}"
-        results_file = rep_name + '.results'
-        results_file = os.path.join(os.path.dirname(__file__), results_file)
-        try:
-            os.remove(results_file)
-        except OSError:
-            logging.info("File {} does not exist yet".format(results_file))
         env_lower.reset(1)
         env_upper.reset(1)
         spce, snmc = 0, 0
         true_theta = env_lower.theta0
         env_upper.theta0, env_upper.thetas = env_lower.theta0, env_lower.thetas
-        d_stars = torch.tensor([])
-        y_stars = torch.tensor([])
-        spces, snmcs = torch.tensor([]), torch.tensor([])
-        results = {'git-hash': get_git_revision_hash(), 'typ': "SMC", 'seed': seed,
-                   'true_theta': true_theta}
+        results = {'git-hash': get_git_revision_hash(), 'typ': "SMC",
+                   'seed': seed, 'rep': rep}
+        results.update(('true_' + k, v) for k, v in true_theta.items())
         # initiate R loop
         r.source('scripts/R/SMC_init.R')
 
         for step in range(num_steps):
             logging.info("Step {}".format(step))
+            results['step'] = step
 
             # Compute optimal design with R code
             t = time.time()
@@ -87,18 +83,17 @@ def main(num_steps, num_reps, experiment_name, output_dir, seed, loglevel):
             r.source('scripts/R/SMC_design.R')
             elapsed = time.time() - t
             logging.info('elapsed design time {}'.format(elapsed))
+            results['design_time'] = elapsed
 
             # Grab design from R
             d_star = rexpand(torch.tensor(r['idx']).int(), 1, 1, 1)
             logging.info('design {} {}'.format(d_star.squeeze(), d_star.shape))
-            d_stars = torch.cat([d_stars, d_star], dim=-2)
-            results['d_stars'] = d_stars
+            results['d_star'] = d_star
 
             # Get experimental outcome from model
             y_star = model.run_experiment(d_star, true_theta)
             logging.info('y_star {} {}'.format(y_star.squeeze(), y_star.shape))
-            y_stars = torch.cat([y_stars, y_star], dim=-1)
-            results['y_stars'] = y_stars
+            results['y'] = y_star
 
             # Send experiment outcome to R
             r(f'data[i,2] <- {y_star.int().item()}')
@@ -110,20 +105,13 @@ def main(num_steps, num_reps, experiment_name, output_dir, seed, loglevel):
             # estimate EIG with sPCE
             spce += env_lower.get_reward(y_star, d_star)
             snmc += env_upper.get_reward(y_star, d_star)
-            spces = torch.cat([spces, spce])
-            snmcs = torch.cat([snmcs, snmc])
-            results['spces'] = spces
-            results['snmcs'] = snmcs
+            results['spce'] = spce
+            results['snmc'] = snmc
             logging.info(f"spce {spce} {spce.shape}")
             logging.info(f"snmc {snmc} {snmc.shape}")
+            results_store.append(results)
 
-
-            # save results
-            for k, v in results.items():
-                if hasattr(v, "cpu"):
-                    results[k] = v.cpu()
-            with open(results_file, 'wb') as f:
-                joblib.dump(results, f)
+    results_store.close()
 
 
 if __name__ == "__main__":
@@ -3,7 +3,6 @@ import datetime
 import joblib
 import logging
 import os
-import pickle
 import pyro
 import pyro.distributions as dist
 import pyro.optim as optim
@@ -18,7 +17,9 @@ from pyro.contrib.oed.eig import elbo_learn, opt_eig_ape_loss
 from pyro.contrib.oed.differentiable_eig import differentiable_pce_eig
 from pyro.contrib.util import iter_plates_to_shape, lexpand, rmv
 from pyro.envs.adaptive_design_env import AdaptiveDesignEnv, UPPER, LOWER
+from pyro.experiment.results_store import ResultsStore
 from pyro.models.adaptive_experiment_model import CESModel
+from pyro.models.smc_posterior import SMCPosterior
 from torch.distributions import LogNormal, Dirichlet, transform_to
 
 
@@ -61,6 +62,24 @@ def elboguide(design, dim=10):
                                         u_sig.expand(batch_shape)))
 
 
+def match_smc_moments(smc):
+    """
+    Moment-match the Dirichlet and LogNormal posteriors of the guide to the
+    particles of an SMC posterior.
+    """
+    def dirichlet_con(name):
+        mean, var = smc.get_mean_and_variance(name)
+        total = (1 - mean.pow(2).sum(-1)) / var.sum(-1).clamp(min=1e-12) - 1
+        return mean * total.unsqueeze(-1)
+
+    values, log_weights = smc.get_values_and_log_weights()
+    log_u = values["u"].log()
+    weights = log_weights.exp()
+    u_mu = (weights * log_u).sum(0)
+    u_sig = (weights * (log_u - u_mu).pow(2)).sum(0).sqrt()
+    return dirichlet_con("rho"), dirichlet_con("alpha"), u_mu, u_sig
+
+
 def neg_loss(loss):
     def new_loss(*args, **kwargs):
         return (-a for a in loss(*args, **kwargs))
@@ -70,7 +89,7 @@ def neg_loss(loss):
 
 def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
          num_gradient_steps, num_samples, num_contrast_samples, num_acquisition,
-         loglevel, policy_src):
+         loglevel, policy_src, posterior, num_particles):
     numeric_level = getattr(logging, loglevel.upper(), None)
     if not isinstance(numeric_level, int):
         raise ValueError("Invalid log level: {}".format(loglevel))
@@ -81,12 +100,10 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
         experiment_name = output_dir + "{}".format(datetime.datetime.now().isoformat())
     else:
         experiment_name = output_dir + experiment_name
-    results_file = experiment_name + '.result_stream.pickle'
-    results_file = os.path.join(os.path.dirname(__file__), results_file)
-    try:
-        os.remove(results_file)
-    except OSError:
-        logging.info("File {} does not exist yet".format(results_file))
+    results_dir = os.path.join(os.path.dirname(__file__),
+                               experiment_name + '.results')
+    results_store = ResultsStore(results_dir, shard_size=num_steps)
+    results_store.clear()
     typs = typs.split(",")
 
     for typ in typs:
@@ -111,6 +128,9 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
         env_upper.reset(num_parallel)
         spce, snmc = 0, 0
         model = CESModel(n_parallel=num_parallel)
+        if posterior == 'smc':
+            smc = SMCPosterior(CESModel(n_parallel=num_parallel),
+                               num_particles=num_particles)
         init_entropy = Dirichlet(model.rho_con_model).entropy() +\
                        Dirichlet(model.alpha_con_model).entropy() +\
                        LogNormal(model.u_mu_model, model.u_sig_model).entropy()
@@ -128,6 +148,7 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
 
         for step in range(num_steps):
             logging.info("Step {}".format(step))
+            results['step'] = step
 
             # Design phase
             t0 = time.time()
@@ -286,9 +307,12 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
             logging.info(f'y_stars {y_stars.squeeze()} {y_stars.shape}')
             results['y'] = y_star
 
-            # learn posterior with VI
+            # learn posterior with VI, or update it with SMC
             t1 = time.time()
-            if typ in ['pce', 'bo']:
+            if typ in ['pce', 'bo'] and posterior == 'smc':
+                smc.run_experiment(d_star, y_star)
+                rho_con, alpha_con, u_mu, u_sig = match_smc_moments(smc)
+            elif typ in ['pce', 'bo']:
                 model.reset(num_parallel)
                 prior = model.make_model()
                 loss = elbo_learn(
@@ -300,6 +324,7 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
                 alpha_con = pyro.param("alpha_con").detach().data.clone()
                 u_mu = pyro.param("u_mu").detach().data.clone()
                 u_sig = pyro.param("u_sig").detach().data.clone()
+            if typ in ['pce', 'bo']:
                 model.rho_con_model, model.alpha_con_model = rho_con, alpha_con
                 model.u_mu_model, model.u_sig_model = u_mu, u_sig
                 entropy = Dirichlet(model.rho_con_model).entropy() +\
@@ -321,12 +346,9 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
             logging.info(f"spce {spce} {spce.shape}")
             results['snmc'] = snmc
             logging.info(f"snmc {snmc} {snmc.shape}")
-            for k, v in results.items():
-                if hasattr(v, "cpu"):
-                    results[k] = v.cpu()
+            results_store.append(results)
 
-            with open(results_file, 'ab') as f:
-                pickle.dump(results, f)
+    results_store.close()
 
 
 if __name__ == "__main__":
@@ -345,7 +367,11 @@ if __name__ == "__main__":
     parser.add_argument("--num-contrast-samples", default=10, type=int)
     parser.add_argument("--num-acquisition", default=1, type=int)
     parser.add_argument("--policy-src", default="", type=str)
+    parser.add_argument("--posterior", default="elbo", type=str,
+                        choices=["elbo", "smc"])
+    parser.add_argument("--num-particles", default=1000, type=int)
     args = parser.parse_args()
     main(args.num_steps, args.num_parallel, args.name, args.typs, args.seed, args.lengthscale,
          args.num_gradient_steps, args.num_samples, args.num_contrast_samples,
-         args.num_acquisition, args.loglevel, args.policy_src)
+         args.num_acquisition, args.loglevel, args.policy_src, args.posterior,
+         args.num_particles)
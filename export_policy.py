@@ -0,0 +1,151 @@
+"""
+Export the policy of a training snapshot to a TorchScript module which
+proposes designs from raw histories, for use by `propose_design.py`.
+
+The module folds in what `source.py` otherwise takes from the snapshot env:
+the observation normalisation and the action scaling of `NormalizedEnv`.
+Its `forward` returns the design of the mean action, and its `sample`
+method that of a sampled action. Both take a history of shape
+`(batch_dim, history_length, obs_dim)`, whose rows are past designs and
+their outcomes in the units of the experiment, and return designs of shape
+`(batch_dim, design_dim)`.
+
+example:
+
+    python export_policy.py --src=data/local/experiment/params.pkl \
+        --dest=policy.pt
+"""
+import argparse
+import json
+
+import joblib
+import torch
+from torch import nn
+
+from garage.torch.distributions import TanhNormal
+from pyro.envs.normalized_env import NormalizedEnv
+
+# written into the exported module and read back by propose_design.py
+CONFIG_FILE = "design.json"
+
+
+def find_normalized_env(env):
+    """
+    Unwrap `env` down to its NormalizedEnv.
+    """
+    while not isinstance(env, NormalizedEnv):
+        if hasattr(env, "_env"):
+            env = env._env
+        elif hasattr(env, "env"):
+            env = env.env
+        else:
+            raise ValueError("the snapshot env has no NormalizedEnv")
+    return env
+
+
+class DesignPolicy(nn.Module):
+    """
+    A policy together with the observation normalisation and action scaling
+    of its NormalizedEnv, written with tensor operations only so that it can
+    be traced.
+
+    args:
+        policy (garage.torch.policies.StochasticPolicy): an adaptive policy
+            with `_pool` and a Gaussian `_emitter`
+        norm_env (pyro.envs.NormalizedEnv): the env the policy was trained on
+    """
+
+    def __init__(self, policy, norm_env):
+        super().__init__()
+        self.policy = policy
+        self.emitter = policy._emitter
+        self.tanh = self.emitter._norm_dist_class is TanhNormal
+        obs_low = torch.as_tensor(norm_env.observation_space.low).float()
+        obs_high = torch.as_tensor(norm_env.observation_space.high).float()
+        if not norm_env._normalize_obs:
+            obs_low, obs_high = torch.zeros_like(obs_low), \
+                torch.ones_like(obs_high)
+        self.register_buffer("obs_low", obs_low)
+        self.register_buffer("obs_range", obs_high - obs_low)
+        # the std bounds are constants of the exported module
+        self.min_log_std = None if self.emitter._min_std_param is None \
+            else self.emitter._min_std_param.item()
+        self.max_log_std = None if self.emitter._max_std_param is None \
+            else self.emitter._max_std_param.item()
+        act_low = torch.as_tensor(norm_env.action_space.low).float()
+        act_high = torch.as_tensor(norm_env.action_space.high).float()
+        self.scale_action = bool(
+            torch.isfinite(act_low).all() and torch.isfinite(act_high).all())
+        self.register_buffer("act_low", act_low.reshape(-1))
+        self.register_buffer("act_high", act_high.reshape(-1))
+        self.expected_action_scale = norm_env._expected_action_scale
+
+    def _mean_and_std(self, history):
+        obs = (history - self.obs_low) / self.obs_range
+        mean, log_std = self.emitter._get_mean_and_log_std(
+            self.policy._pool(obs))
+        if self.min_log_std is not None or self.max_log_std is not None:
+            log_std = log_std.clamp(min=self.min_log_std,
+                                    max=self.max_log_std)
+        if self.emitter._std_parameterization == "exp":
+            std = log_std.exp()
+        else:
+            std = torch.nn.functional.softplus(log_std.exp())
+        return mean, std
+
+    def _design(self, action):
+        if self.tanh:
+            action = torch.tanh(action)
+        if not self.scale_action:
+            return action
+        scale = self.expected_action_scale
+        design = self.act_low + (action + scale) * (
+            0.5 * (self.act_high - self.act_low) / scale)
+        return torch.max(torch.min(design, self.act_high), self.act_low)
+
+    def forward(self, history):
+        mean, _ = self._mean_and_std(history)
+        return self._design(mean)
+
+    def sample(self, history):
+        mean, std = self._mean_and_std(history)
+        return self._design(mean + std * torch.randn_like(mean))
+
+
+def export(policy, norm_env, dest, example_length=2):
+    """
+    Trace `policy` with the normalisation of `norm_env` and save it to
+    `dest`, along with the design shape, for `propose_design.py`.
+    """
+    module = DesignPolicy(policy, norm_env).cpu().eval()
+    obs_dim = module.obs_low.shape[-1]
+    design_shape = tuple(norm_env.action_space.shape)
+    example = module.obs_low + module.obs_range * torch.rand(
+        2, example_length, obs_dim)
+    with torch.no_grad():
+        traced = torch.jit.trace_module(
+            module, {"forward": example, "sample": example},
+            check_trace=False)
+    traced = torch.jit.freeze(traced.eval(), preserved_attrs=["sample"])
+    config = dict(obs_dim=obs_dim, design_shape=design_shape)
+    torch.jit.save(traced, dest,
+                   _extra_files={CONFIG_FILE: json.dumps(config)})
+    return traced
+
+
+def main(src, dest, example_length):
+    data = joblib.load(src)
+    print(f"loaded data from {src}")
+    policy = data['algo'].policy
+    norm_env = find_normalized_env(data['env'])
+    export(policy, norm_env, dest, example_length=example_length)
+    print(f"saved policy to {dest}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--src", type=str)
+    parser.add_argument("--dest", default="policy.pt", type=str)
+    parser.add_argument("--example-length", default=2, type=int)
+    args = parser.parse_args()
+    main(args.src, args.dest, args.example_length)
@@ -1,5 +1,6 @@
 """Garage Base."""
 # yapf: disable
+import importlib
 
 from garage._dtypes import EpisodeBatch, TimeStep, TimeStepBatch
 from garage._environment import (Environment, EnvSpec, EnvStep, InOutSpec,
@@ -7,11 +8,17 @@ from garage._environment import (Environment, EnvSpec, EnvStep, InOutSpec,
 from garage._functions import (_Default, log_multitask_performance,
                                log_performance, make_optimizer,
                                obtain_evaluation_episodes, rollout)
-from garage.experiment.experiment import wrap_experiment
-from garage.trainer import TFTrainer, Trainer
 
 # yapf: enable
 
+# the trainers import TensorFlow if it is installed, so they are only
+# imported when they are first used
+_LAZY_ATTRIBUTES = {
+    'wrap_experiment': 'garage.experiment.experiment',
+    'Trainer': 'garage.trainer',
+    'TFTrainer': 'garage.trainer',
+}
+
 __all__ = [
     '_Default',
     'make_optimizer',
@@ -32,3 +39,34 @@ __all__ = [
     'Trainer',
     'TFTrainer',
 ]
+
+
+def __getattr__(name):
+    """Import the attributes of _LAZY_ATTRIBUTES on first access (PEP 562).
+
+    Args:
+        name (str): Name of the attribute.
+
+    Returns:
+        object: The attribute.
+
+    Raises:
+        AttributeError: If the module has no such attribute.
+
+    """
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the attributes of the module, including lazy ones.
+
+    Returns:
+        list[str]: Names of the attributes.
+
+    """
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -1,14 +1,22 @@
 """Experiment functions."""
 # yapf: disable
-from garage.experiment.meta_evaluator import MetaEvaluator
+import importlib
+
 from garage.experiment.snapshotter import SnapshotConfig, Snapshotter
-from garage.experiment.task_sampler import (ConstructEnvsSampler,
-                                            EnvPoolSampler,
-                                            MetaWorldTaskSampler,
-                                            SetTaskSampler, TaskSampler)
 
 # yapf: enable
 
+# the meta evaluator and task samplers import the samplers and environments,
+# so they are only imported when they are first used
+_LAZY_ATTRIBUTES = {
+    'MetaEvaluator': 'garage.experiment.meta_evaluator',
+    'ConstructEnvsSampler': 'garage.experiment.task_sampler',
+    'EnvPoolSampler': 'garage.experiment.task_sampler',
+    'MetaWorldTaskSampler': 'garage.experiment.task_sampler',
+    'SetTaskSampler': 'garage.experiment.task_sampler',
+    'TaskSampler': 'garage.experiment.task_sampler',
+}
+
 __all__ = [
     'MetaEvaluator',
     'Snapshotter',
@@ -19,3 +27,34 @@ __all__ = [
     'SetTaskSampler',
     'MetaWorldTaskSampler',
 ]
+
+
+def __getattr__(name):
+    """Import the attributes of _LAZY_ATTRIBUTES on first access (PEP 562).
+
+    Args:
+        name (str): Name of the attribute.
+
+    Returns:
+        object: The attribute.
+
+    Raises:
+        AttributeError: If the module has no such attribute.
+
+    """
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the attributes of the module, including lazy ones.
+
+    Returns:
+        list[str]: Names of the attributes.
+
+    """
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -89,41 +89,72 @@ class Snapshotter:
             itr (int): Number of iterations. Used as the index of snapshot.
             params (obj): Content of snapshot to be saved.
 
+        """
+        file_names = self._file_names(itr)
+        if file_names:
+            self._write(params, file_names)
+
+    def _file_names(self, itr):
+        """Return the files to save the snapshot of an iteration to.
+
+        Args:
+            itr (int): Number of iterations. Used as the index of snapshot.
+
+        Returns:
+            list[str]: Paths of the files, empty if nothing is saved.
+
         Raises:
             ValueError: If snapshot_mode is not one of "all", "last", "gap",
                 "gap_overwrite", "gap_and_last", or "none".
 
         """
-        file_name = None
+        file_names = []
 
         if self._snapshot_mode == 'all':
-            file_name = os.path.join(self._snapshot_dir, 'itr_%d.pkl' % itr)
+            file_names.append(
+                os.path.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
         elif self._snapshot_mode == 'gap_overwrite':
             if itr % self._snapshot_gap == 0:
-                file_name = os.path.join(self._snapshot_dir, 'params.pkl')
+                file_names.append(
+                    os.path.join(self._snapshot_dir, 'params.pkl'))
         elif self._snapshot_mode == 'last':
             # override previous params
-            file_name = os.path.join(self._snapshot_dir, 'params.pkl')
+            file_names.append(os.path.join(self._snapshot_dir, 'params.pkl'))
         elif self._snapshot_mode == 'gap':
             if itr % self._snapshot_gap == 0:
-                file_name = os.path.join(self._snapshot_dir,
-                                         'itr_%d.pkl' % itr)
+                file_names.append(
+                    os.path.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
         elif self._snapshot_mode == 'gap_and_last':
+            file_names.append(os.path.join(self._snapshot_dir, 'params.pkl'))
             if itr % self._snapshot_gap == 0:
-                file_name = os.path.join(self._snapshot_dir,
-                                         'itr_%d.pkl' % itr)
-            file_name_last = os.path.join(self._snapshot_dir, 'params.pkl')
-            with open(file_name_last, 'wb') as file:
-                cloudpickle.dump(params, file)
+                file_names.append(
+                    os.path.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
         elif self._snapshot_mode == 'none':
             pass
         else:
             raise ValueError('Invalid snapshot mode {}'.format(
                 self._snapshot_mode))
 
-        if file_name:
-            with open(file_name, 'wb') as file:
-                cloudpickle.dump(params, file)
+        return file_names
+
+    @staticmethod
+    def _write(params, file_names):
+        """Pickle params to every file.
+
+        Every file is written under a temporary name first and then renamed,
+        so that an interrupted write never leaves a truncated snapshot.
+
+        Args:
+            params (obj): Content of snapshot to be saved.
+            file_names (list[str]): Paths of the files.
+
+        """
+        data = cloudpickle.dumps(params)
+        for file_name in file_names:
+            tmp_name = file_name + '.tmp'
+            with open(tmp_name, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_name, file_name)
 
     def load(self, load_dir, itr='last'):
         # pylint: disable=no-self-use
@@ -1,5 +1,7 @@
 """Samplers which run agents in environments."""
 # yapf: disable
+import importlib
+
 from garage.sampler._dtypes import InProgressEpisode
 from garage.sampler._functions import _apply_env_update
 from garage.sampler.default_worker import DefaultWorker
@@ -10,7 +12,6 @@ from garage.sampler.env_update import (EnvUpdate,
 from garage.sampler.fragment_worker import FragmentWorker
 from garage.sampler.local_sampler import LocalSampler
 from garage.sampler.multiprocessing_sampler import MultiprocessingSampler
-from garage.sampler.ray_sampler import RaySampler
 from garage.sampler.sampler import Sampler
 from garage.sampler.vec_worker import VecWorker
 from garage.sampler.worker import Worker
@@ -18,6 +19,11 @@ from garage.sampler.worker_factory import WorkerFactory
 
 # yapf: enable
 
+# ray is only imported when RaySampler is first used
+_LAZY_ATTRIBUTES = {
+    'RaySampler': 'garage.sampler.ray_sampler',
+}
+
 __all__ = [
     '_apply_env_update',
     'InProgressEpisode',
@@ -35,3 +41,34 @@ __all__ = [
     'SetTaskUpdate',
     'ExistingEnvUpdate',
 ]
+
+
+def __getattr__(name):
+    """Import the attributes of _LAZY_ATTRIBUTES on first access (PEP 562).
+
+    Args:
+        name (str): Name of the attribute.
+
+    Returns:
+        object: The attribute.
+
+    Raises:
+        AttributeError: If the module has no such attribute.
+
+    """
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the attributes of the module, including lazy ones.
+
+    Returns:
+        list[str]: Names of the attributes.
+
+    """
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
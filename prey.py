@@ -2,7 +2,6 @@ import argparse
 import datetime
 import logging
 import os
-import pickle
 import pyro
 import pyro.distributions as dist
 import pyro.optim as optim
@@ -15,6 +14,7 @@ from functools import partial
 from pyro.contrib.oed.eig import elbo_learn
 from pyro.contrib.util import iter_plates_to_shape, lexpand, rexpand
 from pyro.envs.adaptive_design_env import AdaptiveDesignEnv, UPPER, LOWER
+from pyro.experiment.results_store import ResultsStore
 from pyro.models.adaptive_experiment_model import PreyModel
 from torch.distributions import LogNormal
 
@@ -61,12 +61,10 @@ def main(num_steps, num_parallel, experiment_name, typs, seed,
         experiment_name = output_dir + "{}".format(datetime.datetime.now().isoformat())
     else:
         experiment_name = output_dir + experiment_name
-    results_file = experiment_name + '.result_stream.pickle'
-    results_file = os.path.join(os.path.dirname(__file__), results_file)
-    try:
-        os.remove(results_file)
-    except OSError:
-        logging.info("File {} does not exist yet".format(results_file))
+    results_dir = os.path.join(os.path.dirname(__file__),
+                               experiment_name + '.results')
+    results_store = ResultsStore(results_dir, shard_size=num_steps)
+    results_store.clear()
     typs = typs.split(",")
 
     for typ in typs:
@@ -193,12 +191,9 @@ def main(num_steps, num_parallel, experiment_name, typs, seed,
             logging.info(f"spce {spce} {spce.shape}")
             results['snmc'] = snmc
             logging.info(f"snmc {snmc} {snmc.shape}")
-            for k, v in results.items():
-                if hasattr(v, "cpu"):
-                    results[k] = v.cpu()
+            results_store.append(results)
 
-            with open(results_file, 'ab') as f:
-                pickle.dump(results, f)
+    results_store.close()
 
 
 if __name__ == "__main__":
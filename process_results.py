@@ -1,3 +1,4 @@
+import ast
 import csv
 import argparse
 import numpy as np
@@ -10,7 +11,7 @@ def str_to_np(arr_str):
 		','.join(arr_str.strip("[]").strip().split()),
 		']'
 	])
-	return np.array(eval(arr_str))
+	return np.array(ast.literal_eval(arr_str))
 
 def main(fpaths, dest):
 	fpaths = fpaths.split(", ")
@@ -0,0 +1,88 @@
+"""
+Propose the next design of an experiment with a policy exported by
+`export_policy.py`.
+
+Only torch is needed: the exported module holds the policy together with
+the normalisation of its env, so neither the snapshot, garage nor the
+experiment model are loaded.
+
+    >>> proposer = DesignProposer("policy.pt")
+    >>> design = proposer(history)
+
+example:
+
+    python propose_design.py --policy=policy.pt --history=history.pt
+"""
+import argparse
+import json
+import time
+
+import torch
+
+# see export_policy.py
+CONFIG_FILE = "design.json"
+
+
+class DesignProposer:
+    """
+    Proposes designs from raw histories with an exported policy.
+
+    args:
+        path (str): the file written by `export_policy.py`
+        device (str or torch.device): device to run the policy on
+    """
+
+    def __init__(self, path, device="cpu"):
+        extra_files = {CONFIG_FILE: ""}
+        self.module = torch.jit.load(path, map_location=device,
+                                     _extra_files=extra_files)
+        config = json.loads(extra_files[CONFIG_FILE])
+        self.obs_dim = config["obs_dim"]
+        self.design_shape = tuple(config["design_shape"])
+        self.device = device
+
+    def __call__(self, history, deterministic=True):
+        """
+        Propose the next design for each history of shape
+        `(batch_dim, history_length, obs_dim)`, or `(history_length, obs_dim)`
+        for a single experiment. Designs have shape
+        `(batch_dim,) + design_shape[1:]`. With `deterministic=False` the
+        action is sampled rather than the mean of the policy.
+        """
+        history = torch.as_tensor(history, dtype=torch.float32,
+                                  device=self.device)
+        if history.dim() == 2:
+            history = history.unsqueeze(0)
+        history = history.reshape(history.shape[0], -1, self.obs_dim)
+        # the profiling executor recompiles the first calls, which costs
+        # more than it gains for networks of this size
+        with torch.no_grad(), torch.jit.optimized_execution(False):
+            if deterministic:
+                design = self.module(history)
+            else:
+                design = self.module.sample(history)
+        return design.reshape((history.shape[0],) + self.design_shape[1:])
+
+
+def main(policy, history, stochastic):
+    start = time.perf_counter()
+    proposer = DesignProposer(policy)
+    loaded = time.perf_counter()
+    if history is None:
+        history = torch.zeros((1, 0, proposer.obs_dim))
+    else:
+        history = torch.load(history)
+    design = proposer(history, deterministic=not stochastic)
+    end = time.perf_counter()
+    print(f"load time {1e3 * (loaded - start):.1f} ms, "
+          f"design time {1e3 * (end - loaded):.1f} ms")
+    print(design)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policy", default="policy.pt", type=str)
+    parser.add_argument("--history", default=None, type=str)
+    parser.add_argument("--stochastic", action="store_true")
+    args = parser.parse_args()
+    main(args.policy, args.history, args.stochastic)
@@ -4,9 +4,15 @@ from pyro.poutine import condition, do, markov
 from pyro.primitives import (clear_param_store, enable_validation, factor, get_param_store, iarange, irange, module,
                              param, plate, plate_stack, random_module, sample, validation_enabled)
 from pyro.util import set_rng_seed
-from pyro._dtypes import EpisodeBatch
-from pyro._functions import log_performance
-from pyro.experiment.experiment import wrap_experiment
+from pyro._lazy import lazy_attributes
+
+# the RL and experiment helpers import garage, so they are only imported when
+# they are first used
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'EpisodeBatch': 'pyro._dtypes',
+    'log_performance': 'pyro._functions',
+    'wrap_experiment': 'pyro.experiment.experiment',
+})
 
 
 version_prefix = '0.4.1'
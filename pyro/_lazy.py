@@ -0,0 +1,35 @@
+"""Lazy loading of package attributes."""
+import importlib
+
+
+def lazy_attributes(package, attributes):
+    """Make attributes of a package import their module on first access.
+
+    Uses the module `__getattr__` and `__dir__` of PEP 562, so that
+    importing a package does not import all of its modules.
+
+    Args:
+        package (str): Name of the package, i.e. its `__name__`.
+        attributes (dict[str, str]): Module each attribute is defined in.
+
+    Returns:
+        tuple:
+            * callable: The `__getattr__` of the package.
+            * callable: The `__dir__` of the package.
+
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(
+                package, name))
+        value = getattr(importlib.import_module(attributes[name]), name)
+        # later accesses do not go through __getattr__
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__
@@ -1,11 +1,15 @@
 """RL algorithms."""
-from pyro.algos.dqn import DQN
-from pyro.algos.rem import REM
-from pyro.algos.redq import REDQ
-from pyro.algos.sbr import SBR
-from pyro.algos.vpg import VPG
-from pyro.algos.trpo import TRPO
-from pyro.algos.ppo import PPO
+from pyro._lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'DQN': 'pyro.algos.dqn',
+    'REM': 'pyro.algos.rem',
+    'REDQ': 'pyro.algos.redq',
+    'SBR': 'pyro.algos.sbr',
+    'VPG': 'pyro.algos.vpg',
+    'TRPO': 'pyro.algos.trpo',
+    'PPO': 'pyro.algos.ppo',
+})
 
 __all__ = [
     'DQN',
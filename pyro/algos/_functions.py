@@ -2,6 +2,7 @@
 import numpy as np
 import torch
 
+from pyro.dowel import tabular
 from pyro.sampler.utils import rollout
 from pyro._dtypes import EpisodeBatch
 
@@ -48,6 +49,26 @@ def obtain_evaluation_episodes(policy, env, max_path_length=1000,
                         agent_infos=path["agent_infos"],
                         lengths=lengths)
 
+def log_wall_clock(sampling_intervals, learning_intervals):
+    """Record the wall-clock time spent sampling and learning in an epoch.
+
+    Args:
+        sampling_intervals (list[tuple[float, float]]): (start, end) times of
+            every sampler call.
+        learning_intervals (list[tuple[float, float]]): (start, end) times of
+            every block of gradient steps.
+
+    """
+    overlap = sum(max(0., min(s_end, l_end) - max(s_start, l_start))
+                  for s_start, s_end in sampling_intervals
+                  for l_start, l_end in learning_intervals)
+    tabular.record('Time/Sampling',
+                   sum(end - start for start, end in sampling_intervals))
+    tabular.record('Time/Learning',
+                   sum(end - start for start, end in learning_intervals))
+    tabular.record('Time/Overlap', overlap)
+
+
 """Interface of RLAlgorithm."""
 
 class RLAlgorithm(abc.ABC):
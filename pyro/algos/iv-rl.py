@@ -11,6 +11,8 @@ import time
 
 from pyro import log_performance
 from pyro.algos._functions import obtain_evaluation_episodes, RLAlgorithm
+from pyro.q_functions.ensemble_adaptive_mlp_q_function import \
+    EnsembleAdaptiveMLPQFunction
 
 #from garage.np.algos import RLAlgorithm
 #from garage.torch import as_torch_dict, global_device
@@ -32,7 +34,10 @@ class REDQ(RLAlgorithm):
         policy (garage.torch.policy.Policy): Policy/Actor/Agent that is being
             optimized by SAC.
         qfs [(garage.torch.q_function.ContinuousMLPQFunction)]: list of
-            QFunctions used for actor/policy optimization.
+            QFunctions used for actor/policy optimization. An
+            EnsembleAdaptiveMLPQFunction may be passed instead, in which case
+            the whole ensemble is evaluated, optimized and Polyak-averaged
+            in fused calls.
         replay_buffer (ReplayBuffer): Stores transitions that are previously
             collected by the sampler.
         sampler (garage.sampler.Sampler): Sampler.
@@ -144,11 +149,10 @@ class REDQ(RLAlgorithm):
 
         self._reward_scale = reward_scale
         # use ensemble of target q networks
-        self._target_qfs = [copy.deepcopy(q) for q in self._qfs]
+        self._target_qfs = copy.deepcopy(self._qfs)
         self._policy_optimizer = self._optimizer(self.policy.parameters(),
                                                  lr=self._policy_lr)
-        self._qf_optimizers = [
-            self._optimizer(q.parameters(), lr=self._qf_lr) for q in self._qfs]
+        self._qf_optimizers = self._make_qf_optimizers()
         # automatic entropy coefficient tuning
         self._use_automatic_entropy_tuning = fixed_alpha is None
         self._fixed_alpha = fixed_alpha
@@ -167,6 +171,37 @@ class REDQ(RLAlgorithm):
         self.episode_rewards = deque(maxlen=30)
         self._ent_anneal_rate = ent_anneal_rate
 
+    @property
+    def _fused_qfs(self):
+        """bool: Whether the critics are one EnsembleAdaptiveMLPQFunction."""
+        return isinstance(self._qfs, EnsembleAdaptiveMLPQFunction)
+
+    @staticmethod
+    def _qf_list(qfs):
+        """Return the critics in `qfs` as a list of networks."""
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return [qfs]
+        return list(qfs)
+
+    def _make_qf_optimizers(self):
+        """Create one optimizer per critic, or a single fused optimizer for
+        an EnsembleAdaptiveMLPQFunction."""
+        return [self._optimizer(q.parameters(), lr=self._qf_lr)
+                for q in self._qf_list(self._qfs)]
+
+    def _q_values(self, qfs, obs, actions, mask, idx=None):
+        """Stack the Q-values of the critics in `qfs` selected by `idx`.
+
+        Returns:
+            torch.Tensor: Q-values of shape (n_critics, N, 1).
+
+        """
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return qfs(obs, actions, mask, idx=idx)
+        if idx is not None:
+            qfs = [qfs[i] for i in idx]
+        return torch.stack([q(obs, actions, mask) for q in qfs])
+
     def train(self, trainer):
         """Obtain samplers and start actual training for each epoch.
 
@@ -187,19 +222,12 @@ class REDQ(RLAlgorithm):
                     batch_size = int(self._min_buffer_size)
                 else:
                     batch_size = None
-                trainer.step_episode = trainer.obtain_samples(
-                    trainer.step_itr, batch_size)
-                path_returns = []
-                for path in trainer.step_episode:
-                    self.replay_buffer.add_path(
-                        dict(observation=path['observations'],
-                             action=path['actions'],
-                             reward=path['rewards'].reshape(-1, 1),
-                             next_observation=path['next_observations'],
-                             terminal=path['step_types'].reshape(-1, 1),
-                             mask=path['masks'],
-                             next_mask=path['next_masks'],))
-                    path_returns.append(sum(path['rewards']))
+                episodes = trainer.obtain_episodes(trainer.step_itr,
+                                                   batch_size)
+                trainer.step_episode = episodes.to_list()
+                self.replay_buffer.add_episode_batch(episodes)
+                path_returns = [sum(path['rewards'])
+                                for path in trainer.step_episode]
                 assert len(path_returns) == len(trainer.step_episode)
                 allrets = torch.tensor(
                     [path["rewards"].sum() for path in trainer.step_episode]
@@ -387,7 +415,7 @@ class REDQ(RLAlgorithm):
             policy_objective = policy_objective.sum(axis=1).mean()
         else:
             min_q_new_actions = torch.min(
-                torch.stack([q(obs, new_actions, mask) for q in self._qfs]),
+                self._q_values(self._qfs, obs, new_actions, mask),
                 dim=0).values
             policy_objective = ((alpha * log_pi_new_actions) -
                                 min_q_new_actions.flatten()).mean()
@@ -437,9 +465,9 @@ class REDQ(RLAlgorithm):
         # use random ensemble of q functions
         with torch.no_grad():
             m_idx = np.random.choice(len(self._qfs), self._M, replace=False)
-            in_target_qfs = [self._target_qfs[i] for i in m_idx]
             # get exact expectation for discrete action spaces
             if self.env_spec.action_space.is_discrete:
+                in_target_qfs = [self._target_qfs[i] for i in m_idx]
                 target_q_values = torch.min(
                     torch.stack([
                         q(next_obs, mask=next_mask) for q in in_target_qfs
@@ -450,19 +478,28 @@ class REDQ(RLAlgorithm):
                 target_q_values = (target_q_values * new_pi).sum(axis=1)
             else:
                 target_q_values = torch.min(
-                    torch.stack([
-                        q(next_obs, next_actions, next_mask) for q in in_target_qfs
-                    ]),
+                    self._q_values(self._target_qfs, next_obs, next_actions,
+                                   next_mask, idx=m_idx),
                     dim=0
                 ).values.flatten() - (alpha * new_log_pi)
             q_target = rewards * self._reward_scale + (
                     1. - terminals) * self._discount * target_q_values
-        q_preds = [q(obs, actions, mask) for q in self._qfs]
+        if self._fused_qfs:
+            q_preds = self._qfs(obs, actions, mask)
+        else:
+            q_preds = [q(obs, actions, mask) for q in self._qfs]
         qf_losses = [F.mse_loss(pred.flatten(), q_target) for pred in q_preds]
         return qf_losses
 
     def _update_targets(self):
         """Update parameters in the target q-functions."""
+        if self._fused_qfs:
+            with torch.no_grad():
+                t_params = list(self._target_qfs.parameters())
+                torch._foreach_mul_(t_params, 1.0 - self._tau)
+                torch._foreach_add_(t_params, list(self._qfs.parameters()),
+                                    alpha=self._tau)
+            return
         for target_qf, qf in zip(self._target_qfs, self._qfs):
             for t_param, param in zip(target_qf.parameters(), qf.parameters()):
                 t_param.data.copy_(t_param.data * (1.0 - self._tau) +
@@ -495,10 +532,15 @@ class REDQ(RLAlgorithm):
         mask = samples_data['mask']
         # train critic
         qf_losses = self._critic_objective(samples_data)
-        for i in range(len(qf_losses)):
-            self._qf_optimizers[i].zero_grad()
-            qf_losses[i].backward()
-            self._qf_optimizers[i].step()
+        if self._fused_qfs:
+            self._qf_optimizers[0].zero_grad()
+            torch.stack(qf_losses).sum().backward()
+            self._qf_optimizers[0].step()
+        else:
+            for i in range(len(qf_losses)):
+                self._qf_optimizers[i].zero_grad()
+                qf_losses[i].backward()
+                self._qf_optimizers[i].step()
 
         # train actor
         action_dists = self.policy(obs, mask)[0]
@@ -585,7 +627,8 @@ class REDQ(RLAlgorithm):
 
         """
         return [
-            self.policy, *self._qfs, *self._target_qfs
+            self.policy, *self._qf_list(self._qfs),
+            *self._qf_list(self._target_qfs)
         ]
 
     def to(self, device=None):
@@ -610,6 +653,6 @@ class REDQ(RLAlgorithm):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['_sampler']
-        del state['replay_buffer']
+        state.pop('_sampler', None)
+        state.pop('replay_buffer', None)
         return state
@@ -1,6 +1,7 @@
 """This modules creates a redq model in PyTorch."""
 # yapf: disable
 from collections import deque
+import contextlib
 import copy
 
 from pyro.dowel import tabular
@@ -10,7 +11,11 @@ import torch.nn.functional as F
 import time
 
 from pyro import log_performance
-from pyro.algos._functions import obtain_evaluation_episodes, RLAlgorithm
+from pyro.algos._functions import log_wall_clock, \
+    obtain_evaluation_episodes, RLAlgorithm
+from pyro.q_functions.ensemble_adaptive_mlp_q_function import \
+    EnsembleAdaptiveMLPQFunction
+from pyro.sampler.async_sampler import AsyncSampler
 
 #from garage.np.algos import RLAlgorithm
 #from garage.torch import as_torch_dict, global_device
@@ -32,7 +37,13 @@ class REDQ(RLAlgorithm):
         policy (garage.torch.policy.Policy): Policy/Actor/Agent that is being
             optimized by SAC.
         qfs [(garage.torch.q_function.ContinuousMLPQFunction)]: list of
-            QFunctions used for actor/policy optimization.
+            QFunctions used for actor/policy optimization. An
+            EnsembleAdaptiveMLPQFunction may be passed instead, in which case
+            the whole ensemble is evaluated, optimized and Polyak-averaged
+            in fused calls.
+            Critics (and the policy) built around one shared
+            AdaptiveHistoryEncoder are trained by a single optimizer and
+            encode each minibatch once per gradient step.
         replay_buffer (ReplayBuffer): Stores transitions that are previously
             collected by the sampler.
         sampler (garage.sampler.Sampler): Sampler.
@@ -79,6 +90,12 @@ class REDQ(RLAlgorithm):
         M (int): in-target minimization parameter
         ent_anneal_rate (float): the rate at which to anneal the target entropy
             in each iteration of the algorithm.
+        async_sampling (bool): If True, sample episodes in a background
+            thread while the gradient steps run, with a policy snapshot that
+            may be slightly stale.
+        max_staleness (int): Number of policy updates by which the policy
+            that sampled a batch may lag behind the learner, if
+            async_sampling.
 
     """
 
@@ -109,7 +126,9 @@ class REDQ(RLAlgorithm):
             eval_env=None,
             use_deterministic_evaluation=True,
             M=2,
-            ent_anneal_rate=0.):
+            ent_anneal_rate=0.,
+            async_sampling=False,
+            max_staleness=1):
 
         self._qfs = qfs
         self.replay_buffer = replay_buffer
@@ -141,14 +160,15 @@ class REDQ(RLAlgorithm):
         self.replay_buffer = replay_buffer
 
         self._sampler = sampler
+        if async_sampling:
+            self._sampler = AsyncSampler(sampler, policy, max_staleness)
 
         self._reward_scale = reward_scale
         # use ensemble of target q networks
-        self._target_qfs = [copy.deepcopy(q) for q in self._qfs]
-        self._policy_optimizer = self._optimizer(self.policy.parameters(),
+        self._target_qfs = copy.deepcopy(self._qfs)
+        self._policy_optimizer = self._optimizer(self._policy_parameters(),
                                                  lr=self._policy_lr)
-        self._qf_optimizers = [
-            self._optimizer(q.parameters(), lr=self._qf_lr) for q in self._qfs]
+        self._qf_optimizers = self._make_qf_optimizers()
         # automatic entropy coefficient tuning
         self._use_automatic_entropy_tuning = fixed_alpha is None
         self._fixed_alpha = fixed_alpha
@@ -167,6 +187,88 @@ class REDQ(RLAlgorithm):
         self.episode_rewards = deque(maxlen=30)
         self._ent_anneal_rate = ent_anneal_rate
 
+    @property
+    def _fused_qfs(self):
+        """bool: Whether the critics are one EnsembleAdaptiveMLPQFunction."""
+        return isinstance(self._qfs, EnsembleAdaptiveMLPQFunction)
+
+    @staticmethod
+    def _qf_list(qfs):
+        """Return the critics in `qfs` as a list of networks."""
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return [qfs]
+        return list(qfs)
+
+    @property
+    def _shared_encoder(self):
+        """AdaptiveHistoryEncoder: Encoder shared by the critics, or None."""
+        return getattr(self._qf_list(self._qfs)[0], 'shared_encoder', None)
+
+    @property
+    def _joint_qf_update(self):
+        """bool: Whether all critics are trained by a single optimizer."""
+        return self._fused_qfs or self._shared_encoder is not None
+
+    @staticmethod
+    def _unique_parameters(nets, exclude=()):
+        """Return the parameters of `nets`, counting shared modules once."""
+        seen = {id(param) for param in exclude}
+        params = []
+        for net in nets:
+            for param in net.parameters():
+                if id(param) not in seen:
+                    seen.add(id(param))
+                    params.append(param)
+        return params
+
+    def _policy_parameters(self):
+        """Return the policy parameters, without an encoder it shares with
+        the critics (that encoder is trained by the critic loss)."""
+        encoder = getattr(self.policy, 'shared_encoder', None)
+        if encoder is None:
+            return self.policy.parameters()
+        if encoder is not self._shared_encoder:
+            raise ValueError('the encoder of the policy must be shared with '
+                             'the Q-functions, which train it')
+        return self._unique_parameters([self.policy],
+                                       exclude=encoder.parameters())
+
+    def _make_qf_optimizers(self):
+        """Create one optimizer per critic, or a single optimizer when the
+        critics are an EnsembleAdaptiveMLPQFunction or share an encoder."""
+        if self._shared_encoder is not None:
+            return [self._optimizer(
+                self._unique_parameters(self._qf_list(self._qfs)),
+                lr=self._qf_lr)]
+        return [self._optimizer(q.parameters(), lr=self._qf_lr)
+                for q in self._qf_list(self._qfs)]
+
+    def _encoder_cache(self):
+        """Return a context in which every shared encoder encodes each
+        minibatch of histories only once."""
+        stack = contextlib.ExitStack()
+        encoders = {}
+        for net in self.networks:
+            encoder = getattr(net, 'shared_encoder', None)
+            if encoder is not None:
+                encoders[id(encoder)] = encoder
+        for encoder in encoders.values():
+            stack.enter_context(encoder.cached())
+        return stack
+
+    def _q_values(self, qfs, obs, actions, mask, idx=None):
+        """Stack the Q-values of the critics in `qfs` selected by `idx`.
+
+        Returns:
+            torch.Tensor: Q-values of shape (n_critics, N, 1).
+
+        """
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return qfs(obs, actions, mask, idx=idx)
+        if idx is not None:
+            qfs = [qfs[i] for i in idx]
+        return torch.stack([q(obs, actions, mask) for q in qfs])
+
     def train(self, trainer):
         """Obtain samplers and start actual training for each epoch.
 
@@ -181,25 +283,21 @@ class REDQ(RLAlgorithm):
         """
         last_return = None
         for _ in trainer.step_epochs():
+            sampling_intervals, learning_intervals = [], []
             for _ in range(self._steps_per_epoch):
                 if not (self.replay_buffer.n_transitions_stored >=
                         self._min_buffer_size):
                     batch_size = int(self._min_buffer_size)
                 else:
                     batch_size = None
-                trainer.step_episode = trainer.obtain_samples(
-                    trainer.step_itr, batch_size)
-                path_returns = []
-                for path in trainer.step_episode:
-                    self.replay_buffer.add_path(
-                        dict(observation=path['observations'],
-                             action=path['actions'],
-                             reward=path['rewards'].reshape(-1, 1),
-                             next_observation=path['next_observations'],
-                             terminal=path['step_types'].reshape(-1, 1),
-                             mask=path['masks'],
-                             next_mask=path['next_masks'],))
-                    path_returns.append(sum(path['rewards']))
+                start = time.perf_counter()
+                episodes = trainer.obtain_episodes(trainer.step_itr,
+                                                   batch_size)
+                sampling_intervals.append((start, time.perf_counter()))
+                trainer.step_episode = episodes.to_list()
+                self.replay_buffer.add_episode_batch(episodes)
+                path_returns = [sum(path['rewards'])
+                                for path in trainer.step_episode]
                 assert len(path_returns) == len(trainer.step_episode)
                 allrets = torch.tensor(
                     [path["rewards"].sum() for path in trainer.step_episode]
@@ -209,12 +307,17 @@ class REDQ(RLAlgorithm):
                 ).cpu().numpy()
                 self.episode_rewards.append(
                     torch.stack(path_returns).mean().cpu().numpy())
+                start = time.perf_counter()
                 for _ in range(self._gradient_steps):
                     policy_loss, qf_losses, entropy = self.train_once()
+                learning_intervals.append((start, time.perf_counter()))
             last_return = allrets
             if self._eval_env is not None:
                 last_return = self._evaluate_policy(trainer.step_itr)
             self._log_statistics(policy_loss, qf_losses, entropy)
+            if isinstance(self._sampler, AsyncSampler):
+                sampling_intervals = self._sampler.pop_sampling_intervals()
+            log_wall_clock(sampling_intervals, learning_intervals)
             self._discount = np.clip(self._discount + self._discount_delta,
                                      a_min=0., a_max=1.)
             tabular.record('TotalEnvSteps', trainer.total_env_steps)
@@ -387,7 +490,7 @@ class REDQ(RLAlgorithm):
             policy_objective = policy_objective.sum(axis=1).mean()
         else:
             min_q_new_actions = torch.min(
-                torch.stack([q(obs, new_actions, mask) for q in self._qfs]),
+                self._q_values(self._qfs, obs, new_actions, mask),
                 dim=0).values
             policy_objective = ((alpha * log_pi_new_actions) -
                                 min_q_new_actions.flatten()).mean()
@@ -437,9 +540,9 @@ class REDQ(RLAlgorithm):
         # use random ensemble of q functions
         with torch.no_grad():
             m_idx = np.random.choice(len(self._qfs), self._M, replace=False)
-            in_target_qfs = [self._target_qfs[i] for i in m_idx]
             # get exact expectation for discrete action spaces
             if self.env_spec.action_space.is_discrete:
+                in_target_qfs = [self._target_qfs[i] for i in m_idx]
                 target_q_values = torch.min(
                     torch.stack([
                         q(next_obs, mask=next_mask) for q in in_target_qfs
@@ -450,23 +553,42 @@ class REDQ(RLAlgorithm):
                 target_q_values = (target_q_values * new_pi).sum(axis=1)
             else:
                 target_q_values = torch.min(
-                    torch.stack([
-                        q(next_obs, next_actions, next_mask) for q in in_target_qfs
-                    ]),
+                    self._q_values(self._target_qfs, next_obs, next_actions,
+                                   next_mask, idx=m_idx),
                     dim=0
                 ).values.flatten() - (alpha * new_log_pi)
             q_target = rewards * self._reward_scale + (
                     1. - terminals) * self._discount * target_q_values
-        q_preds = [q(obs, actions, mask) for q in self._qfs]
+        if self._fused_qfs:
+            q_preds = self._qfs(obs, actions, mask)
+        else:
+            q_preds = [q(obs, actions, mask) for q in self._qfs]
+        if 'weight' in samples_data:
+            # prioritised replay: importance-weight the losses and refresh
+            # the priorities of the batch with its TD errors
+            weights = samples_data['weight'].flatten()
+            td_errors = [pred.flatten() - q_target for pred in q_preds]
+            self.replay_buffer.update_priorities(
+                samples_data['index'],
+                torch.stack(td_errors).detach().abs().mean(dim=0))
+            return [(weights * td_error ** 2).mean() for td_error in td_errors]
         qf_losses = [F.mse_loss(pred.flatten(), q_target) for pred in q_preds]
         return qf_losses
 
     def _update_targets(self):
         """Update parameters in the target q-functions."""
-        for target_qf, qf in zip(self._target_qfs, self._qfs):
-            for t_param, param in zip(target_qf.parameters(), qf.parameters()):
-                t_param.data.copy_(t_param.data * (1.0 - self._tau) +
-                                   param.data * self._tau)
+        if self._fused_qfs:
+            with torch.no_grad():
+                t_params = list(self._target_qfs.parameters())
+                torch._foreach_mul_(t_params, 1.0 - self._tau)
+                torch._foreach_add_(t_params, list(self._qfs.parameters()),
+                                    alpha=self._tau)
+            return
+        # a shared encoder must only be averaged once per update
+        for t_param, param in zip(self._unique_parameters(self._target_qfs),
+                                  self._unique_parameters(self._qfs)):
+            t_param.data.copy_(t_param.data * (1.0 - self._tau) +
+                               param.data * self._tau)
 
     def optimize_policy(self, samples_data):
         """Optimize the policy q_functions, and temperature coefficient.
@@ -494,24 +616,31 @@ class REDQ(RLAlgorithm):
         obs = samples_data['observation']
         mask = samples_data['mask']
         # train critic
-        qf_losses = self._critic_objective(samples_data)
-        for i in range(len(qf_losses)):
-            self._qf_optimizers[i].zero_grad()
-            qf_losses[i].backward()
-            self._qf_optimizers[i].step()
-
-        # train actor
-        action_dists = self.policy(obs, mask)[0]
-        if hasattr(action_dists, 'rsample_with_pre_tanh_value'):
-            new_actions_pre_tanh, new_actions = (
-                action_dists.rsample_with_pre_tanh_value())
-            log_pi_new_actions = action_dists.log_prob(
-                value=new_actions, pre_tanh_value=new_actions_pre_tanh)
+        with self._encoder_cache():
+            qf_losses = self._critic_objective(samples_data)
+        if self._joint_qf_update:
+            self._qf_optimizers[0].zero_grad()
+            torch.stack(qf_losses).sum().backward()
+            self._qf_optimizers[0].step()
         else:
-            new_actions = None
-            log_pi_new_actions = action_dists.logits
-        policy_loss = self._actor_objective(samples_data, new_actions,
-                                            log_pi_new_actions)
+            for i in range(len(qf_losses)):
+                self._qf_optimizers[i].zero_grad()
+                qf_losses[i].backward()
+                self._qf_optimizers[i].step()
+
+        # train actor, re-encoding obs since the critic step moved the encoder
+        with self._encoder_cache():
+            action_dists = self.policy(obs, mask)[0]
+            if hasattr(action_dists, 'rsample_with_pre_tanh_value'):
+                new_actions_pre_tanh, new_actions = (
+                    action_dists.rsample_with_pre_tanh_value())
+                log_pi_new_actions = action_dists.log_prob(
+                    value=new_actions, pre_tanh_value=new_actions_pre_tanh)
+            else:
+                new_actions = None
+                log_pi_new_actions = action_dists.logits
+            policy_loss = self._actor_objective(samples_data, new_actions,
+                                                log_pi_new_actions)
         self._policy_optimizer.zero_grad()
         policy_loss.backward()
 
@@ -585,7 +714,8 @@ class REDQ(RLAlgorithm):
 
         """
         return [
-            self.policy, *self._qfs, *self._target_qfs
+            self.policy, *self._qf_list(self._qfs),
+            *self._qf_list(self._target_qfs)
         ]
 
     def to(self, device=None):
@@ -610,6 +740,6 @@ class REDQ(RLAlgorithm):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['_sampler']
-        del state['replay_buffer']
+        state.pop('_sampler', None)
+        state.pop('replay_buffer', None)
         return state
@@ -192,19 +192,12 @@ class SAC(RLAlgorithm):
                     batch_size = int(self._min_buffer_size)
                 else:
                     batch_size = None
-                trainer.step_episode = trainer.obtain_samples(
-                    trainer.step_itr, batch_size)
-                path_returns = []
-                for path in trainer.step_episode:
-                    self.replay_buffer.add_path(
-                        dict(observation=path['observations'],
-                             action=path['actions'],
-                             reward=path['rewards'].reshape(-1, 1),
-                             next_observation=path['next_observations'],
-                             terminal=path['step_types'].reshape(-1, 1),
-                             mask=path['masks'],
-                             next_mask=path['next_masks'],))
-                    path_returns.append(sum(path['rewards']))
+                episodes = trainer.obtain_episodes(trainer.step_itr,
+                                                   batch_size)
+                trainer.step_episode = episodes.to_list()
+                self.replay_buffer.add_episode_batch(episodes)
+                path_returns = [sum(path['rewards'])
+                                for path in trainer.step_episode]
                 assert len(path_returns) == len(trainer.step_episode)
                 allrets = torch.tensor(
                     [path["rewards"].sum() for path in trainer.step_episode]
@@ -615,6 +608,6 @@ class SAC(RLAlgorithm):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['_sampler']
-        del state['replay_buffer']
+        state.pop('_sampler', None)
+        state.pop('replay_buffer', None)
         return state
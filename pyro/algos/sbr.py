@@ -10,7 +10,11 @@ import torch.nn.functional as F
 import time
 
 from pyro import log_performance
-from pyro.algos._functions import obtain_evaluation_episodes, RLAlgorithm
+from pyro.algos._functions import log_wall_clock, \
+    obtain_evaluation_episodes, RLAlgorithm
+from pyro.q_functions.ensemble_adaptive_mlp_q_function import \
+    EnsembleAdaptiveMLPQFunction
+from pyro.sampler.async_sampler import AsyncSampler
 
 #from garage.np.algos import RLAlgorithm
 #from garage.torch import as_torch_dict, global_device
@@ -31,7 +35,10 @@ class SBR(RLAlgorithm):
         policy (garage.torch.policy.Policy): Policy/Actor/Agent that is being
             optimized by SAC.
         qfs [(garage.torch.q_function.ContinuousMLPQFunction)]: list of
-            QFunctions used for actor/policy optimization.
+            QFunctions used for actor/policy optimization. An
+            EnsembleAdaptiveMLPQFunction may be passed instead, in which case
+            the whole ensemble is evaluated, optimized and Polyak-averaged
+            in fused calls.
         replay_buffer (ReplayBuffer): Stores transitions that are previously
             collected by the sampler.
         sampler (garage.sampler.Sampler): Sampler.
@@ -82,6 +89,12 @@ class SBR(RLAlgorithm):
             and Q-function parameters (only used if resets is True).
         resets (Bool): If True, resets the policy and Q-function 
             parameters every 'reset_interval' iterations.
+        async_sampling (bool): If True, sample episodes in a background
+            thread while the gradient steps run, with a policy snapshot that
+            may be slightly stale.
+        max_staleness (int): Number of policy updates by which the policy
+            that sampled a batch may lag behind the learner, if
+            async_sampling.
 
     """
 
@@ -114,7 +127,9 @@ class SBR(RLAlgorithm):
             M=2,
             ent_anneal_rate=0.,
             reset_interval=2560000,
-            resets=True):
+            resets=True,
+            async_sampling=False,
+            max_staleness=1):
 
         self._qfs = qfs
         self.replay_buffer = replay_buffer
@@ -146,14 +161,15 @@ class SBR(RLAlgorithm):
         self.replay_buffer = replay_buffer
 
         self._sampler = sampler
+        if async_sampling:
+            self._sampler = AsyncSampler(sampler, policy, max_staleness)
 
         self._reward_scale = reward_scale
         # use ensemble of target q networks
-        self._target_qfs = [copy.deepcopy(q) for q in self._qfs]
+        self._target_qfs = copy.deepcopy(self._qfs)
         self._policy_optimizer = self._optimizer(self.policy.parameters(),
                                                  lr=self._policy_lr)
-        self._qf_optimizers = [
-            self._optimizer(q.parameters(), lr=self._qf_lr) for q in self._qfs]
+        self._qf_optimizers = self._make_qf_optimizers()
         # automatic entropy coefficient tuning
         self._use_automatic_entropy_tuning = fixed_alpha is None
         self._fixed_alpha = fixed_alpha
@@ -180,10 +196,41 @@ class SBR(RLAlgorithm):
         self.update_count = 0
 
         # keep copy of original networks and optimizers
-        self._original_qfs = [copy.deepcopy(q) for q in self._qfs]
-        self._original_target_qfs = [copy.deepcopy(q) for q in self._target_qfs]
+        self._original_qfs = copy.deepcopy(self._qfs)
+        self._original_target_qfs = copy.deepcopy(self._target_qfs)
         self._original_policy = copy.deepcopy(self.policy)
 
+    @property
+    def _fused_qfs(self):
+        """bool: Whether the critics are one EnsembleAdaptiveMLPQFunction."""
+        return isinstance(self._qfs, EnsembleAdaptiveMLPQFunction)
+
+    @staticmethod
+    def _qf_list(qfs):
+        """Return the critics in `qfs` as a list of networks."""
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return [qfs]
+        return list(qfs)
+
+    def _make_qf_optimizers(self):
+        """Create one optimizer per critic, or a single fused optimizer for
+        an EnsembleAdaptiveMLPQFunction."""
+        return [self._optimizer(q.parameters(), lr=self._qf_lr)
+                for q in self._qf_list(self._qfs)]
+
+    def _q_values(self, qfs, obs, actions, mask, idx=None):
+        """Stack the Q-values of the critics in `qfs` selected by `idx`.
+
+        Returns:
+            torch.Tensor: Q-values of shape (n_critics, N, 1).
+
+        """
+        if isinstance(qfs, EnsembleAdaptiveMLPQFunction):
+            return qfs(obs, actions, mask, idx=idx)
+        if idx is not None:
+            qfs = [qfs[i] for i in idx]
+        return torch.stack([q(obs, actions, mask) for q in qfs])
+
     def train(self, trainer):
         """Obtain samplers and start actual training for each epoch.
 
@@ -198,25 +245,21 @@ class SBR(RLAlgorithm):
         """
         last_return = None
         for _ in trainer.step_epochs():
+            sampling_intervals, learning_intervals = [], []
             for _ in range(self._steps_per_epoch):
                 if not (self.replay_buffer.n_transitions_stored >=
                         self._min_buffer_size):
                     batch_size = int(self._min_buffer_size)
                 else:
                     batch_size = None
-                trainer.step_episode = trainer.obtain_samples(
-                    trainer.step_itr, batch_size)
-                path_returns = []
-                for path in trainer.step_episode:
-                    self.replay_buffer.add_path(
-                        dict(observation=path['observations'],
-                             action=path['actions'],
-                             reward=path['rewards'].reshape(-1, 1),
-                             next_observation=path['next_observations'],
-                             terminal=path['step_types'].reshape(-1, 1),
-                             mask=path['masks'],
-                             next_mask=path['next_masks'],))
-                    path_returns.append(sum(path['rewards']))
+                start = time.perf_counter()
+                episodes = trainer.obtain_episodes(trainer.step_itr,
+                                                   batch_size)
+                sampling_intervals.append((start, time.perf_counter()))
+                trainer.step_episode = episodes.to_list()
+                self.replay_buffer.add_episode_batch(episodes)
+                path_returns = [sum(path['rewards'])
+                                for path in trainer.step_episode]
                 assert len(path_returns) == len(trainer.step_episode)
                 allrets = torch.tensor(
                     [path["rewards"].sum() for path in trainer.step_episode]
@@ -226,8 +269,10 @@ class SBR(RLAlgorithm):
                 ).cpu().numpy()
                 self.episode_rewards.append(
                     torch.stack(path_returns).mean().cpu().numpy())
+                start = time.perf_counter()
                 for _ in range(self._gradient_steps):
                     policy_loss, qf_losses, entropy = self.train_once()
+                learning_intervals.append((start, time.perf_counter()))
                 # sbr
                 self.update_count += self._gradient_steps
             
@@ -235,6 +280,9 @@ class SBR(RLAlgorithm):
             if self._eval_env is not None:
                 last_return = self._evaluate_policy(trainer.step_itr)
             self._log_statistics(policy_loss, qf_losses, entropy)
+            if isinstance(self._sampler, AsyncSampler):
+                sampling_intervals = self._sampler.pop_sampling_intervals()
+            log_wall_clock(sampling_intervals, learning_intervals)
             self._discount = np.clip(self._discount + self._discount_delta,
                                      a_min=0., a_max=1.)
 
@@ -416,7 +464,7 @@ class SBR(RLAlgorithm):
             policy_objective = policy_objective.sum(axis=1).mean()
         else:
             min_q_new_actions = torch.min(
-                torch.stack([q(obs, new_actions, mask) for q in self._qfs]),
+                self._q_values(self._qfs, obs, new_actions, mask),
                 dim=0).values
             policy_objective = ((alpha * log_pi_new_actions) -
                                 min_q_new_actions.flatten()).mean()
@@ -466,9 +514,9 @@ class SBR(RLAlgorithm):
         # use random ensemble of q functions
         with torch.no_grad():
             m_idx = np.random.choice(len(self._qfs), self._M, replace=False)
-            in_target_qfs = [self._target_qfs[i] for i in m_idx]
             # get exact expectation for discrete action spaces
             if self.env_spec.action_space.is_discrete:
+                in_target_qfs = [self._target_qfs[i] for i in m_idx]
                 target_q_values = torch.min(
                     torch.stack([
                         q(next_obs, mask=next_mask) for q in in_target_qfs
@@ -479,19 +527,37 @@ class SBR(RLAlgorithm):
                 target_q_values = (target_q_values * new_pi).sum(axis=1)
             else:
                 target_q_values = torch.min(
-                    torch.stack([
-                        q(next_obs, next_actions, next_mask) for q in in_target_qfs
-                    ]),
+                    self._q_values(self._target_qfs, next_obs, next_actions,
+                                   next_mask, idx=m_idx),
                     dim=0
                 ).values.flatten() - (alpha * new_log_pi)
             q_target = rewards * self._reward_scale + (
                     1. - terminals) * self._discount * target_q_values
-        q_preds = [q(obs, actions, mask) for q in self._qfs]
+        if self._fused_qfs:
+            q_preds = self._qfs(obs, actions, mask)
+        else:
+            q_preds = [q(obs, actions, mask) for q in self._qfs]
+        if 'weight' in samples_data:
+            # prioritised replay: importance-weight the losses and refresh
+            # the priorities of the batch with its TD errors
+            weights = samples_data['weight'].flatten()
+            td_errors = [pred.flatten() - q_target for pred in q_preds]
+            self.replay_buffer.update_priorities(
+                samples_data['index'],
+                torch.stack(td_errors).detach().abs().mean(dim=0))
+            return [(weights * td_error ** 2).mean() for td_error in td_errors]
         qf_losses = [F.mse_loss(pred.flatten(), q_target) for pred in q_preds]
         return qf_losses
 
     def _update_targets(self):
         """Update parameters in the target q-functions."""
+        if self._fused_qfs:
+            with torch.no_grad():
+                t_params = list(self._target_qfs.parameters())
+                torch._foreach_mul_(t_params, 1.0 - self._tau)
+                torch._foreach_add_(t_params, list(self._qfs.parameters()),
+                                    alpha=self._tau)
+            return
         for target_qf, qf in zip(self._target_qfs, self._qfs):
             for t_param, param in zip(target_qf.parameters(), qf.parameters()):
                 t_param.data.copy_(t_param.data * (1.0 - self._tau) +
@@ -524,10 +590,15 @@ class SBR(RLAlgorithm):
         mask = samples_data['mask']
         # train critic
         qf_losses = self._critic_objective(samples_data)
-        for i in range(len(qf_losses)):
-            self._qf_optimizers[i].zero_grad()
-            qf_losses[i].backward()
-            self._qf_optimizers[i].step()
+        if self._fused_qfs:
+            self._qf_optimizers[0].zero_grad()
+            torch.stack(qf_losses).sum().backward()
+            self._qf_optimizers[0].step()
+        else:
+            for i in range(len(qf_losses)):
+                self._qf_optimizers[i].zero_grad()
+                qf_losses[i].backward()
+                self._qf_optimizers[i].step()
 
         # train actor
         action_dists = self.policy(obs, mask)[0]
@@ -614,7 +685,10 @@ class SBR(RLAlgorithm):
 
         """
         return [
-            self.policy, *self._qfs, *self._target_qfs, self._original_policy, *self._original_qfs, *self._original_target_qfs
+            self.policy, *self._qf_list(self._qfs),
+            *self._qf_list(self._target_qfs), self._original_policy,
+            *self._qf_list(self._original_qfs),
+            *self._qf_list(self._original_target_qfs)
         ]
 
     def to(self, device=None):
@@ -639,8 +713,8 @@ class SBR(RLAlgorithm):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['_sampler']
-        del state['replay_buffer']
+        state.pop('_sampler', None)
+        state.pop('replay_buffer', None)
         return state
     
     def _reset(self):
@@ -650,8 +724,7 @@ class SBR(RLAlgorithm):
         
         self._policy_optimizer = self._optimizer(self.policy.parameters(),
                                                  lr=self._policy_lr)
-        self._qf_optimizers = [
-            self._optimizer(q.parameters(), lr=self._qf_lr) for q in self._qfs]
+        self._qf_optimizers = self._make_qf_optimizers()
         
         if self._use_automatic_entropy_tuning:
             if self.starting_target_entropy:
@@ -6,8 +6,14 @@ from dowel.histogram import Histogram
 from dowel.logger import Logger, LoggerWarning, LogOutput
 from pyro.dowel.tabular_input import TabularInput
 from pyro.dowel.csv_output import CsvOutput  # noqa: I100
-from dowel.tensor_board_output import TensorBoardOutput
 from pyro.dowel.simple_outputs import StdOutput, TextOutput
+from pyro._lazy import lazy_attributes
+
+# dowel imports TensorFlow along with TensorBoardOutput, so it is only
+# imported when an experiment logs to TensorBoard
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'TensorBoardOutput': 'dowel.tensor_board_output',
+})
 
 logger = Logger()
 tabular = TabularInput()
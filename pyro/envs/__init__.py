@@ -1,8 +1,11 @@
 """Garage wrappers for gym environments."""
+from pyro._lazy import lazy_attributes
 
-from pyro.envs.adaptive_design_env import AdaptiveDesignEnv
-from pyro.envs.gym_env import GymEnv
-from pyro.envs.normalized_env import normalize
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'AdaptiveDesignEnv': 'pyro.envs.adaptive_design_env',
+    'GymEnv': 'pyro.envs.gym_env',
+    'normalize': 'pyro.envs.normalized_env',
+})
 
 __all__ = [
     'AdaptiveDesignEnv',
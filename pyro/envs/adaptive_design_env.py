@@ -1,7 +1,11 @@
+import math
+
 import torch
 
 from gymnasium import Env
 
+from pyro.envs.log_sum_exp import LogSumExpReducer
+
 LOWER = 0
 UPPER = 1
 TERMINAL = 2
@@ -9,7 +13,9 @@ TERMINAL = 2
 
 class AdaptiveDesignEnv(Env):
     def __init__(self, design_space, history_space, model, budget, l,
-                 true_model=None, bound_type=LOWER, M=1, N=1):
+                 true_model=None, bound_type=LOWER, M=1, N=1,
+                 chunk_size=None, prior_bank=None, design_grid=None,
+                 reward_dtype=None):
         """
         A generic class for building a SED MDP
 
@@ -21,6 +27,24 @@ class AdaptiveDesignEnv(Env):
             true_model (models.ExperimentModel): a ground-truth model
             M (int): number of trajectories per sample of theta
             N (int): number of samples of theta
+            chunk_size (int): if given, contrastive samples are never held
+                in memory all at once. They are regenerated in chunks of
+                this size from per-chunk RNG seeds each time the reward is
+                computed, so memory is set by chunk_size instead of l
+            prior_bank (models.PriorBank): if given, the samples of theta
+                drawn at every reset are served by this bank of prior
+                samples instead of being traced from the model
+            design_grid (torch.Tensor): if given, the sorted 1-d grid of
+                admissible values of every design dimension. Designs are
+                snapped to the grid, and at every reset the model's success
+                probabilities of all contrastive samples at every grid value
+                are tabulated, so that a reward only gathers from the table
+                instead of evaluating the model. The table holds
+                (l + 1) * n_parallel * len(design_grid) values
+            reward_dtype (torch.dtype): if given, e.g. torch.float64, the
+                logsumexp over the contrastive samples is accumulated in
+                this dtype, while the log-likelihood products are stored in
+                the default one
         """
         self.action_space = design_space
         self.observation_space = history_space
@@ -33,23 +57,72 @@ class AdaptiveDesignEnv(Env):
         self.bound_type = bound_type
         self.log_products = None
         self.last_logsumprod = None
+        self.history_buffer = None
+        self.n_steps = 0
         self.history = []
         self.true_model = true_model
         if true_model is None:
             self.true_model = lambda d: None
         self.thetas = None
         self.theta0 = None
+        self.chunk_size = chunk_size
+        self.prior_bank = prior_bank
+        self.design_grid = None if design_grid is None \
+            else torch.as_tensor(design_grid)
+        self.likelihood_table = None
+        self.logsumexp = LogSumExpReducer(reduce_dtype=reward_dtype)
+        self.log_product0 = None
+        self.chunk_seeds = None
+        self.past_designs = []
+        self.past_ys = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # per-episode state, regenerated by reset, is not snapshotted
+        state.update(thetas=None, theta0=None, log_products=None,
+                     last_logsumprod=None, history_buffer=None, n_steps=0,
+                     likelihood_table=None, log_product0=None,
+                     chunk_seeds=None, past_designs=[], past_ys=[])
+        return state
+
+    def __setstate__(self, state):
+        # environments pickled before these options existed
+        history = state.pop('history', None)
+        state.setdefault('history_buffer', None)
+        state.setdefault('n_steps', 0)
+        state.setdefault('chunk_size', None)
+        state.setdefault('log_product0', None)
+        state.setdefault('chunk_seeds', None)
+        state.setdefault('past_designs', [])
+        state.setdefault('past_ys', [])
+        state.setdefault('prior_bank', None)
+        state.setdefault('design_grid', None)
+        state.setdefault('likelihood_table', None)
+        state.setdefault('logsumexp', LogSumExpReducer())
+        self.__dict__.update(state)
+        if history:
+            # the history was a list of rows before it had a buffer
+            self.history = history
 
     def reset(self, n_parallel=1):
         self.model.reset(n_parallel=n_parallel)
         self.n_parallel = n_parallel
         self.history = []
+        if self.chunk_size:
+            return self.reset_streaming()
         self.log_products = torch.zeros((
             self.l + 1 if self.bound_type in [LOWER, TERMINAL] else self.l,
             self.n_parallel
         ))
-        self.last_logsumprod = torch.logsumexp(self.log_products, dim=0)
-        self.thetas = self.model.sample_theta(self.l + 1)
+        self.last_logsumprod = self.logsumexp(self.log_products)
+        if self.prior_bank is not None:
+            self.thetas = self.prior_bank.sample_theta(self.l + 1)
+        else:
+            self.thetas = self.model.sample_theta(self.l + 1)
+        if self.design_grid is not None:
+            with torch.no_grad():
+                self.likelihood_table = self.model.success_probs(
+                    self.thetas, self.design_grid)
         # if self.M != 1 and self.M * self.N == n_parallel:
         #     for k, v in self.thetas.items():
         #         self.thetas[k] = v[:, :self.N].repeat_interleave(self.M, dim=1)
@@ -57,12 +130,78 @@ class AdaptiveDesignEnv(Env):
         self.theta0 = {k: v[0] for k, v in self.thetas.items()}
         return self.get_obs()
 
+    def reset_streaming(self):
+        self.thetas = None
+        self.log_products = None
+        self.past_designs, self.past_ys = [], []
+        self.log_product0 = torch.zeros(self.n_parallel)
+        n_rows = self.l + 1 if self.bound_type in [LOWER, TERMINAL] else self.l
+        self.last_logsumprod = torch.full((self.n_parallel,), math.log(n_rows))
+        self.theta0 = {
+            k: v[0] for k, v in self.model.sample_theta(1).items()}
+        n_chunks = math.ceil(self.l / self.chunk_size)
+        self.chunk_seeds = torch.randint(2 ** 62, (n_chunks,)).tolist()
+        return self.get_obs()
+
+    def design_index(self, design):
+        """Index of the nearest value of design_grid to every design value."""
+        grid = self.design_grid
+        design = design.to(grid.dtype)
+        idx = torch.searchsorted(grid, design.contiguous())
+        idx = idx.clamp(1, len(grid) - 1)
+        closer_below = design - grid[idx - 1] < grid[idx] - design
+        return idx - closer_below.long()
+
+    def tabulated_likelihoods(self, y, design):
+        """get_likelihoods of self.thetas, gathered from likelihood_table."""
+        idx = self.design_index(design).reshape(self.n_parallel, -1)
+        table = self.likelihood_table
+        probs = table.gather(-1, idx.expand(table.shape[:1] + idx.shape))
+        return self.model.tabulated_log_likelihood(y, design, probs)
+
+    def sample_chunk(self, i):
+        """Regenerate the i-th chunk of contrastive samples from its seed."""
+        size = min(self.chunk_size, self.l - i * self.chunk_size)
+        with torch.random.fork_rng():
+            torch.manual_seed(self.chunk_seeds[i])
+            return self.model.sample_theta(size)
+
+    @property
+    def history(self):
+        """list of (design, outcome) rows, one per experiment so far"""
+        if self.history_buffer is None:
+            return []
+        return list(self.history_buffer[:, :self.n_steps].unbind(dim=-2))
+
+    @history.setter
+    def history(self, history):
+        self.history_buffer = torch.zeros((
+            self.n_parallel,
+            max(self.budget, len(history), 1),
+            self.observation_space.shape[-1]
+        ))
+        self.n_steps = 0
+        for row in history:
+            self.append_history(row)
+
+    def append_history(self, row):
+        """Write one (design, outcome) row at the history cursor."""
+        if self.n_steps == self.history_buffer.shape[-2]:
+            self.history_buffer = torch.cat(
+                [self.history_buffer, torch.zeros_like(self.history_buffer)],
+                dim=-2)
+        self.history_buffer[:, self.n_steps] = row
+        self.n_steps += 1
+
     def step(self, action):
         design = torch.as_tensor(action)
+        if self.design_grid is not None:
+            design = self.design_grid[self.design_index(design)].to(
+                design.dtype)
         # y = self.true_model(design)
         y = self.model.run_experiment(design, self.theta0)
         #print("1esfsfe", y.shape)
-        self.history.append(
+        self.append_history(
             torch.cat(
                 [design.squeeze(dim=-2).squeeze(dim=-2), y.squeeze(dim=-2)],
                 dim=-1
@@ -81,21 +220,22 @@ class AdaptiveDesignEnv(Env):
 
     def get_obs(self):
         #print("self.observation_space.shape[-1]", self.observation_space.shape[-1])
-        if self.history:
-            return torch.stack(self.history, dim=-2)
-        else:
-            return torch.zeros(
-                (self.n_parallel, 0, self.observation_space.shape[-1]),
-            )
+        return self.history_buffer[:, :self.n_steps]
 
     def terminal(self):
-        return len(self.history) >= self.budget
+        return self.n_steps >= self.budget
         # return False
 
     def get_reward(self, y, design):
+        if self.chunk_size:
+            return self.get_streaming_reward(y, design)
         with torch.no_grad():
-            log_probs = self.model.get_likelihoods(
-                y, design, self.thetas).squeeze(dim=-1)
+            if self.likelihood_table is not None:
+                log_probs = self.tabulated_likelihoods(
+                    y, design).squeeze(dim=-1)
+            else:
+                log_probs = self.model.get_likelihoods(
+                    y, design, self.thetas).squeeze(dim=-1)
         log_prob0 = log_probs[0]
         if self.bound_type in [LOWER, TERMINAL]:
             # maximise lower bound
@@ -104,7 +244,7 @@ class AdaptiveDesignEnv(Env):
             # maximise upper bound
             self.log_products += log_probs[1:]
 
-        logsumprod = torch.logsumexp(self.log_products, dim=0)
+        logsumprod = self.logsumexp(self.log_products)
         if self.bound_type in [LOWER, UPPER]:
             reward = log_prob0 + self.last_logsumprod - logsumprod
         elif self.bound_type == TERMINAL:
@@ -114,6 +254,38 @@ class AdaptiveDesignEnv(Env):
             else:
                 reward = torch.zeros(self.n_parallel)
         self.last_logsumprod = logsumprod
+        return reward.to(log_probs.dtype)
+
+    def get_streaming_reward(self, y, design):
+        self.past_designs.append(design)
+        self.past_ys.append(y)
+        with torch.no_grad():
+            theta0 = {k: v.unsqueeze(0) for k, v in self.theta0.items()}
+            log_prob0 = self.model.get_likelihoods(
+                y, design, theta0).squeeze(dim=-1)[0]
+            self.log_product0 += log_prob0
+            if self.bound_type == TERMINAL and not self.terminal():
+                return torch.zeros(self.n_parallel)
+            if self.bound_type in [LOWER, TERMINAL]:
+                logsumprod = self.log_product0.clone()
+            else:
+                logsumprod = torch.full((self.n_parallel,), -math.inf)
+            for i in range(len(self.chunk_seeds)):
+                thetas = self.sample_chunk(i)
+                log_products = 0.
+                for past_design, past_y in zip(self.past_designs,
+                                               self.past_ys):
+                    log_products = log_products + self.model.get_likelihoods(
+                        past_y, past_design, thetas).squeeze(dim=-1)
+                logsumprod = torch.logaddexp(
+                    logsumprod, torch.logsumexp(log_products, dim=0))
+
+        if self.bound_type in [LOWER, UPPER]:
+            reward = log_prob0 + self.last_logsumprod - logsumprod
+        else:
+            reward = self.log_product0 - logsumprod + \
+                     torch.log(torch.as_tensor(self.l + 1.))
+        self.last_logsumprod = logsumprod
         return reward
 
     def render(self, mode='human'):
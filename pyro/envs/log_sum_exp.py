@@ -0,0 +1,49 @@
+import torch
+
+
+class LogSumExpReducer:
+    """
+    Computes `torch.logsumexp(log_products, dim=0)` for the `(L+1, n_parallel)`
+    log-likelihood products of an AdaptiveDesignEnv, once per step, without
+    allocating a new `(L+1, n_parallel)` tensor every time.
+
+    The column maxima are written into a cached shift, the shifted
+    exponentials into a cached workspace of the shape of `log_products`,
+    and only the column sums are new tensors. With `reduce_dtype` set, e.g.
+    to `torch.float64`, the column sums are accumulated in that dtype while
+    `log_products` stays in its own, which keeps the sPCE and sNMC bounds
+    accurate for L >= 1e6 at no extra memory.
+
+    args:
+        reduce_dtype (torch.dtype): dtype of the sums and of the result;
+            by default that of `log_products`
+    """
+
+    def __init__(self, reduce_dtype=None):
+        self.reduce_dtype = reduce_dtype
+        self._shift = None
+        self._work = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shift'] = None
+        state['_work'] = None
+        return state
+
+    def _workspace(self, log_products):
+        if self._work is None or self._work.shape != log_products.shape or \
+                self._work.dtype != log_products.dtype or \
+                self._work.device != log_products.device:
+            self._work = torch.empty_like(log_products)
+            self._shift = torch.empty_like(log_products[0])
+        return self._shift, self._work
+
+    def __call__(self, log_products):
+        shift, work = self._workspace(log_products)
+        torch.amax(log_products, dim=0, out=shift)
+        # columns of -inf would give nan, and their logsumexp is -inf anyway
+        shift.masked_fill_(~torch.isfinite(shift), 0.)
+        torch.sub(log_products, shift, out=work)
+        work.exp_()
+        total = work.sum(dim=0, dtype=self.reduce_dtype)
+        return total.log_().add_(shift.to(total.dtype))
@@ -1,6 +1,10 @@
 """Experiment functions."""
-from pyro.experiment.trainer import Trainer
-#from pyro.experiment.local_runner import LocalRunner
+from pyro._lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'Trainer': 'pyro.experiment.trainer',
+})
+
 __all__ = [
     "Trainer",
     #"LocalRunner"
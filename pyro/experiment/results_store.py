@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+SHARD_PREFIX = 'shard-'
+COLUMNS_FILE = 'columns.json'
+
+
+def _to_numpy(value):
+    if hasattr(value, 'detach'):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+class ResultsStore:
+    """
+    An appendable, columnar store of results, one row per step of a run.
+
+    Rows are dicts of scalars, strings, arrays or tensors, e.g. the designs,
+    outcomes, sPCE, sNMC and timings of a step. They are buffered and
+    written as shards: directories holding one `.npy` file per column, with
+    the rows stacked along the first axis. Rows whose columns or shapes
+    differ from those buffered start a new shard, so every shard is
+    rectangular. A shard is written under a temporary name and renamed once
+    complete, so several processes, e.g. the seeds of a sweep, can append
+    to the same store and readers never see partial shards.
+
+    Readers memory-map the shards: `iter_shards` yields one dict of arrays
+    per shard, `read` concatenates a column over the shards, and
+    `summarise` aggregates a column over groups of rows, e.g. across seeds,
+    one shard at a time.
+
+    args:
+        directory (str): directory of the store, created if needed
+        shard_size (int): number of rows buffered before they are written
+    """
+
+    def __init__(self, directory, shard_size=256):
+        self.directory = directory
+        self.shard_size = shard_size
+        self._rows = []
+        self._schema = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _row_schema(row):
+        return tuple((name, value.shape, value.dtype.kind)
+                     for name, value in row.items())
+
+    def append(self, row):
+        """
+        Buffer a row, a dict from column names to values.
+        """
+        row = {name: _to_numpy(value) for name, value in row.items()}
+        schema = self._row_schema(row)
+        if self._rows and schema != self._schema:
+            self.flush()
+        self._schema = schema
+        self._rows.append(row)
+        if len(self._rows) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows as a shard.
+        """
+        if not self._rows:
+            return
+        names = list(self._rows[0])
+        tmp_dir = os.path.join(self.directory, '.tmp-' + uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        for i, name in enumerate(names):
+            np.save(os.path.join(tmp_dir, 'c{}.npy'.format(i)),
+                    np.stack([row[name] for row in self._rows]))
+        with open(os.path.join(tmp_dir, COLUMNS_FILE), 'w') as f:
+            json.dump(names, f)
+        os.rename(tmp_dir, os.path.join(
+            self.directory, '{}{:020d}-{}'.format(
+                SHARD_PREFIX, time.time_ns(), uuid.uuid4().hex[:8])))
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+    def clear(self):
+        """
+        Remove every shard of the store and the buffered rows.
+        """
+        self._rows = []
+        for shard in self.shards():
+            shutil.rmtree(shard)
+
+    def shards(self):
+        """
+        The paths of the shards, in the order they were written.
+        """
+        return [os.path.join(self.directory, name)
+                for name in sorted(os.listdir(self.directory))
+                if name.startswith(SHARD_PREFIX)]
+
+    def iter_shards(self, columns=None):
+        """
+        Yield the columns of every shard as memory-mapped arrays. With
+        `columns` given, only shards which hold all of them are yielded, and
+        only those columns.
+        """
+        for shard in self.shards():
+            with open(os.path.join(shard, COLUMNS_FILE)) as f:
+                names = json.load(f)
+            if columns is not None and not set(columns) <= set(names):
+                continue
+            yield {name: np.load(os.path.join(shard, 'c{}.npy'.format(i)),
+                                 mmap_mode='r')
+                   for i, name in enumerate(names)
+                   if columns is None or name in columns}
+
+    def read(self, name):
+        """
+        Concatenate the column `name` over the shards which hold it.
+        """
+        arrays = [shard[name] for shard in self.iter_shards([name])]
+        if not arrays:
+            raise KeyError('no shard of {} has a column {!r}'.format(
+                self.directory, name))
+        return np.concatenate(arrays)
+
+    def summarise(self, name, by=()):
+        """
+        The count, mean and standard deviation of the column `name` for each
+        combination of the values of the scalar columns `by`, over rows and
+        over the trailing axes of the column, e.g. the parallel runs.
+        """
+        stats = {}
+        for shard in self.iter_shards([name, *by]):
+            values = shard[name].reshape(len(shard[name]), -1)
+            keys = zip(*(shard[key].tolist() for key in by)) if by \
+                else [()] * len(values)
+            for key, value in zip(keys, values):
+                value = value.astype(np.float64)
+                count, total, total_sq = stats.get(key, (0, 0., 0.))
+                stats[key] = (count + value.size, total + value.sum(),
+                              total_sq + np.square(value).sum())
+        summary = {}
+        for key, (count, total, total_sq) in stats.items():
+            mean = total / count
+            summary[key] = dict(count=count, mean=mean, std=np.sqrt(
+                max(total_sq / count - mean ** 2, 0.)))
+        return summary
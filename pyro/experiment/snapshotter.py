@@ -0,0 +1,114 @@
+"""A Snapshotter that writes snapshots in a background thread."""
+import atexit
+import copy
+import os
+import queue
+import threading
+
+import cloudpickle
+
+from garage.experiment.snapshotter import Snapshotter
+
+
+class AsyncSnapshotter(Snapshotter):
+    """Snapshotter that pickles and writes snapshots in a background thread.
+
+    On the training thread, `save_itr_params` only deep-copies the snapshot.
+    Deep-copying copies tensor storages directly instead of serialising them.
+    It goes through the same `__getstate__` hooks as pickling, so samplers,
+    replay buffers and per-episode env state are left out of the copy, and
+    the copy is pickled again by those hooks, which must therefore accept
+    a state without what they leave out. A
+    single writer thread then pickles the copy and writes it under a
+    temporary name, which is renamed into place, so a snapshot on disk is
+    always complete.
+
+    Snapshots are written in order. Once `max_pending` snapshots wait to be
+    written, `save_itr_params` blocks until the oldest one is. An error of
+    the writer thread is raised by the next call to `save_itr_params` or
+    `flush`.
+
+    Args:
+        snapshot_dir (str): Path to save the log and iteration snapshot.
+        snapshot_mode (str): Mode to save the snapshot, as in Snapshotter.
+        snapshot_gap (int): Gap between snapshot iterations.
+        max_pending (int): Number of snapshots that can wait to be written.
+
+    """
+
+    def __init__(self,
+                 snapshot_dir=os.path.join(os.getcwd(),
+                                           'data/local/experiment'),
+                 snapshot_mode='last',
+                 snapshot_gap=1,
+                 max_pending=1):
+        super().__init__(snapshot_dir, snapshot_mode, snapshot_gap)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._error = None
+
+    def _run(self):
+        """Write the queued snapshots until the process exits."""
+        while True:
+            params, file_names = self._queue.get()
+            try:
+                if self._error is None:
+                    self._write(params, file_names)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+            finally:
+                del params
+                self._queue.task_done()
+
+    @staticmethod
+    def _copy(params):
+        """Copy params for the writer thread.
+
+        Tensors which are not graph leaves cannot be deep-copied; in that
+        case params are copied through a pickle round trip instead.
+
+        Args:
+            params (obj): Content of snapshot to be saved.
+
+        Returns:
+            obj: A copy of params.
+
+        """
+        try:
+            return copy.deepcopy(params)
+        except RuntimeError:
+            return cloudpickle.loads(cloudpickle.dumps(params))
+
+    def _raise_error(self):
+        """Raise the error of the writer thread, if any.
+
+        Raises:
+            RuntimeError: If writing a snapshot failed.
+
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Writing a snapshot failed') from error
+
+    def save_itr_params(self, itr, params):
+        """Queue the parameters to be saved if at the right iteration.
+
+        Args:
+            itr (int): Number of iterations. Used as the index of snapshot.
+            params (obj): Content of snapshot to be saved.
+
+        """
+        self._raise_error()
+        file_names = self._file_names(itr)
+        if not file_names:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+        self._queue.put((self._copy(params), file_names))
+
+    def flush(self):
+        """Wait until every queued snapshot is written."""
+        self._queue.join()
+        self._raise_error()
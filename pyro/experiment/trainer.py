@@ -11,14 +11,30 @@ from pyro.dowel import tabular
 from garage.experiment.deterministic import get_seed, set_seed
 from garage.experiment.experiment import dump_json
 from garage.experiment.snapshotter import Snapshotter
+from pyro.experiment.snapshotter import AsyncSnapshotter
 
 # pylint: disable=no-name-in-module
 
-tf = False
-try:
-    import tensorflow as tf
-except ImportError:
-    pass
+# TensorFlow is only imported by TFTrainer, as importing it takes seconds
+tf = None
+
+
+def _import_tf():
+    """Import TensorFlow into this module.
+
+    Raises:
+        ImportError: If TensorFlow is not installed.
+
+    """
+    global tf  # pylint: disable=global-statement
+    if tf is None:
+        try:
+            import tensorflow  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ImportError(
+                'TFTrainer requires TensorFlow. To use it, please install '
+                'TensorFlow.') from e
+        tf = tensorflow
 
 
 class ExperimentStats:
@@ -74,6 +90,8 @@ class Trainer:
         snapshot_config (garage.experiment.SnapshotConfig): The snapshot
             configuration used by Trainer to create the snapshotter.
             If None, it will create one with default settings.
+        async_snapshots (bool): Pickle and write snapshots in a background
+            thread, so that training continues while a snapshot is written.
 
     Note:
         For the use of any TensorFlow environments, policies and algorithms,
@@ -103,10 +121,12 @@ class Trainer:
 
     """
 
-    def __init__(self, snapshot_config):
-        self._snapshotter = Snapshotter(snapshot_config.snapshot_dir,
-                                        snapshot_config.snapshot_mode,
-                                        snapshot_config.snapshot_gap)
+    def __init__(self, snapshot_config, async_snapshots=True):
+        snapshotter_class = (AsyncSnapshotter
+                             if async_snapshots else Snapshotter)
+        self._snapshotter = snapshotter_class(snapshot_config.snapshot_dir,
+                                              snapshot_config.snapshot_mode,
+                                              snapshot_config.snapshot_gap)
 
         self._has_setup = False
         self._plot = False
@@ -293,6 +313,11 @@ class Trainer:
 
         logger.log('Saved')
 
+    def _flush_snapshots(self):
+        """Wait until every snapshot is written to disk."""
+        if isinstance(self._snapshotter, AsyncSnapshotter):
+            self._snapshotter.flush()
+
     def restore(self, from_dir, from_epoch='last'):
         """Restore experiment from snapshot.
 
@@ -307,6 +332,7 @@ class Trainer:
             TrainArgs: Arguments for train().
 
         """
+        self._flush_snapshots()
         saved = self._snapshotter.load(from_dir, from_epoch)
 
         self._seed = saved['seed']
@@ -402,6 +428,7 @@ class Trainer:
 
         average_return = self._algo.train(self)
         self._shutdown_worker()
+        self._flush_snapshots()
 
         return average_return
 
@@ -497,6 +524,7 @@ class Trainer:
 
         average_return = self._algo.train(self)
         self._shutdown_worker()
+        self._flush_snapshots()
 
         return average_return
 
@@ -591,6 +619,7 @@ class TFTrainer(Trainer):
     """
 
     def __init__(self, snapshot_config, sess=None):
+        _import_tf()
         super().__init__(snapshot_config=snapshot_config)
         self.sess = sess or tf.compat.v1.Session()
         self.sess_entered = False
@@ -665,16 +694,3 @@ class TFTrainer(Trainer):
                     if v.name.split(':')[0] in uninited_set
                 ]))
 
-
-class __FakeTFTrainer:
-    # noqa: E501; pylint: disable=missing-param-doc,too-few-public-methods,no-method-argument
-    """Raises an ImportError for environments without TensorFlow."""
-
-    def __init__(*args, **kwargs):
-        raise ImportError(
-            'TFTrainer requires TensorFlow. To use it, please install '
-            'TensorFlow.')
-
-
-if not tf:
-    TFTrainer = __FakeTFTrainer  # noqa: F811
@@ -30,13 +30,19 @@ class SMCFilter(object):
         distribution.
     :param int max_plate_nesting: Bound on max number of nested
         :func:`pyro.plate` contexts.
+    :param float ess_threshold: Effective sample size threshold for deciding
+        when to importance resample: resample when
+        ``ess < ess_threshold * num_particles``.
     """
     # TODO: Add window kwarg that defaults to float("inf")
-    def __init__(self, model, guide, num_particles, max_plate_nesting):
+    def __init__(self, model, guide, num_particles, max_plate_nesting,
+                 ess_threshold=0.5):
+        assert 0 < ess_threshold <= 1
         self.model = model
         self.guide = guide
         self.num_particles = num_particles
         self.max_plate_nesting = max_plate_nesting
+        self.ess_threshold = ess_threshold
 
         # Equivalent to an empirical distribution.
         self._values = {}
@@ -81,6 +87,15 @@ class SMCFilter(object):
         # TODO: Be clear that these are unnormalized weights. May want to normalize later.
         return self._values, self._log_weights
 
+    def get_ess(self):
+        """
+        :returns: the effective sample size of the particles,
+            ``1 / sum(w_i ** 2)`` for the normalized weights ``w``.
+        :rtype: torch.Tensor
+        """
+        log_w = self._log_weights - self._log_weights.logsumexp(-1)
+        return log_w.mul(2).exp().sum(-1).reciprocal()
+
     def get_empirical(self):
         """
         :returns: a marginal distribution over every latent variable.
@@ -115,7 +130,7 @@ class SMCFilter(object):
         self._log_weights -= self._log_weights.max()
 
     def _maybe_importance_resample(self):
-        if True:  # TODO check perplexity
+        if self.get_ess() < self.ess_threshold * self.num_particles:
             self._importance_resample()
 
     def _importance_resample(self):
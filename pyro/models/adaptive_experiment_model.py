@@ -1,7 +1,7 @@
 from abc import ABC
 
 from contextlib import ExitStack
-from functools import partial
+from functools import lru_cache, partial
 from pyro import poutine
 from pyro.contrib.util import iter_plates_to_shape, lexpand, rexpand, rmv
 from pyro.util import is_bad
@@ -45,7 +45,22 @@ class ExperimentModel(ABC):
         y = y.detach().clone()
         return y
 
+    def log_likelihood(self, y, design, thetas):
+        """
+        Closed-form log-likelihood of `y` under every sample in `thetas`.
+
+        Models whose emission distribution can be written down directly
+        override this with a pure-tensor kernel that bypasses the poutine
+        handlers used by `traced_likelihoods`.
+        """
+        raise NotImplementedError
+
     def get_likelihoods(self, y, design, thetas):
+        if type(self).log_likelihood is not ExperimentModel.log_likelihood:
+            return self.log_likelihood(y, design, thetas)
+        return self.traced_likelihoods(y, design, thetas)
+
+    def traced_likelihoods(self, y, design, thetas):
         size = thetas[self.var_names[0]].shape[0]
         cond_dict = dict(thetas)
         cond_dict.update({self.obs_label: lexpand(y, size)})
@@ -55,6 +70,30 @@ class ExperimentModel(ABC):
         likelihoods = trace.nodes[self.obs_label]["log_prob"]
         return likelihoods
 
+    def prior_dists(self):
+        """
+        The prior of every latent in `var_names` for a single experiment,
+        for drawing theta directly without tracing the model.
+        """
+        raise NotImplementedError
+
+    def success_probs(self, thetas, designs):
+        """
+        Success probability of a single trial under every sample in `thetas`
+        at every design value in the 1-d tensor `designs`, of shape
+        `(num_theta, n_parallel, len(designs))`, for models whose outcomes
+        are counts of successes.
+        """
+        raise NotImplementedError
+
+    def tabulated_log_likelihood(self, y, design, probs):
+        """
+        Log-likelihood of `y` given the success probabilities `probs` of
+        every design dimension, of shape `(num_theta, n_parallel, d)`, with
+        the shape of `get_likelihoods`.
+        """
+        raise NotImplementedError
+
     def sample_theta(self, num_theta):
         dummy_design = torch.zeros(
             (num_theta, self.n_parallel, 1, 1, self.var_dim))
@@ -126,10 +165,10 @@ class CESModel(ExperimentModel):
                     stack.enter_context(plate)
                 rho_shape = batch_shape + (self.rho_con_model.shape[-1],)
                 #print("rhoshape", rho_shape)
-                rho = 0.01 + 0.99 * pyro.sample(
+                rho = pyro.sample(
                     "rho",
                     dist.Dirichlet(self.rho_con_model.expand(rho_shape))
-                ).select(-1, 0)
+                )
                 #print("rhomodelshape", self.rho_con_model.shape)
                 #print("rho on its own shape", rho.shape)
                 alpha_shape = batch_shape + (self.alpha_con_model.shape[-1],)
@@ -145,22 +184,7 @@ class CESModel(ExperimentModel):
                     )
                 )
                 #print("u", u.shape)
-                rho = rexpand(rho, design.shape[-2])
-                #print("rhoexpand", rho.shape)
-                u = rexpand(u, design.shape[-2])
-                #print("uexpand.shape", u.shape)
-                #print("rho.unsqueeze(-1)", rho.unsqueeze(-1).shape)
-                d1, d2 = design[..., 0:math.floor(self.var_dim/2)], design[..., math.floor(self.var_dim/2):self.var_dim]
-                #print(d1.shape, d2.shape)
-                u1rho = (rmv(d1.pow(rho.unsqueeze(-1)), alpha)).pow(1. / rho)
-                u2rho = (rmv(d2.pow(rho.unsqueeze(-1)), alpha)).pow(1. / rho)
-                mean = u * (u1rho - u2rho)
-                sd = u * self.obs_sd * (
-                        1 + torch.norm(d1 - d2, dim=-1, p=2))
-                #print("m,sd", mean.shape, sd.shape)
-                emission_dist = dist.CensoredSigmoidNormal(
-                    mean, sd, 1 - self.epsilon, self.epsilon
-                ).to_event(1)
+                emission_dist = self.emission_dist(rho, alpha, u, design)
                 #print("emission_dist", emission_dist.shape)
                 y = pyro.sample(self.obs_label, emission_dist)
                 #print("y", y.shape)
@@ -168,6 +192,35 @@ class CESModel(ExperimentModel):
 
         return model
 
+    def prior_dists(self):
+        return {
+            "rho": dist.Dirichlet(self.rho_con_model[0, 0]),
+            "alpha": dist.Dirichlet(self.alpha_con_model[0, 0]),
+            "u": dist.LogNormal(self.u_mu_model[0, 0], self.u_sig_model[0, 0]),
+        }
+
+    def emission_dist(self, rho, alpha, u, design):
+        rho = 0.01 + 0.99 * rho.select(-1, 0)
+        rho = rexpand(rho, design.shape[-2])
+        u = rexpand(u, design.shape[-2])
+        d1, d2 = design[..., 0:math.floor(self.var_dim/2)], design[..., math.floor(self.var_dim/2):self.var_dim]
+        u1rho = (rmv(d1.pow(rho.unsqueeze(-1)), alpha)).pow(1. / rho)
+        u2rho = (rmv(d2.pow(rho.unsqueeze(-1)), alpha)).pow(1. / rho)
+        mean = u * (u1rho - u2rho)
+        sd = u * self.obs_sd * (
+                1 + torch.norm(d1 - d2, dim=-1, p=2))
+        return dist.CensoredSigmoidNormal(
+            mean, sd, 1 - self.epsilon, self.epsilon
+        ).to_event(1)
+
+    def log_likelihood(self, y, design, thetas):
+        if is_bad(design):
+            raise ArithmeticError("bad design, contains nan or inf")
+        size = thetas[self.var_names[0]].shape[0]
+        emission_dist = self.emission_dist(
+            thetas["rho"], thetas["alpha"], thetas["u"], lexpand(design, size))
+        return emission_dist.log_prob(lexpand(y, size))
+
     def get_params(self):
         return torch.cat(
             [
@@ -190,10 +243,61 @@ def holling3(a, th, t, n):
     return -an2 / (1 + an2 * th)
 
 
+@lru_cache(maxsize=None)
+def rk4_grid(tau, step_size):
+    """
+    The steps of `torchdiffeq.odeint(..., method="rk4")` over `[0, tau]`:
+    steps of `step_size`, the last one shortened to end at `tau`.
+    """
+    n_steps = max(math.ceil(tau / step_size), 1)
+    return (step_size,) * (n_steps - 1) + (tau - (n_steps - 1) * step_size,)
+
+
+def holling_rk4(func, a, th, n0, tau, step_size=1.):
+    """
+    Number of prey left at `tau` from `n0`, by fixed-step RK4 on
+    dn/dt = func(a, th, t, n).
+
+    Takes the same 3/8-rule steps as `torchdiffeq.odeint(..., method="rk4",
+    options={'step_size': step_size})`, without the generic solver's
+    dispatch, so that a step is a few elementwise operations on the batch.
+    """
+    n, t = n0, 0.
+    for dt in rk4_grid(float(tau), float(step_size)):
+        k1 = func(a, th, t, n)
+        k2 = func(a, th, t + dt / 3, n + dt * k1 / 3)
+        k3 = func(a, th, t + dt * 2 / 3, n + dt * (k2 - k1 / 3))
+        k4 = func(a, th, t + dt, n + dt * (k1 - k2 + k3))
+        n = n + (k1 + 3 * (k2 + k3) + k4) * dt / 8
+        t += dt
+    return n
+
+
+def holling3_exact(a, th, n0, tau):
+    """
+    Exact number of prey left at `tau` from `n0` under `holling3`.
+
+    Integrating the ODE gives a th n - 1 / n = k, with
+    k = a th n0 - 1 / n0 - a tau, whose positive root is computed without
+    cancellation for either sign of k.
+    """
+    ath = a * th
+    k = ath * n0 - 1 / n0 - a * tau
+    root = torch.sqrt(k * k + 4 * ath)
+    return torch.where(k >= 0, (k + root) / (2 * ath), 2 / (root - k))
+
+
 class PreyModel(ExperimentModel):
     def __init__(self, a_mu=None, a_sig=None, th_mu=None, th_sig=None, tau=24.,
-                 n_parallel=1, obs_sd=0.005, obs_label="y"):
+                 n_parallel=1, obs_sd=0.005, obs_label="y", solver="rk4"):
+        """
+        solver is one of "rk4", a fixed-step RK4 kernel which takes the same
+        steps as torchdiffeq, "odeint", torchdiffeq itself, or "exact", the
+        closed-form solution of the ODE.
+        """
         super().__init__()
+        assert solver in ["rk4", "odeint", "exact"]
+        self.solver = solver
         self.a_mu = a_mu if a_mu is not None \
             else torch.ones(n_parallel, 1, 1) * -1.4
         self.a_sig = a_sig if a_sig is not None \
@@ -227,7 +331,6 @@ class PreyModel(ExperimentModel):
                         self.a_sig.expand(a_shape)
                     ).to_event(1)
                 )
-                a = a.expand(a.shape[:-1] + design.shape[-2:-1])
                 th_shape = batch_shape + self.th_mu.shape[-1:]
                 th = pyro.sample(
                     "th",
@@ -236,21 +339,7 @@ class PreyModel(ExperimentModel):
                         self.th_sig.expand(th_shape)
                     ).to_event(1)
                 )
-                th = th.expand(th.shape[:-1] + design.shape[-2:-1])
-                diff_func = partial(
-                    holling3,
-                    a.flatten(),
-                    th.flatten())
-                int_sol = odeint(
-                    diff_func,
-                    design.flatten(),
-                    torch.tensor([0., self.tau]),
-                    method="rk4",
-                    options={'step_size': 1.})
-                n_t = int_sol[-1].reshape(design.shape)
-                p_t = (design - n_t) / design
-                emission_dist = dist.Binomial(design.reshape(a.shape),
-                                              p_t.reshape(a.shape), validate_args=False).to_event(1)
+                emission_dist = self.emission_dist(a, th, design)
                 #print("design.shape", design.shape, design)
                 #print("design.reshape(a.shape)", design.reshape(a.shape).shape, design.reshape(a.shape))
                 #print("a.shape", a.shape)
@@ -264,6 +353,61 @@ class PreyModel(ExperimentModel):
 
         return model
 
+    def solve(self, a, th, n0):
+        """
+        Number of prey left at `tau` from `n0` under `holling3`.
+        """
+        if self.solver == "exact":
+            return holling3_exact(a, th, n0, self.tau)
+        if self.solver == "odeint":
+            int_sol = odeint(
+                partial(holling3, a, th),
+                n0,
+                torch.tensor([0., self.tau]),
+                method="rk4",
+                options={'step_size': 1.})
+            return int_sol[-1]
+        return holling_rk4(holling3, a, th, n0, self.tau)
+
+    def emission_dist(self, a, th, design):
+        design = design.float()
+        a = a.expand(a.shape[:-1] + design.shape[-2:-1])
+        th = th.expand(th.shape[:-1] + design.shape[-2:-1])
+        n_t = self.solve(
+            a.flatten(), th.flatten(), design.flatten()).reshape(design.shape)
+        p_t = (design - n_t) / design
+        return dist.Binomial(design.reshape(a.shape),
+                             p_t.reshape(a.shape), validate_args=False).to_event(1)
+
+    def log_likelihood(self, y, design, thetas):
+        if is_bad(design):
+            raise ArithmeticError("bad design, contains nan or inf")
+        size = thetas[self.var_names[0]].shape[0]
+        emission_dist = self.emission_dist(
+            thetas["a"], thetas["th"], lexpand(design, size))
+        return emission_dist.log_prob(lexpand(y, size))
+
+    def success_probs(self, thetas, designs):
+        num_theta, n_parallel = thetas["a"].shape[:2]
+        n0 = designs.float().expand((num_theta, n_parallel) + designs.shape)
+        a = thetas["a"].reshape(num_theta, n_parallel, 1).expand(n0.shape)
+        th = thetas["th"].reshape(num_theta, n_parallel, 1).expand(n0.shape)
+        n_t = self.solve(
+            a.flatten(), th.flatten(), n0.flatten()).reshape(n0.shape)
+        return (n0 - n_t) / n0
+
+    def tabulated_log_likelihood(self, y, design, probs):
+        n0 = design.float().reshape(probs.shape[1:])
+        emission_dist = dist.Binomial(n0, probs, validate_args=False)
+        log_probs = emission_dist.log_prob(y.reshape(probs.shape[1:]))
+        return log_probs.sum(dim=-1, keepdim=True)
+
+    def prior_dists(self):
+        return {
+            "a": dist.LogNormal(self.a_mu[0, 0], self.a_sig[0, 0]),
+            "th": dist.LogNormal(self.th_mu[0, 0], self.th_sig[0, 0]),
+        }
+
     def reset(self, n_parallel):
         self.n_parallel = n_parallel
         self.a_mu = torch.ones(n_parallel, 1, 1) * -1.4
@@ -306,12 +450,7 @@ class SourceModel(ExperimentModel):
                     ).to_event(2)
                 )
                 #print("theta", theta.shape)
-                distance = torch.square(theta - design).sum(dim=-1)
-                ratio = self.alpha / (self.m + distance)
-                mu = self.b + ratio.sum(dim=-1, keepdims=True)
-                emission_dist = dist.Normal(
-                    torch.log(mu), self.obs_sd
-                ).to_event(1)
+                emission_dist = self.emission_dist(theta, design)
                 #print("emission_dist", emission_dist.shape)
                 y = pyro.sample(self.obs_label, emission_dist)
                 #print("y", y.shape)
@@ -319,6 +458,25 @@ class SourceModel(ExperimentModel):
 
         return model
 
+    def prior_dists(self):
+        return {
+            "theta": dist.Normal(self.theta_mu[0, 0], self.theta_sig[0, 0]),
+        }
+
+    def emission_dist(self, theta, design):
+        distance = torch.square(theta - design).sum(dim=-1)
+        ratio = self.alpha / (self.m + distance)
+        mu = self.b + ratio.sum(dim=-1, keepdims=True)
+        return dist.Normal(torch.log(mu), self.obs_sd).to_event(1)
+
+    def log_likelihood(self, y, design, thetas):
+        if is_bad(design):
+            raise ArithmeticError("bad design, contains nan or inf")
+        size = thetas[self.var_names[0]].shape[0]
+        emission_dist = self.emission_dist(
+            thetas["theta"], lexpand(design, size))
+        return emission_dist.log_prob(lexpand(y, size))
+
     def reset(self, n_parallel):
         self.n_parallel = n_parallel
         self.theta_mu = torch.zeros(n_parallel, 1, self.k, self.d)
@@ -387,10 +545,10 @@ class DockingModel(ExperimentModel):
                 for plate in iter_plates_to_shape(batch_shape):
                     stack.enter_context(plate)
                 top_shape = batch_shape + (self.top_prior_con.shape[-1],)
-                top = pyro.sample("top", dist.Dirichlet(self.top_prior_con.expand(top_shape))).select(-1, 0)
+                top = pyro.sample("top", dist.Dirichlet(self.top_prior_con.expand(top_shape)))
                 #print("self.top_prior_con", self.top_prior_con.shape)
                 bottom_shape = batch_shape + (self.bottom_prior_con.shape[-1],)
-                bottom = pyro.sample("bottom", dist.Dirichlet(self.bottom_prior_con.expand(bottom_shape))).select(-1, 0)
+                bottom = pyro.sample("bottom", dist.Dirichlet(self.bottom_prior_con.expand(bottom_shape)))
                 #print("self.bottom_prior_con", self.bottom_prior_con.shape)
                 ee50 = pyro.sample("ee50", dist.Normal(self.ee50_prior_mu.expand(batch_shape), self.ee50_prior_sd.expand(batch_shape)))
                 #print("self.ee50_prior_mu", self.ee50_prior_mu.shape)
@@ -398,23 +556,8 @@ class DockingModel(ExperimentModel):
                 #print("self.slope_prior_mu", self.slope_prior_mu.shape)
                 #print("topshape", top_shape, "bottomshape", bottom_shape)
                 #print("des", design.shape, "top", top.shape, "bottom", bottom.shape, "ee50", ee50.shape, "slope", slope.shape)
-                top = rexpand(top, design.shape[-2])
-                bottom = rexpand(bottom, design.shape[-2])
-                ee50 = rexpand(ee50, design.shape[-2])
-                slope = rexpand(slope, design.shape[-2])
-                a = design.squeeze(-2).shape
-                #print("a", a)
-                #print("topexpand", top.shape)
-                #print("bottomexpand", bottom.shape)
-                #print("ee50expand", ee50.shape)
-                #print("slopeexpand", slope.shape)
-                top = top.unsqueeze(-1)
-                bottom = bottom.unsqueeze(-1)
-                ee50 = ee50.unsqueeze(-1)
-                slope = slope.unsqueeze(-1)
-                hit_rate = sigmoid(design, top, bottom, ee50, slope)
-                #print(hit_rate, hit_rate.shape)
-                emission_dist = dist.Bernoulli(hit_rate.reshape(a)).to_event(1)
+                emission_dist = self.emission_dist(
+                    top, bottom, ee50, slope, design)
                 #print("emission_dist", emission_dist.shape)
                 #print(emission_dist.sample())
                 y = pyro.sample(self.obs_label, emission_dist)
@@ -422,6 +565,45 @@ class DockingModel(ExperimentModel):
                 return y
 
         return model
+
+    def prior_dists(self):
+        return {
+            "top": dist.Dirichlet(self.top_prior_con),
+            "bottom": dist.Dirichlet(self.bottom_prior_con),
+            "ee50": dist.Normal(self.ee50_prior_mu, self.ee50_prior_sd),
+            "slope": dist.Normal(self.slope_prior_mu, self.slope_prior_sd),
+        }
+
+    def success_probs(self, thetas, designs):
+        return sigmoid(designs, thetas["top"].select(-1, 0),
+                       thetas["bottom"].select(-1, 0), thetas["ee50"],
+                       thetas["slope"])
+
+    def tabulated_log_likelihood(self, y, design, probs):
+        emission_dist = dist.Bernoulli(probs)
+        log_probs = emission_dist.log_prob(y.reshape(probs.shape[1:]))
+        return log_probs.sum(dim=-1, keepdim=True)
+
+    def hit_rate(self, top, bottom, ee50, slope, design):
+        top = rexpand(top.select(-1, 0), design.shape[-2]).unsqueeze(-1)
+        bottom = rexpand(bottom.select(-1, 0), design.shape[-2]).unsqueeze(-1)
+        ee50 = rexpand(ee50, design.shape[-2]).unsqueeze(-1)
+        slope = rexpand(slope, design.shape[-2]).unsqueeze(-1)
+        return sigmoid(design, top, bottom, ee50, slope)
+
+    def emission_dist(self, top, bottom, ee50, slope, design):
+        hit_rate = self.hit_rate(top, bottom, ee50, slope, design)
+        return dist.Bernoulli(
+            hit_rate.reshape(design.squeeze(-2).shape)).to_event(1)
+
+    def log_likelihood(self, y, design, thetas):
+        if is_bad(design):
+            raise ArithmeticError("bad design, contains nan or inf")
+        size = thetas[self.var_names[0]].shape[0]
+        emission_dist = self.emission_dist(
+            thetas["top"], thetas["bottom"], thetas["ee50"], thetas["slope"],
+            lexpand(design, size))
+        return emission_dist.log_prob(lexpand(y, size))
     
     def reset(self, n_parallel, top_prior_con=None, bottom_prior_con=None, ee50_prior_mu=None, ee50_prior_sd=None, slope_prior_mu=None,
             slope_prior_sd=None):
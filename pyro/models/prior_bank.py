@@ -0,0 +1,156 @@
+import os
+import warnings
+
+import numpy as np
+import torch
+
+
+class PriorBank:
+    """
+    A pool of prior samples of theta, drawn once and served in slices.
+
+    `ExperimentModel.sample_theta` traces the whole model over a dummy design
+    only to read the prior samples, which dominates `AdaptiveDesignEnv.reset`
+    for large numbers of contrastive samples. As the priors are fixed, the
+    bank instead draws `size` samples per latent directly from the
+    distributions of `model.prior_dists()` and stores them in one array per
+    latent, in memory or memory-mapped in `directory`.
+
+    `sample_theta(num_theta)` has the shape of `model.sample_theta`. It serves
+    contiguous blocks of `num_theta * n_parallel` rows, in a random order of
+    blocks which changes every pass, so the blocks of one pass never overlap.
+    After `refresh_every` passes the pool is redrawn from the prior, so by
+    default no sample is served twice. With `refresh_every=None` the pool is
+    drawn once and only reshuffled, so a run drawing more than `size`
+    samples reuses them; a warning is raised when this first happens. The
+    priors are assumed to be the same for every parallel experiment.
+
+    A memory-mapped pool is written under a temporary name and renamed once
+    complete. With `reuse=True` and `refresh_every=None`, a complete pool of
+    the same shape already in `directory` is memory-mapped read-only instead
+    of being drawn again, so that runs with the same prior, e.g. the seeds of
+    a sweep, can share one pool.
+
+    args:
+        model (models.ExperimentModel): a model with `prior_dists`
+        size (int): number of samples per latent in the pool
+        directory (str): if given, the pool is memory-mapped from
+            `<directory>/<latent>.npy`
+        refresh_every (int): number of passes through the pool before it is
+            redrawn from the prior, or None to never redraw it
+        chunk_size (int): number of samples drawn from the prior at a time
+            when filling the pool
+        reuse (bool): memory-map a pool left in `directory` by an earlier
+            bank, if any, instead of drawing a new one. Only used with
+            `refresh_every=None`
+    """
+
+    def __init__(self, model, size, directory=None, refresh_every=1,
+                 chunk_size=int(1e6), reuse=False):
+        assert refresh_every is None or refresh_every > 0
+        self.model = model
+        self.size = size
+        self.directory = directory
+        self.refresh_every = refresh_every
+        self.chunk_size = chunk_size
+        self.reuse = reuse
+        self._pool = None
+        self._block_size = None
+        self._order = []
+        self._n_passes = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the pool is redrawn on first use rather than pickled
+        state['_pool'] = None
+        state['_block_size'] = None
+        state['_order'] = []
+        return state
+
+    def _path(self, name):
+        return os.path.join(self.directory, '{}.npy'.format(name))
+
+    def _load(self, name, shape, dtype):
+        """
+        Memory-map the pool of `name` left in `directory`, if there is one
+        of the given shape and dtype.
+        """
+        if not self.reuse or self.directory is None or \
+                self.refresh_every is not None or \
+                not os.path.exists(self._path(name)):
+            return None
+        array = np.load(self._path(name), mmap_mode='r')
+        if array.shape != shape or array.dtype != dtype:
+            return None
+        return array
+
+    def _allocate(self, name, shape, dtype):
+        if self.directory is None:
+            return np.empty(shape, dtype=dtype)
+        os.makedirs(self.directory, exist_ok=True)
+        return np.lib.format.open_memmap(
+            self._path(name) + '.{}.tmp'.format(os.getpid()), mode='w+',
+            dtype=dtype, shape=shape)
+
+    @torch.no_grad()
+    def refill(self):
+        """
+        Redraw the whole pool from the prior, or, with `reuse`, memory-map
+        the pool left in `directory`.
+        """
+        pool = {}
+        for name, prior in self.model.prior_dists().items():
+            shape = (self.size,) + tuple(prior.batch_shape + prior.event_shape)
+            dtype = torch.empty(0, dtype=prior.mean.dtype,
+                                device='cpu').numpy().dtype
+            pool[name] = self._load(name, shape, dtype)
+            if pool[name] is not None:
+                continue
+            pool[name] = self._allocate(name, shape, dtype)
+            for start in range(0, self.size, self.chunk_size):
+                n = min(self.chunk_size, self.size - start)
+                pool[name][start:start + n] = \
+                    prior.sample((n,)).cpu().numpy()
+            if isinstance(pool[name], np.memmap):
+                pool[name].flush()
+                os.replace(pool[name].filename, self._path(name))
+        self._pool = pool
+        self._n_passes = 0
+
+    def _new_pass(self, block_size):
+        if self._pool is None or (
+                self.refresh_every is not None and
+                self._n_passes >= self.refresh_every):
+            self.refill()
+        elif self.refresh_every is None and self._n_passes == 1:
+            warnings.warn(
+                'Every sample of the PriorBank of size {} has been served, '
+                'the samples are now reused. Set refresh_every to redraw '
+                'them.'.format(self.size))
+        self._block_size = block_size
+        self._order = torch.randperm(
+            self.size // block_size, device='cpu').tolist()
+        self._n_passes += 1
+
+    def sample_theta(self, num_theta):
+        """
+        Return a block of `num_theta` prior samples for every parallel
+        experiment, shaped as the samples of `model.sample_theta`.
+        """
+        n_parallel = self.model.n_parallel
+        block_size = num_theta * n_parallel
+        if block_size > self.size:
+            raise ValueError(
+                'A bank of {} samples cannot serve {} samples for {} '
+                'parallel experiments.'.format(
+                    self.size, num_theta, n_parallel))
+        if block_size != self._block_size or not self._order:
+            self._new_pass(block_size)
+        start = self._order.pop() * block_size
+        device = torch.empty(0).device
+        return {
+            name: torch.tensor(
+                array[start:start + block_size], device=device).reshape(
+                    (num_theta, n_parallel, 1) + array.shape[1:])
+            for name, array in self._pool.items()}
+
@@ -0,0 +1,207 @@
+import math
+
+import torch
+from torch.distributions import transform_to
+
+import pyro.distributions as dist
+from pyro import poutine
+
+
+class SMCPosterior:
+    """
+    Tracks the posterior of an adaptive `ExperimentModel` with sequential
+    Monte Carlo, as an incremental alternative to refitting a guide with
+    `elbo_learn` on the whole history after every experiment.
+
+    Each of the `n_parallel` posteriors is a set of `num_particles` weighted
+    prior samples. `run_experiment` only multiplies the weights by the
+    likelihood of the newest outcome, and, as in `SMCFilter`, only resamples
+    when the effective sample size drops below
+    `ess_threshold * num_particles`. Resampled particles are rejuvenated with
+    the Liu-West kernel in unconstrained space, which shrinks them towards
+    their mean by `kernel_shrinkage` and adds Gaussian noise so that their
+    mean and covariance are kept, without looking at past outcomes. An
+    experiment hence costs the same however many came before it.
+
+    The posterior is summarised by `get_params`, the weighted mean and
+    standard deviation of every latent in unconstrained space, and by
+    `entropy`, a Gaussian estimate in unconstrained space mapped back through
+    the log-Jacobian of the constraints, so the tracker can be used wherever
+    `DesignEnv` expects an experiment model.
+
+    args:
+        model (models.ExperimentModel): an adaptive experiment model, which
+            provides `make_model`, `run_experiment`, `get_likelihoods` and
+            `var_names`
+        num_particles (int): number of particles of each posterior
+        ess_threshold (float): resample when the effective sample size is
+            below this fraction of `num_particles`
+        kernel_shrinkage (float): Liu-West shrinkage, in (0, 1]; 1 only
+            resamples without moving the particles
+    """
+
+    def __init__(self, model, num_particles=1000, ess_threshold=0.5,
+                 kernel_shrinkage=0.98):
+        assert 0 < ess_threshold <= 1
+        assert 0 < kernel_shrinkage <= 1
+        self.model = model
+        self.num_particles = num_particles
+        self.ess_threshold = ess_threshold
+        self.kernel_shrinkage = kernel_shrinkage
+        self.n_parallel = model.n_parallel
+        self.reset(self.n_parallel)
+
+    def reset(self, n_parallel=None):
+        """
+        Draw fresh particles from the prior of the model.
+        """
+        if n_parallel is not None and n_parallel != self.model.n_parallel:
+            self.model.reset(n_parallel=n_parallel)
+        self.n_parallel = self.model.n_parallel
+        dummy_design = torch.zeros(
+            (self.num_particles, self.n_parallel, 1, 1, self.model.var_dim))
+        trace = poutine.trace(self.model.make_model()).get_trace(dummy_design)
+        self._values = {name: trace.nodes[name]["value"].detach()
+                        for name in self.model.var_names}
+        self._transforms = {
+            name: transform_to(trace.nodes[name]["fn"].support)
+            for name in self.model.var_names}
+        self._log_weights = torch.full(
+            trace.nodes[self.model.obs_label]["fn"].batch_shape,
+            -math.log(self.num_particles))
+
+    def _expand_weights(self, log_weights, value):
+        return log_weights.reshape(
+            log_weights.shape + (1,) * (value.dim() - log_weights.dim()))
+
+    def _unconstrained(self):
+        """
+        Concatenate the unconstrained values of all latents into a tensor of
+        shape `log_weights.shape + (dim,)`.
+        """
+        return torch.cat(
+            [self._transforms[name].inv(value).reshape(
+                self._log_weights.shape + (-1,))
+             for name, value in self._values.items()], dim=-1)
+
+    def _set_unconstrained(self, z):
+        start = 0
+        for name, value in self._values.items():
+            unconstrained = self._transforms[name].inv(value)
+            size = unconstrained[0].numel() // self._log_weights[0].numel()
+            self._values[name] = self._transforms[name](
+                z[..., start:start + size].reshape(unconstrained.shape))
+            start += size
+
+    def _moments(self, z):
+        """
+        Weighted mean and covariance of the particles `z` over the
+        particle dimension.
+        """
+        weights = self._log_weights.exp().unsqueeze(-1)
+        mean = (weights * z).sum(0)
+        centred = z - mean
+        cov = torch.einsum('p...i,p...j->...ij', weights * centred, centred)
+        return mean, cov
+
+    def _select(self, index):
+        """
+        Gather the particles `index`, of shape `(num, ) + batch_shape`.
+        """
+        selected = {}
+        for name, value in self._values.items():
+            idx = self._expand_weights(index, value)
+            idx = idx.expand(index.shape + value.shape[index.dim():])
+            selected[name] = value.gather(0, idx)
+        return selected
+
+    def get_ess(self):
+        """
+        The effective sample size of each posterior.
+        """
+        return self._log_weights.mul(2).exp().sum(0).reciprocal()
+
+    def get_values_and_log_weights(self):
+        """
+        The particles and their normalized log weights.
+        """
+        return self._values, self._log_weights
+
+    def get_mean_and_variance(self, name):
+        """
+        The weighted mean and elementwise variance of the latent `name`.
+        """
+        value = self._values[name]
+        weights = self._expand_weights(self._log_weights.exp(), value)
+        mean = (weights * value).sum(0)
+        variance = (weights * (value - mean).pow(2)).sum(0)
+        return mean, variance
+
+    def _resample_move(self, resample):
+        """
+        Resample and rejuvenate the posteriors where `resample` is true.
+        """
+        z = self._unconstrained()
+        mean, cov = self._moments(z)
+        eye = torch.eye(z.shape[-1])
+        chol = torch.linalg.cholesky(
+            (1 - self.kernel_shrinkage ** 2) * cov + 1e-8 * eye)
+        index = dist.Categorical(
+            logits=self._log_weights.movedim(0, -1)
+        ).sample((self.num_particles,))
+        index = torch.where(resample,
+                            index, torch.arange(self.num_particles).reshape(
+                                (-1,) + (1,) * resample.dim()))
+        self._values = self._select(index)
+        z = self._unconstrained()
+        noise = torch.matmul(chol, torch.randn_like(z).unsqueeze(-1))
+        moved = self.kernel_shrinkage * z + \
+            (1 - self.kernel_shrinkage) * mean + noise.squeeze(-1)
+        self._set_unconstrained(
+            torch.where(resample.unsqueeze(-1), moved, z))
+        self._log_weights = torch.where(
+            resample, torch.tensor(-math.log(self.num_particles)),
+            self._log_weights)
+
+    @torch.no_grad()
+    def run_experiment(self, design, y=None):
+        """
+        Update the posterior with the outcome `y` of an experiment with given
+        design. If `y` is `None` then fill in a value predicted by the
+        posterior.
+        """
+        if y is None:
+            index = dist.Categorical(
+                logits=self._log_weights.movedim(0, -1)).sample((1,))
+            theta = {name: value[0]
+                     for name, value in self._select(index).items()}
+            y = self.model.run_experiment(design, theta)
+        y = y.detach().clone()
+        self._log_weights = self._log_weights + self.model.get_likelihoods(
+            y, design, self._values)
+        self._log_weights -= self._log_weights.logsumexp(0)
+        resample = self.get_ess() < self.ess_threshold * self.num_particles
+        if resample.any():
+            self._resample_move(resample)
+        return y
+
+    def get_params(self):
+        z = self._unconstrained()
+        mean, cov = self._moments(z)
+        std = cov.diagonal(dim1=-2, dim2=-1).clamp(min=0.).sqrt()
+        return torch.cat([mean, std], dim=-1).reshape(self.n_parallel, -1)
+
+    def entropy(self):
+        z = self._unconstrained()
+        _, cov = self._moments(z)
+        dim = z.shape[-1]
+        gaussian_entropy = 0.5 * dim * (1 + math.log(2 * math.pi)) + \
+            0.5 * torch.logdet(cov + 1e-8 * torch.eye(dim))
+        log_det = 0.
+        for name, value in self._values.items():
+            transform = self._transforms[name]
+            ladj = transform.log_abs_det_jacobian(transform.inv(value), value)
+            log_det = log_det + ladj.reshape(
+                self._log_weights.shape + (-1,)).sum(-1)
+        weights = self._log_weights.exp()
+        return gaussian_entropy + (weights * log_det).sum(0)
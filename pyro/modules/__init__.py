@@ -1,7 +1,11 @@
+from pyro.modules.ensemble_mlp_module import EnsembleMLPModule
 from pyro.modules.gaussian_mlp_module import MLPModule, \
     GaussianMLPTwoHeadedModule
+from pyro.modules.history_encoder import AdaptiveHistoryEncoder
 
 __all__ = [
+    'AdaptiveHistoryEncoder',
+    'EnsembleMLPModule',
     'GaussianMLPTwoHeadedModule',
     'MLPModule',
 ]
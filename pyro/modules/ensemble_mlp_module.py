@@ -0,0 +1,147 @@
+"""EnsembleMLPModule."""
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from garage.torch import NonLinearity
+
+
+class EnsembleMLPModule(nn.Module):
+    """An ensemble of identically shaped MLPs evaluated in a single pass.
+
+    The weights of every member are stacked along a leading ensemble
+    dimension, so each layer of the whole ensemble is one batched matmul
+    instead of one matmul per member. Member `i` is initialised exactly like
+    a `garage.torch.modules.MLPModule` with the same arguments.
+
+    Inputs should be of shape (ens_size, *, input_dim), or
+    (1, *, input_dim) to feed the same input to every member. Outputs are
+    of shape (ens_size, *, output_dim).
+
+    Args:
+        ens_size (int): Number of members in the ensemble.
+        input_dim (int) : Dimension of the network input.
+        output_dim (int): Dimension of the network output.
+        hidden_sizes (list[int]): Output dimension of dense layer(s).
+        hidden_nonlinearity (callable or torch.nn.Module): Activation function
+            for intermediate dense layer(s). Set it to None to maintain a
+            linear activation.
+        hidden_w_init (callable): Initializer function for the weight
+            of intermediate dense layer(s).
+        hidden_b_init (callable): Initializer function for the bias
+            of intermediate dense layer(s).
+        output_nonlinearity (callable or torch.nn.Module): Activation function
+            for output dense layer. Set it to None to maintain a linear
+            activation.
+        output_w_init (callable): Initializer function for the weight
+            of output dense layer(s).
+        output_b_init (callable): Initializer function for the bias
+            of output dense layer(s).
+        dropout (float): Dropout probability after each hidden dense layer.
+        layer_normalization (bool): Bool for using layer normalization or not.
+
+    """
+
+    def __init__(self,
+                 ens_size,
+                 input_dim,
+                 output_dim,
+                 hidden_sizes,
+                 hidden_nonlinearity=F.relu,
+                 hidden_w_init=nn.init.xavier_normal_,
+                 hidden_b_init=nn.init.zeros_,
+                 output_nonlinearity=None,
+                 output_w_init=nn.init.xavier_normal_,
+                 output_b_init=nn.init.zeros_,
+                 dropout=0,
+                 layer_normalization=False):
+        super().__init__()
+        self._ens_size = ens_size
+        self._weights = nn.ParameterList()
+        self._biases = nn.ParameterList()
+        self._norm_weights = nn.ParameterList()
+        self._norm_biases = nn.ParameterList()
+        self._layer_normalization = layer_normalization
+        self._dropout = nn.Dropout(dropout) if dropout > 0 else None
+        self._hidden_nonlinearity = NonLinearity(hidden_nonlinearity) \
+            if hidden_nonlinearity else None
+        self._output_nonlinearity = NonLinearity(output_nonlinearity) \
+            if output_nonlinearity else None
+
+        sizes = [input_dim] + list(hidden_sizes) + [output_dim]
+        n_hidden = len(hidden_sizes)
+        for i, (in_size, out_size) in enumerate(zip(sizes[:-1], sizes[1:])):
+            w_init = hidden_w_init if i < n_hidden else output_w_init
+            b_init = hidden_b_init if i < n_hidden else output_b_init
+            weight = torch.empty(ens_size, in_size, out_size)
+            bias = torch.empty(ens_size, out_size)
+            for k in range(ens_size):
+                # initialise in nn.Linear layout so fan-in/out match MLPModule
+                linear = nn.Linear(in_size, out_size)
+                w_init(linear.weight)
+                b_init(linear.bias)
+                weight[k] = linear.weight.detach().t()
+                bias[k] = linear.bias.detach()
+            self._weights.append(nn.Parameter(weight))
+            self._biases.append(nn.Parameter(bias))
+            if layer_normalization and i < n_hidden:
+                self._norm_weights.append(
+                    nn.Parameter(torch.ones(ens_size, out_size)))
+                self._norm_biases.append(
+                    nn.Parameter(torch.zeros(ens_size, out_size)))
+
+    @property
+    def ens_size(self):
+        """int: Number of members in the ensemble."""
+        return self._ens_size
+
+    @staticmethod
+    def _select(param, idx):
+        if idx is None:
+            return param
+        return param[torch.as_tensor(idx, device=param.device)]
+
+    @staticmethod
+    def _member_view(param, x):
+        """Reshape a (ens_size, dim) parameter to broadcast against x."""
+        return param.view(
+            (param.shape[0],) + (1,) * (x.dim() - 2) + param.shape[-1:])
+
+    # pylint: disable=arguments-differ
+    def forward(self, input_value, idx=None):
+        """Forward method.
+
+        Args:
+            input_value (torch.Tensor): Input values with
+                (ens_size, *, input_dim) or (1, *, input_dim) shape.
+            idx (numpy.ndarray or torch.Tensor): If given, only evaluate the
+                members with these indices.
+
+        Returns:
+            torch.Tensor: Output values with (len(idx), *, output_dim) shape.
+
+        """
+        x = input_value
+        n_layers = len(self._weights)
+        for i in range(n_layers):
+            weight = self._select(self._weights[i], idx)
+            bias = self._select(self._biases[i], idx)
+            shape = x.shape
+            x = torch.matmul(x.reshape(shape[0], -1, shape[-1]), weight)
+            x = x.reshape((x.shape[0],) + shape[1:-1] + x.shape[-1:])
+            x = x + self._member_view(bias, x)
+            if i == n_layers - 1:
+                break
+            if self._dropout is not None:
+                x = self._dropout(x)
+            if self._layer_normalization:
+                x = F.layer_norm(x, x.shape[-1:])
+                x = x * self._member_view(
+                    self._select(self._norm_weights[i], idx), x) + \
+                    self._member_view(
+                        self._select(self._norm_biases[i], idx), x)
+            if self._hidden_nonlinearity is not None:
+                x = self._hidden_nonlinearity(x)
+        if self._output_nonlinearity is not None:
+            x = self._output_nonlinearity(x)
+        return x
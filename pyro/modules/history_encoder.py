@@ -0,0 +1,93 @@
+"""AdaptiveHistoryEncoder."""
+from contextlib import contextmanager
+
+from torch import nn
+
+from garage.torch.modules.mlp_module import MLPModule
+
+
+class AdaptiveHistoryEncoder(nn.Module):
+    """Permutation-invariant history encoder that can be shared between
+    networks.
+
+    Encodes every (design, outcome) row of a padded history with an MLP,
+    masks out the padding and sum-pools over the history dimension. Passing
+    one instance as the `encoder` of a policy and of several Q-functions
+    makes them share the encoder weights. Inside a `cached()` block each
+    (observations, mask) pair is encoded only once, however many networks
+    ask for it.
+
+    Args:
+        env_spec (garage.envs.env_spec.EnvSpec): Environment specification.
+        encoder_sizes (list[int]): Output dimension of dense layer(s) for
+            the MLP for encoder.
+        encoder_nonlinearity (callable): Activation function for intermediate
+            dense layer(s) of encoder.
+        encoder_output_nonlinearity (callable): Activation function for encoder
+            output dense layer.
+        encoding_dim (int): Output dimension of output dense layer for encoder.
+
+    """
+
+    def __init__(self,
+                 env_spec,
+                 encoder_sizes=(32, 32),
+                 encoder_nonlinearity=nn.ReLU,
+                 encoder_output_nonlinearity=None,
+                 encoding_dim=16,
+                 **kwargs):
+        super().__init__()
+        self._encoding_dim = encoding_dim
+        self._encoder = MLPModule(
+            input_dim=env_spec.observation_space.flat_dim,
+            output_dim=encoding_dim,
+            hidden_sizes=encoder_sizes,
+            hidden_nonlinearity=encoder_nonlinearity,
+            output_nonlinearity=encoder_output_nonlinearity,
+            **kwargs
+        )
+        self._cache = None
+
+    @property
+    def encoding_dim(self):
+        """int: Dimension of the pooled encoding."""
+        return self._encoding_dim
+
+    @contextmanager
+    def cached(self):
+        """Reuse pooled encodings of identical inputs until the block exits.
+
+        Cached encodings keep their autograd graph, so a block should not
+        span an optimizer step that changes the encoder weights.
+        """
+        self._cache = []
+        try:
+            yield
+        finally:
+            self._cache = None
+
+    # pylint: disable=arguments-differ
+    def forward(self, observations, mask=None):
+        """Return the pooled encoding of a batch of histories.
+
+        Args:
+            observations (torch.Tensor): Histories with shape
+                (batch_dim, history_length, obs_dim).
+            mask (torch.Tensor): a mask to account for 0-padded inputs.
+
+        Returns:
+            torch.Tensor: Pooled encodings with shape
+                (batch_dim, encoding_dim).
+
+        """
+        if self._cache is not None:
+            for cached_obs, cached_mask, pooled_encoding in self._cache:
+                if cached_obs is observations and cached_mask is mask:
+                    return pooled_encoding
+        encoding = self._encoder(observations)
+        if mask is not None:
+            encoding = encoding * mask
+        pooled_encoding = encoding.sum(dim=-2)
+        if self._cache is not None:
+            self._cache.append((observations, mask, pooled_encoding))
+        return pooled_encoding
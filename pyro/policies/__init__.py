@@ -1,12 +1,15 @@
 """Garage wrappers for gym environments."""
+from pyro._lazy import lazy_attributes
 
-from pyro.policies.adaptive_argmax_policy import AdaptiveArgmaxPolicy
-from pyro.policies.adaptive_gaussian_mlp_policy import AdaptiveGaussianMLPPolicy
-from pyro.policies.adaptive_tanh_gaussian_policy import AdaptiveTanhGaussianPolicy
-from pyro.policies.adaptive_gumbel_softmax_policy import AdaptiveGumbelSoftmaxPolicy
-from pyro.policies.adaptive_toy_policy import AdaptiveToyPolicy
-from pyro.policies.epsilon_greedy_policy import EpsilonGreedyPolicy
-from pyro.policies.reproducing_policy import ReproducingPolicy
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'AdaptiveArgmaxPolicy': 'pyro.policies.adaptive_argmax_policy',
+    'AdaptiveGaussianMLPPolicy': 'pyro.policies.adaptive_gaussian_mlp_policy',
+    'AdaptiveTanhGaussianPolicy': 'pyro.policies.adaptive_tanh_gaussian_policy',
+    'AdaptiveGumbelSoftmaxPolicy': 'pyro.policies.adaptive_gumbel_softmax_policy',
+    'AdaptiveToyPolicy': 'pyro.policies.adaptive_toy_policy',
+    'EpsilonGreedyPolicy': 'pyro.policies.epsilon_greedy_policy',
+    'ReproducingPolicy': 'pyro.policies.reproducing_policy',
+})
 
 __all__ = [
     'AdaptiveArgmaxPolicy',
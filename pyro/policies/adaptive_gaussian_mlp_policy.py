@@ -7,9 +7,10 @@ from torch import nn
 from garage.torch import global_device
 from garage.torch.modules import GaussianMLPTwoHeadedModule, MLPModule
 from garage.torch.policies.stochastic_policy import StochasticPolicy
+from pyro.policies.incremental_pooling import IncrementalPoolingMixin
 
 
-class AdaptiveGaussianMLPPolicy(StochasticPolicy):
+class AdaptiveGaussianMLPPolicy(IncrementalPoolingMixin, StochasticPolicy):
     """MLP whose outputs are fed into a Normal distribution..
 
     A policy that contains a MLP to make prediction based on a gaussian
@@ -103,6 +104,7 @@ class AdaptiveGaussianMLPPolicy(StochasticPolicy):
             max_std=max_std,
             std_parameterization=std_parameterization,
             layer_normalization=layer_normalization)
+        self._pooled_state = None
 
     def get_actions(self, observations, mask=None):
         r"""Get actions given observations.
@@ -152,22 +154,8 @@ class AdaptiveGaussianMLPPolicy(StochasticPolicy):
                 for (k, v) in info.items()
             }
 
-    def forward(self, observations, mask=None):
-        """Compute the action distributions from the observations.
-
-        Args:
-            observations (torch.Tensor): Batch of observations on default
-                torch device.
-
-        Returns:
-            torch.distributions.Distribution: Batch distribution of actions.
-            dict[str, torch.Tensor]: Additional agent_info, as torch Tensors
-
-        """
-        encoding = self._encoder(observations)
-        if mask is not None:
-            encoding = encoding * mask
-        pooled_encoding = encoding.sum(dim=-2)
+    def _emit(self, pooled_encoding):
+        """Map pooled encodings to action distributions and agent_info."""
         dist = self._emitter(pooled_encoding)
         ret_mean = dist.mean.clone()
         ret_log_std = (dist.variance.sqrt()).log().clone()
@@ -8,10 +8,11 @@ from pyro.policies.gumbelsoftmax_mlp_module import \
     GumbelSoftmaxMLPTwoHeadedModule
 from garage.torch.modules import MLPModule
 from garage.torch.policies.stochastic_policy import StochasticPolicy
+from pyro.policies.incremental_pooling import IncrementalPoolingMixin
 from torch import nn
 
 
-class AdaptiveGumbelSoftmaxPolicy(StochasticPolicy):
+class AdaptiveGumbelSoftmaxPolicy(IncrementalPoolingMixin, StochasticPolicy):
     """Multiheaded MLP with an encoder and pooling operation.
 
     A policy that takes as input entire histories and maps them to a
@@ -115,6 +116,7 @@ class AdaptiveGumbelSoftmaxPolicy(StochasticPolicy):
             max_temp=max_temp,
             temp_parameterization=temp_parameterization,
             layer_normalization=layer_normalization)
+        self._pooled_state = None
 
     def get_actions(self, observations, mask=None):
         r"""Get actions given observations.
@@ -164,24 +166,14 @@ class AdaptiveGumbelSoftmaxPolicy(StochasticPolicy):
                 for (k, v) in info.items()
             }
 
-    def forward(self, observations, mask=None):
-        """Compute the action distributions from the observations.
-
-        Args:
-            observations (torch.Tensor): Batch of observations on default
-                torch device.
-            mask (torch.Tensor): a mask to account for 0-padded inputs
-
-        Returns:
-            torch.distributions.Distribution: Batch distribution of actions.
-            dict[str, torch.Tensor]: Additional agent_info, as torch Tensors
-
-        """
-        encoding = self._encoder(observations)
-        if mask is not None:
-            encoding = encoding * mask
-        pooled_encoding = encoding.sum(dim=-2)
+    def _emit(self, pooled_encoding):
+        """Map pooled encodings to action distributions and agent_info."""
         dist = self._emitter(pooled_encoding)
         ret_logits = dist.logits.clone()
         ret_log_temp = dist.temperature.log().clone()
         return dist, dict(logits=ret_logits, log_temp=ret_log_temp)
+
+    @staticmethod
+    def _sample(dist):
+        """Sample actions, with a trailing action dimension."""
+        return dist.sample().unsqueeze(dim=-1)
@@ -7,10 +7,11 @@ from garage.torch import global_device
 from garage.torch.distributions import TanhNormal
 from pyro.modules import GaussianMLPTwoHeadedModule, MLPModule
 from garage.torch.policies.stochastic_policy import StochasticPolicy
+from pyro.policies.incremental_pooling import IncrementalPoolingMixin
 from torch import nn
 
 
-class AdaptiveTanhGaussianPolicy(StochasticPolicy):
+class AdaptiveTanhGaussianPolicy(IncrementalPoolingMixin, StochasticPolicy):
     """
     Multiheaded MLP with an encoder and pooling operation.
 
@@ -60,6 +61,11 @@ class AdaptiveTanhGaussianPolicy(StochasticPolicy):
                exponential transformation
             - softplus: the std will be computed as log(1+exp(x))
         layer_normalization (bool): Bool for using layer normalization or not.
+        encoder (pyro.modules.AdaptiveHistoryEncoder): If given, use this
+            encoder shared with the critics instead of building one. The
+            encoder arguments above are then ignored. The policy reads the
+            shared encoding without backpropagating into it, so the encoder
+            is trained by the critic loss only.
 
     """
 
@@ -81,23 +87,29 @@ class AdaptiveTanhGaussianPolicy(StochasticPolicy):
                  min_std=np.exp(-20.),
                  max_std=np.exp(2.),
                  std_parameterization='exp',
-                 layer_normalization=False):
+                 layer_normalization=False,
+                 encoder=None):
         super().__init__(env_spec, name='AdaptiveTanhGaussianPolicy')
 
         self._obs_dim = env_spec.observation_space.flat_dim
         self._action_dim = env_spec.action_space.flat_dim
 
-        self._encoder = MLPModule(
-            input_dim=self._obs_dim,
-            output_dim=encoding_dim,
-            hidden_sizes=encoder_sizes,
-            hidden_nonlinearity=encoder_nonlinearity,
-            hidden_w_init=hidden_w_init,
-            hidden_b_init=hidden_b_init,
-            output_nonlinearity=encoder_output_nonlinearity,
-            output_w_init=output_w_init,
-            output_b_init=output_b_init,
-            layer_normalization=layer_normalization)
+        self._shared_encoder = encoder is not None
+        if self._shared_encoder:
+            self._encoder = encoder
+            encoding_dim = encoder.encoding_dim
+        else:
+            self._encoder = MLPModule(
+                input_dim=self._obs_dim,
+                output_dim=encoding_dim,
+                hidden_sizes=encoder_sizes,
+                hidden_nonlinearity=encoder_nonlinearity,
+                hidden_w_init=hidden_w_init,
+                hidden_b_init=hidden_b_init,
+                output_nonlinearity=encoder_output_nonlinearity,
+                output_w_init=output_w_init,
+                output_b_init=output_b_init,
+                layer_normalization=layer_normalization)
 
         self._emitter = GaussianMLPTwoHeadedModule(
             input_dim=encoding_dim,
@@ -116,6 +128,12 @@ class AdaptiveTanhGaussianPolicy(StochasticPolicy):
             std_parameterization=std_parameterization,
             layer_normalization=layer_normalization,
             normal_distribution_cls=TanhNormal)
+        self._pooled_state = None
+
+    @property
+    def shared_encoder(self):
+        """AdaptiveHistoryEncoder: The shared encoder, or None."""
+        return self._encoder if self._shared_encoder else None
 
     def get_actions(self, observations, mask=None):
         r"""Get actions given observations.
@@ -165,23 +183,8 @@ class AdaptiveTanhGaussianPolicy(StochasticPolicy):
                 for (k, v) in info.items()
             }
 
-    def forward(self, observations, mask=None):
-        """Compute the action distributions from the observations.
-
-        Args:
-            observations (torch.Tensor): Batch of observations on default
-                torch device.
-            mask (torch.Tensor): a mask to account for 0-padded inputs
-
-        Returns:
-            torch.distributions.Distribution: Batch distribution of actions.
-            dict[str, torch.Tensor]: Additional agent_info, as torch Tensors
-
-        """
-        encoding = self._encoder(observations)
-        if mask is not None:
-            encoding = encoding * mask
-        pooled_encoding = encoding.sum(dim=-2)
+    def _emit(self, pooled_encoding):
+        """Map pooled encodings to action distributions and agent_info."""
         dist = self._emitter(pooled_encoding)
         ret_mean = dist.mean.clone()
         ret_log_std = (dist.variance.sqrt()).log().clone()
@@ -12,6 +12,9 @@ from torch import nn
 
 
 class AdaptiveToyPolicy(AdaptiveTanhGaussianPolicy):
+    # forward looks at the whole mask, so actions cannot be pooled row by row
+    get_actions_incremental = None
+
     def forward(self, observations, mask=None):
         """Compute the action distributions from the observations.
 
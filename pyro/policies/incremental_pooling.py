@@ -0,0 +1,92 @@
+"""IncrementalPoolingMixin."""
+import torch
+
+
+class IncrementalPoolingMixin:
+    """Sum-pooled history encoding for the adaptive policies, with a running
+    pooled state for rollouts.
+
+    A policy using this mixin encodes every (design, outcome) row of a
+    history with `self._encoder`, or with a shared AdaptiveHistoryEncoder
+    when `self._shared_encoder` is set, sum-pools the encodings, and maps
+    the pooled encoding to an action distribution and agent_info with its
+    own `_emit`. Policies whose actions are not plain samples of that
+    distribution override `_sample`.
+
+    Since the encodings are sum-pooled, the pooled encoding of a history is
+    the running sum of the encodings of its rows. `get_actions_incremental`
+    keeps that sum for every parallel rollout until `reset()`, so a rollout
+    of length T costs T row encodings instead of T^2.
+    """
+
+    _pooled_state = None
+
+    def forward(self, observations, mask=None):
+        """Compute the action distributions from the observations.
+
+        Args:
+            observations (torch.Tensor): Batch of observations on default
+                torch device.
+            mask (torch.Tensor): a mask to account for 0-padded inputs
+
+        Returns:
+            torch.distributions.Distribution: Batch distribution of actions.
+            dict[str, torch.Tensor]: Additional agent_info, as torch Tensors
+
+        """
+        return self._emit(self._pool(observations, mask))
+
+    def _pool(self, observations, mask=None):
+        """Encode the history rows in `observations` and sum-pool them."""
+        if getattr(self, '_shared_encoder', False):
+            # the shared encoder is trained by the critics
+            return self._encoder(observations, mask).detach()
+        encoding = self._encoder(observations)
+        if mask is not None:
+            encoding = encoding * mask
+        return encoding.sum(dim=-2)
+
+    def _emit(self, pooled_encoding):
+        """Map pooled encodings to action distributions and agent_info."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _sample(dist):
+        """Sample actions from the distributions returned by `_emit`."""
+        return dist.sample()
+
+    def get_actions_incremental(self, new_observations, new_mask=None):
+        r"""Get actions, encoding only the history rows added since the
+        last call.
+
+        Args:
+            new_observations (torch.Tensor): History rows added since the
+                last call, with shape (batch_dim, n_new_rows, obs_dim).
+                n_new_rows may be 0 at the start of a rollout.
+            new_mask (torch.Tensor): a mask to account for 0-padded rows.
+
+        Returns:
+            tuple:
+                * torch.Tensor: Predicted actions.
+                * dict[str, torch.Tensor]: The agent_info of `_emit`.
+
+        """
+        with torch.no_grad():
+            pooled_encoding = self._pool(new_observations, new_mask)
+            if self._pooled_state is not None:
+                pooled_encoding = pooled_encoding + self._pooled_state
+            self._pooled_state = pooled_encoding
+            dist, info = self._emit(pooled_encoding)
+            return self._sample(dist).detach(), {
+                k: v.detach()
+                for (k, v) in info.items()
+            }
+
+    def reset(self, do_resets=None):
+        """Reset the pooled encoding kept by `get_actions_incremental`.
+
+        Args:
+            do_resets (None or list[bool]): Unused, every rollout is reset.
+
+        """
+        self._pooled_state = None
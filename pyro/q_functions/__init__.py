@@ -1,15 +1,18 @@
 """Adaptive versions of Garage q-functions"""
+from pyro._lazy import lazy_attributes
 
-from pyro.q_functions.adaptive_discrete_q_function import \
-    AdaptiveDiscreteQFunction
-from pyro.q_functions.adaptive_dueling_q_function import \
-    AdaptiveDuelingQFunction
-from pyro.q_functions.adaptive_mlp_q_function import AdaptiveMLPQFunction
-from pyro.q_functions.adaptive_lstm_q_function import AdaptiveLSTMQFunction
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'AdaptiveDiscreteQFunction': 'pyro.q_functions.adaptive_discrete_q_function',
+    'AdaptiveDuelingQFunction': 'pyro.q_functions.adaptive_dueling_q_function',
+    'AdaptiveMLPQFunction': 'pyro.q_functions.adaptive_mlp_q_function',
+    'EnsembleAdaptiveMLPQFunction': 'pyro.q_functions.ensemble_adaptive_mlp_q_function',
+    'AdaptiveLSTMQFunction': 'pyro.q_functions.adaptive_lstm_q_function',
+})
 
 __all__ = [
     'AdaptiveDiscreteQFunction',
     'AdaptiveDuelingQFunction',
     'AdaptiveMLPQFunction',
+    'EnsembleAdaptiveMLPQFunction',
     'AdaptiveLSTMQFunction'
 ]
@@ -46,6 +46,9 @@ class AdaptiveDiscreteQFunction(nn.Module):
             of output dense layer(s). The function should return a
             torch.Tensor.
         layer_normalization (bool): Bool for using layer normalization or not.
+        encoder (pyro.modules.AdaptiveHistoryEncoder): If given, use this
+            (possibly shared) encoder instead of building one. The encoder
+            arguments above are then ignored.
     """
 
     def __init__(self,
@@ -61,24 +64,30 @@ class AdaptiveDiscreteQFunction(nn.Module):
                  hidden_b_init=nn.init.zeros_,
                  output_w_init=nn.init.xavier_uniform_,
                  output_b_init=nn.init.zeros_,
-                 layer_normalization=False):
+                 layer_normalization=False,
+                 encoder=None):
         super().__init__()
 
         self._env_spec = env_spec
         self._obs_dim = env_spec.observation_space.flat_dim
         self._action_dim = env_spec.action_space.flat_dim
 
-        self._encoder = MLPModule(
-            input_dim=self._obs_dim,
-            output_dim=encoding_dim,
-            hidden_sizes=encoder_sizes,
-            hidden_nonlinearity=encoder_nonlinearity,
-            hidden_w_init=hidden_w_init,
-            hidden_b_init=hidden_b_init,
-            output_nonlinearity=encoder_output_nonlinearity,
-            output_w_init=output_w_init,
-            output_b_init=output_b_init,
-            layer_normalization=layer_normalization)
+        self._shared_encoder = encoder is not None
+        if self._shared_encoder:
+            self._encoder = encoder
+            encoding_dim = encoder.encoding_dim
+        else:
+            self._encoder = MLPModule(
+                input_dim=self._obs_dim,
+                output_dim=encoding_dim,
+                hidden_sizes=encoder_sizes,
+                hidden_nonlinearity=encoder_nonlinearity,
+                hidden_w_init=hidden_w_init,
+                hidden_b_init=hidden_b_init,
+                output_nonlinearity=encoder_output_nonlinearity,
+                output_w_init=output_w_init,
+                output_b_init=output_b_init,
+                layer_normalization=layer_normalization)
 
         self._emitter = MLPModule(
             input_dim=encoding_dim,
@@ -92,6 +101,11 @@ class AdaptiveDiscreteQFunction(nn.Module):
             output_b_init=output_b_init,
             layer_normalization=layer_normalization)
 
+    @property
+    def shared_encoder(self):
+        """AdaptiveHistoryEncoder: The shared encoder, or None."""
+        return self._encoder if self._shared_encoder else None
+
     # pylint: disable=arguments-differ
     def forward(self, observations, actions=None, mask=None):
         """Return Q-value(s).
@@ -106,10 +120,13 @@ class AdaptiveDiscreteQFunction(nn.Module):
         Returns:
             torch.Tensor: Output value
         """
-        encoding = self._encoder(observations)
-        if mask is not None:
-            encoding = encoding * mask
-        pooled_encoding = encoding.sum(dim=-2)
+        if self._shared_encoder:
+            pooled_encoding = self._encoder(observations, mask)
+        else:
+            encoding = self._encoder(observations)
+            if mask is not None:
+                encoding = encoding * mask
+            pooled_encoding = encoding.sum(dim=-2)
         q_vals = self._emitter(pooled_encoding)
         if actions is not None:
             return torch.gather(q_vals, -1, actions)
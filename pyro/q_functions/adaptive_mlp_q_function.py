@@ -34,6 +34,9 @@ class AdaptiveMLPQFunction(nn.Module):
             dense layer(s) of emitter.
         emitter_output_nonlinearity (callable): Activation function for emitter
             output dense layer.
+        encoder (pyro.modules.AdaptiveHistoryEncoder): If given, use this
+            (possibly shared) encoder instead of building one. The encoder
+            arguments above are then ignored.
     """
 
     def __init__(self,
@@ -45,20 +48,26 @@ class AdaptiveMLPQFunction(nn.Module):
                  emitter_sizes=(32, 32),
                  emitter_nonlinearity=nn.ReLU,
                  emitter_output_nonlinearity=None,
+                 encoder=None,
                  **kwargs):
         super().__init__()
         self._env_spec = env_spec
         self._obs_dim = env_spec.observation_space.flat_dim
         self._action_dim = env_spec.action_space.flat_dim
 
-        self._encoder = MLPModule(
-            input_dim=self._obs_dim,
-            output_dim=encoding_dim,
-            hidden_sizes=encoder_sizes,
-            hidden_nonlinearity=encoder_nonlinearity,
-            output_nonlinearity=encoder_output_nonlinearity,
-            **kwargs
-        )
+        self._shared_encoder = encoder is not None
+        if self._shared_encoder:
+            self._encoder = encoder
+            encoding_dim = encoder.encoding_dim
+        else:
+            self._encoder = MLPModule(
+                input_dim=self._obs_dim,
+                output_dim=encoding_dim,
+                hidden_sizes=encoder_sizes,
+                hidden_nonlinearity=encoder_nonlinearity,
+                output_nonlinearity=encoder_output_nonlinearity,
+                **kwargs
+            )
 
         self._emitter = MLPModule(
             input_dim=encoding_dim + self._action_dim,
@@ -69,12 +78,20 @@ class AdaptiveMLPQFunction(nn.Module):
             **kwargs
         )
 
+    @property
+    def shared_encoder(self):
+        """AdaptiveHistoryEncoder: The shared encoder, or None."""
+        return self._encoder if self._shared_encoder else None
+
     def forward(self, observations, actions, mask=None):
         """Return Q-value(s)."""
-        encoding = self._encoder.forward(observations)
-        if mask is not None:
-            encoding = encoding * mask
-        pooled_encoding = encoding.sum(dim=-2)
+        if self._shared_encoder:
+            pooled_encoding = self._encoder(observations, mask)
+        else:
+            encoding = self._encoder.forward(observations)
+            if mask is not None:
+                encoding = encoding * mask
+            pooled_encoding = encoding.sum(dim=-2)
         if self._env_spec.action_space.is_discrete and actions.shape[-1] == 1:
             actions = F.one_hot(actions.squeeze(dim=-1), self._action_dim)
         return self._emitter.forward(torch.cat([pooled_encoding, actions], -1))
@@ -0,0 +1,113 @@
+"""This modules creates an ensemble of continuous Q-function networks."""
+
+import torch
+
+from pyro.modules.ensemble_mlp_module import EnsembleMLPModule
+from torch import nn
+import torch.nn.functional as F
+
+
+class EnsembleAdaptiveMLPQFunction(nn.Module):
+    """
+    Implements an ensemble of continuous MLP Q-value networks.
+
+    Every member has the architecture of an `AdaptiveMLPQFunction`, but the
+    weights of all members are stacked so the whole ensemble is evaluated in
+    one call, trained by one optimizer and Polyak-averaged in one update.
+    Inputs to the encoder should be of the shape
+    (batch_dim, history_length, obs_dim)
+
+    Args:
+        env_spec (garage.envs.env_spec.EnvSpec): Environment specification.
+        ens_size (int): Number of Q-functions in the ensemble.
+        encoder_sizes (list[int]): Output dimension of dense layer(s) for
+            the MLP for encoder. For example, (32, 32) means the MLP consists
+            of two hidden layers, each with 32 hidden units.
+        encoder_nonlinearity (callable): Activation function for intermediate
+            dense layer(s) of encoder. It should return a torch.Tensor. Set it
+            to None to maintain a linear activation.
+        encoder_output_nonlinearity (callable): Activation function for encoder
+            output dense layer. It should return a torch.Tensor. Set it to None
+            to maintain a linear activation.
+        encoding_dim (int): Output dimension of output dense layer for encoder.
+        emitter_sizes (list[int]): Output dimension of dense layer(s) for
+            the MLP for emitter.
+        emitter_nonlinearity (callable): Activation function for intermediate
+            dense layer(s) of emitter.
+        emitter_output_nonlinearity (callable): Activation function for emitter
+            output dense layer.
+        encoder (pyro.modules.AdaptiveHistoryEncoder): If given, every member
+            uses this (possibly shared) encoder instead of an encoder of its
+            own. The encoder arguments above are then ignored.
+    """
+
+    def __init__(self,
+                 env_spec,
+                 ens_size=2,
+                 encoder_sizes=(32, 32),
+                 encoder_nonlinearity=nn.ReLU,
+                 encoder_output_nonlinearity=None,
+                 encoding_dim=16,
+                 emitter_sizes=(32, 32),
+                 emitter_nonlinearity=nn.ReLU,
+                 emitter_output_nonlinearity=None,
+                 encoder=None,
+                 **kwargs):
+        super().__init__()
+        self._env_spec = env_spec
+        self._obs_dim = env_spec.observation_space.flat_dim
+        self._action_dim = env_spec.action_space.flat_dim
+        self._ens_size = ens_size
+
+        self._shared_encoder = encoder is not None
+        if self._shared_encoder:
+            self._encoder = encoder
+            encoding_dim = encoder.encoding_dim
+        else:
+            self._encoder = EnsembleMLPModule(
+                ens_size=ens_size,
+                input_dim=self._obs_dim,
+                output_dim=encoding_dim,
+                hidden_sizes=encoder_sizes,
+                hidden_nonlinearity=encoder_nonlinearity,
+                output_nonlinearity=encoder_output_nonlinearity,
+                **kwargs
+            )
+
+        self._emitter = EnsembleMLPModule(
+            ens_size=ens_size,
+            input_dim=encoding_dim + self._action_dim,
+            output_dim=1,
+            hidden_sizes=emitter_sizes,
+            hidden_nonlinearity=emitter_nonlinearity,
+            output_nonlinearity=emitter_output_nonlinearity,
+            **kwargs
+        )
+
+    def __len__(self):
+        return self._ens_size
+
+    @property
+    def shared_encoder(self):
+        """AdaptiveHistoryEncoder: The shared encoder, or None."""
+        return self._encoder if self._shared_encoder else None
+
+    def forward(self, observations, actions, mask=None, idx=None):
+        """Return Q-value(s) of shape (ens_size, batch_dim, 1).
+
+        If `idx` is given, only the members with those indices are evaluated
+        and the leading dimension is len(idx).
+        """
+        if self._shared_encoder:
+            # one encoding for all members, broadcast by the emitter
+            pooled_encoding = self._encoder(observations, mask).unsqueeze(0)
+        else:
+            encoding = self._encoder.forward(observations.unsqueeze(0), idx)
+            if mask is not None:
+                encoding = encoding * mask
+            pooled_encoding = encoding.sum(dim=-2)
+        if self._env_spec.action_space.is_discrete and actions.shape[-1] == 1:
+            actions = F.one_hot(actions.squeeze(dim=-1), self._action_dim)
+        actions = actions.expand(pooled_encoding.shape[:1] + actions.shape)
+        return self._emitter.forward(
+            torch.cat([pooled_encoding, actions], -1), idx)
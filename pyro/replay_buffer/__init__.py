@@ -2,8 +2,19 @@
 
 The replay buffer primitives can be used for RL algorithms.
 """
-from pyro.replay_buffer.list_buffer import ListBuffer
-from pyro.replay_buffer.path_buffer import PathBuffer
-from pyro.replay_buffer.nested_monte_carlo_buffer import NMCBuffer
+from pyro._lazy import lazy_attributes
 
-__all__ = ['ListBuffer', 'PathBuffer', 'NMCBuffer']
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'EpisodeHistoryBuffer': 'pyro.replay_buffer.episode_history_buffer',
+    'ListBuffer': 'pyro.replay_buffer.list_buffer',
+    'PathBuffer': 'pyro.replay_buffer.path_buffer',
+    'MemmapPathBuffer': 'pyro.replay_buffer.memmap_path_buffer',
+    'NMCBuffer': 'pyro.replay_buffer.nested_monte_carlo_buffer',
+    'PrefetchingSampler': 'pyro.replay_buffer.prefetching_sampler',
+    'PrioritizedPathBuffer': 'pyro.replay_buffer.prioritized_path_buffer',
+    'SumTree': 'pyro.replay_buffer.sum_tree',
+})
+
+__all__ = ['EpisodeHistoryBuffer', 'ListBuffer', 'PathBuffer',
+           'MemmapPathBuffer', 'NMCBuffer', 'PrefetchingSampler',
+           'PrioritizedPathBuffer', 'SumTree']
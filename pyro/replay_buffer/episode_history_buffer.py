@@ -0,0 +1,233 @@
+"""A replay buffer that stores the history of every episode only once."""
+import numpy as np
+import torch
+
+from pyro._dtypes import TimeStepBatch
+
+
+class EpisodeHistoryBuffer:
+    """A replay buffer that stores whole episodes of growing histories.
+
+    In an adaptive design episode the observation at step t is the padded
+    history of the first t experiments, and the next observation adds one
+    row to it. Rather than storing `observation`, `next_observation`,
+    `mask` and `next_mask` for every transition, this buffer keeps the final
+    (max_history_length, obs_dim) history of each episode once, and rebuilds
+    the four tensors of a sampled transition (episode, t) from a prefix mask
+    of that history. Memory for observations shrinks by a factor of about
+    twice the history length compared to a PathBuffer.
+
+    Episodes are stored episode-major in slots of max_history_length steps,
+    and the oldest episode is evicted when the buffer is full. Transitions
+    are sampled uniformly, as in PathBuffer.
+
+    Args:
+        capacity_in_transitions (int): Total number of transitions the buffer
+            can hold. It is rounded down to a whole number of episode slots.
+        env_spec (EnvSpec): Environment specification.
+
+    """
+
+    def __init__(self, capacity_in_transitions, env_spec=None):
+        self._capacity = capacity_in_transitions
+        self._env_spec = env_spec
+        self._n_slots = None
+        self._next_slot = 0
+        self._slots_stored = 0
+        self._lengths = None
+        self._histories = None
+        self._steps = {}
+
+    def add_episode_batch(self, episodes):
+        """Add a EpisodeBatch to the buffer.
+
+        Args:
+            episodes (EpisodeBatch): Episodes to add.
+
+        """
+        if self._env_spec is None:
+            self._env_spec = episodes.env_spec
+        lengths = episodes.lengths
+        if not bool((lengths == lengths[0]).all()):
+            for eps in episodes.split():
+                self.add_episode_batch(eps)
+            return
+        n_eps, length = len(lengths), int(lengths[0])
+        self._add(
+            histories=episodes.last_observations,
+            masks=episodes.masks.reshape((n_eps, length) +
+                                         episodes.masks.shape[1:]),
+            length=length,
+            action=episodes.actions.reshape(
+                (n_eps, length) + episodes.actions.shape[1:]),
+            reward=episodes.rewards.reshape(n_eps, length, 1),
+            terminal=episodes.step_types.reshape(n_eps, length, 1))
+
+    def add_path(self, path):
+        """Add a path to the buffer.
+
+        Args:
+            path (dict): A dict of array of shape (path_len, flat_dim), with
+                the keys of a PathBuffer path.
+
+        """
+        length = len(path['action'])
+        self._add(histories=path['next_observation'][-1:],
+                  masks=path['mask'].unsqueeze(0),
+                  length=length,
+                  action=path['action'].unsqueeze(0),
+                  reward=path['reward'].reshape(1, length, 1),
+                  terminal=path['terminal'].reshape(1, length, 1))
+
+    def _add(self, histories, masks, length, **steps):
+        """Write episodes of equal length into the next slots.
+
+        Args:
+            histories (torch.Tensor): Final history of each episode, of shape
+                (n_eps, max_history_length, obs_dim).
+            masks (torch.Tensor): Masks of the observations, of shape
+                (n_eps, length, max_history_length, 1).
+            length (int): Number of steps in each episode.
+            steps (dict[str, torch.Tensor]): Per-step arrays of shape
+                (n_eps, length, ...).
+
+        Raises:
+            ValueError: If the histories do not grow by one row per step, or
+                do not fit the buffer.
+
+        """
+        history_len = histories.shape[1]
+        n_valid = masks.reshape(masks.shape[:2] + (-1,)).sum(dim=-1)
+        if not bool((n_valid == torch.arange(
+                length, device=n_valid.device)).all()):
+            raise ValueError('The observation at step t must hold the first t '
+                             'rows of the history.')
+        if self._histories is None:
+            self._n_slots = self._capacity // history_len
+            if self._n_slots == 0:
+                raise ValueError('Path is too long to store in buffer.')
+            self._histories = torch.zeros(
+                (self._n_slots,) + histories.shape[1:], dtype=histories.dtype)
+            self._lengths = torch.zeros(self._n_slots, dtype=torch.long)
+        elif histories.shape[1:] != self._histories.shape[1:]:
+            raise ValueError('Array observation has wrong shape.')
+        # only the newest episodes survive a batch larger than the buffer
+        n_eps = min(len(histories), self._n_slots)
+        slots = (self._next_slot + torch.arange(n_eps)) % self._n_slots
+        self._histories[slots] = histories[-n_eps:].to(self._histories)
+        self._lengths[slots] = length
+        for key, array in steps.items():
+            buf_arr = self._steps.get(key, None)
+            if buf_arr is None:
+                buf_arr = torch.zeros(
+                    (self._n_slots, history_len) + array.shape[2:],
+                    dtype=array.dtype)
+                self._steps[key] = buf_arr
+            elif array.shape[2:] != buf_arr.shape[2:]:
+                raise ValueError('Array {} has wrong shape.'.format(key))
+            buf_arr[slots, :length] = array[-n_eps:].to(buf_arr)
+        self._next_slot = (self._next_slot + n_eps) % self._n_slots
+        self._slots_stored = min(self._n_slots, self._slots_stored + n_eps)
+
+    def _transitions(self, slots, t):
+        """Rebuild the transitions at steps `t` of the episodes in `slots`.
+
+        Args:
+            slots (torch.Tensor): Episode slots.
+            t (torch.Tensor): Step of each transition in its episode.
+
+        Returns:
+            dict: A dict of arrays of shape (len(slots), flat_dim).
+
+        """
+        history = self._histories[slots]
+        rows = torch.arange(history.shape[1], device=history.device)
+        t = t.to(history.device).unsqueeze(-1)
+        mask = (rows < t).unsqueeze(-1)
+        next_mask = (rows <= t).unsqueeze(-1)
+        samples = {key: buf_arr[slots, t.squeeze(-1)]
+                   for key, buf_arr in self._steps.items()}
+        samples.update(observation=history * mask,
+                       next_observation=history * next_mask,
+                       mask=mask,
+                       next_mask=next_mask)
+        return samples
+
+    def sample_path(self):
+        """Sample a single path from the buffer.
+
+        Returns:
+            path: A dict of arrays of shape (path_len, flat_dim).
+
+        """
+        slot = np.random.randint(self._slots_stored)
+        length = int(self._lengths[slot])
+        return self._transitions(torch.full((length,), slot),
+                                 torch.arange(length))
+
+    def sample_transitions(self, batch_size, out=None):
+        """Sample a batch of transitions from the buffer.
+
+        Args:
+            batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
+
+        Returns:
+            dict: A dict of arrays of shape (batch_size, flat_dim).
+
+        """
+        lengths = self._lengths[:self._slots_stored].double()
+        slots = torch.multinomial(lengths, batch_size, replacement=True)
+        t = (torch.rand(batch_size, dtype=torch.double,
+                        device=lengths.device) * lengths[slots]).long()
+        samples = self._transitions(slots, t)
+        if out is None:
+            return samples
+        for key, array in samples.items():
+            out[key].copy_(array)
+        return out
+
+    def sample_timesteps(self, batch_size):
+        """Sample a batch of timesteps from the buffer.
+
+        Args:
+            batch_size (int): Number of timesteps to sample.
+
+        Returns:
+            TimeStepBatch: The batch of timesteps.
+
+        """
+        samples = self.sample_transitions(batch_size)
+        return TimeStepBatch(env_spec=self._env_spec,
+                             episode_infos={},
+                             observations=samples['observation'],
+                             masks=samples['mask'],
+                             actions=samples['action'],
+                             rewards=samples['reward'].flatten(),
+                             next_observations=samples['next_observation'],
+                             next_masks=samples['next_mask'],
+                             step_types=samples['terminal'].flatten(),
+                             env_infos={},
+                             agent_infos={})
+
+    def clear(self):
+        """Clear buffer."""
+        self._n_slots = None
+        self._next_slot = 0
+        self._slots_stored = 0
+        self._lengths = None
+        self._histories = None
+        self._steps.clear()
+
+    @property
+    def n_transitions_stored(self):
+        """Return the size of the replay buffer.
+
+        Returns:
+            int: Size of the current replay buffer.
+
+        """
+        if self._lengths is None:
+            return 0
+        return int(self._lengths.sum())
@@ -1,14 +1,17 @@
 """A replay buffer that efficiently stores and can sample whole paths."""
-import collections
-
 import numpy as np
+import torch
 
 
 class ListBuffer:
     """A replay buffer that stores and can sample whole paths.
 
     This buffer only stores valid steps, and doesn't require paths to
-    have a maximum length.
+    have a maximum length. Each key is stored in one contiguous array of
+    shape (capacity, *row_shape), and the paths are tracked by an offset
+    index of their first step and length, so paths of any length can be
+    stored back to back and both transitions and paths are sampled with a
+    single vectorised gather.
 
     Args:
         capacity_in_transitions (int): Total memory allocated for the buffer.
@@ -19,11 +22,14 @@ class ListBuffer:
         self._capacity = capacity_in_transitions
         self._transitions_stored = 0
         self._first_idx_of_next_path = 0
-        # Each path in the buffer has a tuple of two ranges in
-        # self._path_segments. If the path is stored in a single contiguous
-        # region of the buffer, the second range will be range(0, 0).
-        # The "left" side of the deque contains the oldest path.
-        self._path_segments = collections.deque()
+        # Offset index of the paths in the buffer, as a ring of at most
+        # `capacity` (start, length) entries. Entry `self._first_path` is
+        # the oldest path.
+        self._path_starts = np.zeros(capacity_in_transitions, dtype=np.int64)
+        self._path_lengths = np.zeros(capacity_in_transitions,
+                                      dtype=np.int64)
+        self._first_path = 0
+        self._n_paths = 0
         self._buffer = {}
 
     def add_path(self, path):
@@ -40,22 +46,25 @@ class ListBuffer:
             path_array = path.get(key, None)
             if path_array is None:
                 raise ValueError('Key {} missing from path.'.format(key))
-            if path_array.shape[-1] != buf_arr[0].shape[-1]:
+            if tuple(path_array.shape[1:]) != buf_arr.shape[1:]:
                 raise ValueError('Array {} has wrong shape.'.format(key))
         path_len = self._get_path_length(path)
         first_seg, second_seg = self._next_path_segments(path_len)
-        # Remove paths which will overlap with this one.
-        while (self._path_segments and self._segments_overlap(
-                first_seg, self._path_segments[0][0])):
-            self._path_segments.popleft()
-        while (self._path_segments and self._segments_overlap(
-                second_seg, self._path_segments[0][0])):
-            self._path_segments.popleft()
-        self._path_segments.append((first_seg, second_seg))
+        # Remove paths which will overlap with this one. Paths are stored
+        # back to back, so the oldest path overlaps iff it starts inside the
+        # region of the new one.
+        start = self._first_idx_of_next_path
+        while (self._n_paths and (self._path_starts[self._first_path] - start)
+               % self._capacity < path_len):
+            self._first_path = (self._first_path + 1) % self._capacity
+            self._n_paths -= 1
+        last_path = (self._first_path + self._n_paths) % self._capacity
+        self._path_starts[last_path] = start
+        self._path_lengths[last_path] = path_len
+        self._n_paths += 1
         for key, array in path.items():
+            array = np.asarray(array)
             buf_arr = self._get_or_allocate_key(key, array)
-            # numpy doesn't special case range indexing, so it's very slow.
-            # Slice manually instead, which is faster than any other method.
             # pylint: disable=invalid-slice-index
             buf_arr[first_seg.start:first_seg.stop] = array[:len(first_seg)]
             buf_arr[second_seg.start:second_seg.stop] = array[len(first_seg):]
@@ -73,27 +82,31 @@ class ListBuffer:
             path: A dict of arrays of shape (path_len, flat_dim).
 
         """
-        path_idx = np.random.randint(len(self._path_segments))
-        first_seg, second_seg = self._path_segments[path_idx]
-        first_seg_indices = np.arange(first_seg.start, first_seg.stop)
-        second_seg_indices = np.arange(second_seg.start, second_seg.stop)
-        indices = np.concatenate([first_seg_indices, second_seg_indices])
+        path_idx = (self._first_path +
+                    np.random.randint(self._n_paths)) % self._capacity
+        indices = (self._path_starts[path_idx] +
+                   np.arange(self._path_lengths[path_idx])) % self._capacity
         path = {key: buf_arr[indices] for key, buf_arr in self._buffer.items()}
         return path
 
-    def sample_transitions(self, batch_size):
+    def sample_transitions(self, batch_size, out=None):
         """Sample a batch of transitions from the buffer.
 
         Args:
             batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
 
         Returns:
             dict: A dict of arrays of shape (batch_size, flat_dim).
 
         """
         idx = np.random.randint(self._transitions_stored, size=batch_size)
-        return {key: np.array([buf_arr[i] for i in idx])
-                for key, buf_arr in self._buffer.items()}
+        if out is None:
+            return {key: buf_arr[idx] for key, buf_arr in self._buffer.items()}
+        for key, buf_arr in self._buffer.items():
+            out[key].copy_(torch.from_numpy(buf_arr[idx]))
+        return out
 
     def _next_path_segments(self, n_indices):
         """Compute where the next path should be stored.
@@ -131,7 +144,8 @@ class ListBuffer:
         """
         buf_arr = self._buffer.get(key, None)
         if buf_arr is None:
-            buf_arr = list(np.zeros((self._capacity, array.shape[-1])))
+            buf_arr = np.zeros((self._capacity,) + array.shape[1:],
+                               dtype=array.dtype)
             self._buffer[key] = buf_arr
         return buf_arr
 
@@ -139,7 +153,8 @@ class ListBuffer:
         """Clear buffer."""
         self._transitions_stored = 0
         self._first_idx_of_next_path = 0
-        self._path_segments.clear()
+        self._first_path = 0
+        self._n_paths = 0
         self._buffer.clear()
 
     @staticmethod
@@ -169,28 +184,6 @@ class ListBuffer:
             raise ValueError('Nothing in path')
         return length
 
-    @staticmethod
-    def _segments_overlap(seg_a, seg_b):
-        """Compute if two segments overlap.
-
-        Args:
-            seg_a (range): List of indices of the first segment.
-            seg_b (range): List of indices of the second segment.
-
-        Returns:
-            bool: True iff the input ranges overlap at at least one index.
-
-        """
-        # Empty segments never overlap.
-        if not seg_a or not seg_b:
-            return False
-        first = seg_a
-        second = seg_b
-        if seg_b.start < seg_a.start:
-            first, second = seg_b, seg_a
-        assert first.start <= second.start
-        return first.stop > second.start
-
     @property
     def n_transitions_stored(self):
         """Return the size of the replay buffer.
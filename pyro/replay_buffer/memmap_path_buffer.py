@@ -0,0 +1,169 @@
+"""A replay buffer that stores whole paths in memory-mapped files."""
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from pyro.replay_buffer.path_buffer import PathBuffer
+
+
+class MemmapPathBuffer(PathBuffer):
+    """A PathBuffer whose arrays live in memory-mapped files on disk.
+
+    Every key is stored in `<directory>/<key>.npy`, so only the pages that
+    are being written or sampled need to be resident, and buffers of 1e7+
+    padded transitions fit on machines with far less RAM. Samples are
+    returned on the default torch device.
+
+    Args:
+        capacity_in_transitions (int): Total memory allocated for the buffer.
+        env_spec (EnvSpec): Environment specification.
+        directory (str): Directory holding the buffer files. If None, a
+            temporary directory is used and removed with the buffer.
+        persist (bool): If True, save the buffer index next to the arrays
+            after every `add_paths` (so once per epoch of the algorithms),
+            and restore a buffer previously saved in `directory` instead of
+            starting empty. Paths added one at a time with `add_path` are
+            only saved by the next `add_paths` or `flush`.
+
+    """
+
+    def __init__(self, capacity_in_transitions, env_spec=None, directory=None,
+                 persist=False):
+        super().__init__(capacity_in_transitions, env_spec)
+        self._tmp_dir = None
+        if directory is None:
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix='replay_buffer')
+            directory = self._tmp_dir.name
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._persist = persist
+        self._arrays = {}
+        if persist and os.path.exists(self._index_path):
+            self._load()
+
+    @property
+    def _index_path(self):
+        """str: Path of the file holding the buffer index."""
+        return os.path.join(self._directory, 'index.json')
+
+    def _key_path(self, key):
+        """Return the path of the file holding `key`."""
+        return os.path.join(self._directory, '{}.npy'.format(key))
+
+    def add_paths(self, paths, lengths):
+        """Add several consecutive paths to the buffer at once.
+
+        Args:
+            paths (dict): A dict of arrays of shape (sum(lengths), flat_dim),
+                holding the paths one after the other.
+            lengths (list[int]): Length of each path.
+
+        """
+        super().add_paths(paths, lengths)
+        if self._persist:
+            self._save()
+
+    def sample_transitions(self, batch_size, out=None):
+        """Sample a batch of transitions from the buffer.
+
+        The sampled indices are sorted, so every file is read front to back
+        and each page is touched at most once per batch. The transitions are
+        still a uniform sample, only their order within the batch changes.
+
+        Args:
+            batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
+
+        Returns:
+            dict: A dict of arrays of shape (batch_size, flat_dim).
+
+        """
+        idx = np.sort(np.random.randint(self._transitions_stored,
+                                        size=batch_size))
+        if out is not None:
+            for key, array in self._arrays.items():
+                out[key].copy_(torch.from_numpy(array[idx]))
+            return out
+        device = torch.empty(0).device
+        return {key: torch.from_numpy(array[idx]).to(device)
+                for key, array in self._arrays.items()}
+
+    def _get_or_allocate_key(self, key, array):
+        """Get or allocate key in the buffer.
+
+        Args:
+            key (str): Key in buffer.
+            array (torch.Tensor): Array corresponding to key.
+
+        Returns:
+            torch.Tensor: A CPU tensor backed by the memory-mapped file of key.
+
+        """
+        buf_arr = self._buffer.get(key, None)
+        if buf_arr is None:
+            dtype = torch.empty(0, dtype=array.dtype, device='cpu').numpy().dtype
+            memmap = np.lib.format.open_memmap(
+                self._key_path(key), mode='w+', dtype=dtype,
+                shape=(self._capacity,) + tuple(array.shape[1:]))
+            self._arrays[key] = memmap
+            buf_arr = torch.from_numpy(memmap)
+            self._buffer[key] = buf_arr
+        return buf_arr
+
+    def clear(self):
+        """Clear buffer."""
+        super().clear()
+        self._arrays.clear()
+        if self._persist:
+            self._save()
+
+    def flush(self):
+        """Save the buffer, if it persists."""
+        if self._persist:
+            self._save()
+
+    def _save(self):
+        """Flush the arrays to disk and write the buffer index.
+
+        Writing the index is linear in the number of stored paths, so it is
+        done once per batch of paths rather than once per path.
+        """
+        for memmap in self._arrays.values():
+            memmap.flush()
+        index = dict(
+            capacity=self._capacity,
+            transitions_stored=int(self._transitions_stored),
+            first_idx_of_next_path=self._first_idx_of_next_path,
+            path_segments=[[first.start, first.stop, second.start, second.stop]
+                           for first, second in self._path_segments],
+            keys=list(self._arrays))
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _load(self):
+        """Restore the buffer saved in the buffer directory.
+
+        Raises:
+            ValueError: If the saved buffer has a different capacity.
+
+        """
+        with open(self._index_path) as f:
+            index = json.load(f)
+        if index['capacity'] != self._capacity:
+            raise ValueError('Saved buffer has capacity {}, not {}.'.format(
+                index['capacity'], self._capacity))
+        self._transitions_stored = index['transitions_stored']
+        self._first_idx_of_next_path = index['first_idx_of_next_path']
+        self._path_segments.extend(
+            (range(a, b), range(c, d))
+            for a, b, c, d in index['path_segments'])
+        for key in index['keys']:
+            memmap = np.load(self._key_path(key), mmap_mode='r+')
+            self._arrays[key] = memmap
+            self._buffer[key] = torch.from_numpy(memmap)
@@ -86,11 +86,13 @@ class NMCBuffer:
                                        self._transitions_stored + self.path_len)
         self._chunks_stored = self._transitions_stored / self._chunk_size
 
-    def sample_transitions(self, batch_size):
+    def sample_transitions(self, batch_size, out=None):
         """Sample a batch of transitions from the buffer.
 
         Args:
             batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
 
         Returns:
             dict: A dict of arrays of shape (batch_size, flat_dim).
@@ -100,7 +102,13 @@ class NMCBuffer:
         bases = np.random.randint(self._chunks_stored, size=(self.N, 1))
         offsets = np.random.randint(self._chunk_size, size=(self.N, self.M))
         idx = (bases * self._chunk_size + offsets).flatten()
-        return {key: buf_arr[idx] for key, buf_arr in self._buffer.items()}
+        if out is None:
+            return {key: buf_arr[idx] for key, buf_arr in self._buffer.items()}
+        for key, buf_arr in self._buffer.items():
+            torch.index_select(buf_arr, 0,
+                               torch.as_tensor(idx, device=buf_arr.device),
+                               out=out[key])
+        return out
 
     def sample_timesteps(self, batch_size):
         """Sample a batch of timesteps from the buffer.
@@ -29,22 +29,78 @@ class PathBuffer:
 
     def add_episode_batch(self, episodes):
         """Add a EpisodeBatch to the buffer.	
+        The whole batch is written at once, see `add_paths`.
         Args:	
             episodes (EpisodeBatch): Episodes to add.	
         """
         if self._env_spec is None:
             self._env_spec = episodes.env_spec
-        for eps in episodes.split():
-            path = dict(
-                observation=eps.observations,
-                mask=eps.masks,
-                action=eps.actions,
-                reward=eps.rewards.reshape(-1, 1),
-                next_observation=eps.next_observations,
-                next_mask=torch.cat(
-                    [eps.masks[1:], eps.last_masks.unsqueeze(dim=0)]),
-                terminal=eps.step_types.reshape(-1, 1),)
-            self.add_path(path)
+        lengths = [int(length) for length in episodes.lengths]
+        paths = dict(
+            observation=episodes.observations,
+            mask=episodes.masks,
+            action=episodes.actions,
+            reward=episodes.rewards.reshape(-1, 1),
+            next_observation=self._next_steps(episodes.observations,
+                                              episodes.last_observations,
+                                              lengths),
+            next_mask=self._next_steps(episodes.masks, episodes.last_masks,
+                                       lengths),
+            terminal=episodes.step_types.reshape(-1, 1),)
+        self.add_paths(paths, lengths)
+
+    def add_paths(self, paths, lengths):
+        """Add several consecutive paths to the buffer at once.
+
+        The paths are written with at most two slice assignments per key and
+        the path index is updated in one pass. The result, including which
+        old paths are evicted, is the same as calling `add_path` on each path
+        in turn. Batches larger than the buffer are added path by path.
+
+        Args:
+            paths (dict): A dict of arrays of shape (sum(lengths), flat_dim),
+                holding the paths one after the other.
+            lengths (list[int]): Length of each path.
+
+        Raises:
+            ValueError: If a key is missing from paths, paths have the wrong
+                shape or their length does not match `lengths`.
+
+        """
+        total = sum(lengths)
+        if total > self._capacity:
+            start = 0
+            for length in lengths:
+                self.add_path({key: array[start:start + length]
+                               for key, array in paths.items()})
+                start += length
+            return
+        self._check_path(paths)
+        if self._get_path_length(paths) != total:
+            raise ValueError('lengths do not add up to the length of paths.')
+        new_segments = []
+        start = self._first_idx_of_next_path
+        for length in lengths:
+            first_seg, second_seg = self._next_path_segments(length, start)
+            new_segments.append((first_seg, second_seg))
+            start = second_seg.stop or first_seg.stop
+        # The paths cover one contiguous (possibly wrapped) region, so remove
+        # every old path overlapping that region.
+        first_seg, second_seg = self._next_path_segments(total)
+        while (self._path_segments and (
+                self._segments_overlap(first_seg, self._path_segments[0][0])
+                or self._segments_overlap(second_seg,
+                                          self._path_segments[0][0]))):
+            self._path_segments.popleft()
+        self._path_segments.extend(new_segments)
+        for key, array in paths.items():
+            buf_arr = self._get_or_allocate_key(key, array)
+            # pylint: disable=invalid-slice-index
+            buf_arr[first_seg.start:first_seg.stop] = array[:len(first_seg)]
+            buf_arr[second_seg.start:second_seg.stop] = array[len(first_seg):]
+        self._first_idx_of_next_path = start
+        self._transitions_stored = min(self._capacity,
+                                       self._transitions_stored + total)
 
     def add_path(self, path):
         """Add a path to the buffer.
@@ -56,13 +112,7 @@ class PathBuffer:
             ValueError: If a key is missing from path or path has wrong shape.
 
         """
-        for key, buf_arr in self._buffer.items():
-            path_array = path.get(key, None)
-            if path_array is None:
-                raise ValueError('Key {} missing from path.'.format(key))
-            if (len(path_array.shape) < 2
-                    or path_array.shape[1:] != buf_arr.shape[1:]):
-                raise ValueError('Array {} has wrong shape.'.format(key))
+        self._check_path(path)
         path_len = self._get_path_length(path)
         first_seg, second_seg = self._next_path_segments(path_len)
         # Remove paths which will overlap with this one.
@@ -102,18 +152,39 @@ class PathBuffer:
         path = {key: buf_arr[indices] for key, buf_arr in self._buffer.items()}
         return path
 
-    def sample_transitions(self, batch_size):
+    def sample_transitions(self, batch_size, out=None):
         """Sample a batch of transitions from the buffer.
 
         Args:
             batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
 
         Returns:
             dict: A dict of arrays of shape (batch_size, flat_dim).
 
         """
         idx = np.random.randint(self._transitions_stored, size=batch_size)
-        return {key: buf_arr[idx] for key, buf_arr in self._buffer.items()}
+        return self._gather(idx, out)
+
+    def _gather(self, idx, out=None):
+        """Gather the transitions at indices `idx`.
+
+        Args:
+            idx (numpy.ndarray): Indices of the transitions.
+            out (dict): If given, tensors to gather the transitions into.
+
+        Returns:
+            dict: A dict of arrays of shape (len(idx), flat_dim).
+
+        """
+        if out is None:
+            return {key: buf_arr[idx] for key, buf_arr in self._buffer.items()}
+        for key, buf_arr in self._buffer.items():
+            torch.index_select(buf_arr, 0,
+                               torch.as_tensor(idx, device=buf_arr.device),
+                               out=out[key])
+        return out
 
     def sample_timesteps(self, batch_size):
         """Sample a batch of timesteps from the buffer.
@@ -138,11 +209,31 @@ class PathBuffer:
                              env_infos={},
                              agent_infos={})
 
-    def _next_path_segments(self, n_indices):
+    def _check_path(self, path):
+        """Check that a path has every key of the buffer, in the right shape.
+
+        Args:
+            path (dict): A dict of array of shape (path_len, flat_dim).
+
+        Raises:
+            ValueError: If a key is missing from path or path has wrong shape.
+
+        """
+        for key, buf_arr in self._buffer.items():
+            path_array = path.get(key, None)
+            if path_array is None:
+                raise ValueError('Key {} missing from path.'.format(key))
+            if (len(path_array.shape) < 2
+                    or path_array.shape[1:] != buf_arr.shape[1:]):
+                raise ValueError('Array {} has wrong shape.'.format(key))
+
+    def _next_path_segments(self, n_indices, start=None):
         """Compute where the next path should be stored.
 
         Args:
             n_indices (int): Path length.
+            start (int): Index the path starts at. Defaults to the end of
+                the last stored path.
 
         Returns:
             tuple: Lists of indices where path should be stored.
@@ -153,7 +244,8 @@ class PathBuffer:
         """
         if n_indices > self._capacity:
             raise ValueError('Path is too long to store in buffer.')
-        start = self._first_idx_of_next_path
+        if start is None:
+            start = self._first_idx_of_next_path
         end = start + n_indices
         if end > self._capacity:
             second_end = end - self._capacity
@@ -215,6 +307,27 @@ class PathBuffer:
             raise ValueError('Nothing in path')
         return length
 
+    @staticmethod
+    def _next_steps(values, last_values, lengths):
+        """Shift per-step values of consecutive episodes one step forward.
+
+        Args:
+            values (torch.Tensor): Values of shape (sum(lengths), ...).
+            last_values (torch.Tensor): Value after the last step of each
+                episode, of shape (len(lengths), ...).
+            lengths (list[int]): Length of each episode.
+
+        Returns:
+            torch.Tensor: The value after each step, of shape
+                (sum(lengths), ...).
+
+        """
+        next_values = torch.empty_like(values)
+        next_values[:-1] = values[1:]
+        ends = torch.as_tensor(np.cumsum(lengths) - 1)
+        next_values[ends] = last_values
+        return next_values
+
     @staticmethod
     def _segments_overlap(seg_a, seg_b):
         """Compute if two segments overlap.
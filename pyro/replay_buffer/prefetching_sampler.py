@@ -0,0 +1,221 @@
+"""A replay buffer wrapper that gathers minibatches in a background thread."""
+import collections
+import threading
+
+import torch
+
+
+class PrefetchingSampler:
+    """Replay buffer wrapper that samples the next minibatches ahead of time.
+
+    While the learner computes a gradient step on one minibatch, a background
+    thread gathers the next `n_prefetch` minibatches from the wrapped buffer
+    into reusable output tensors, which are pinned when they are on the CPU
+    and CUDA is available. `sample_transitions` then only has to hand over
+    (or copy to the default device) a batch that is already gathered.
+
+    Every method that writes to the buffer (`add_path`, `add_paths`,
+    `add_episode_batch` and `clear`) first stops the thread and drops the
+    prefetched minibatches, so no minibatch is gathered while the buffer is
+    written to, and every minibatch returned after a write is sampled from
+    the new contents. `update_priorities` of a prioritized buffer is instead
+    serialised with the gathering, so the priorities change between two
+    minibatches and never while one is sampled. All other attributes are
+    those of the wrapped buffer.
+
+    The tensors returned by `sample_transitions` are reused: a minibatch is
+    only valid until the next call.
+
+    Args:
+        replay_buffer (PathBuffer or NMCBuffer or ListBuffer): Buffer to
+            sample from. Its `sample_transitions` must accept `out`.
+        n_prefetch (int): Number of minibatches gathered ahead.
+
+    """
+
+    def __init__(self, replay_buffer, n_prefetch=2):
+        self._replay_buffer = replay_buffer
+        self._n_prefetch = n_prefetch
+        self._cond = threading.Condition()
+        # held while the thread samples or the learner updates priorities
+        self._buffer_lock = threading.Lock()
+        self._thread = None
+        self._stop = False
+        self._error = None
+        self._batch_size = None
+        self._slots = []
+        self._events = []
+        self._free = collections.deque()
+        self._ready = collections.deque()
+        self._held = None
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == '_replay_buffer':
+            raise AttributeError(name)
+        return getattr(self._replay_buffer, name)
+
+    @property
+    def replay_buffer(self):
+        """The wrapped replay buffer."""
+        return self._replay_buffer
+
+    def add_path(self, path):
+        """Add a path to the buffer.
+
+        Args:
+            path (dict): A dict of array of shape (path_len, flat_dim).
+
+        """
+        self._stop_thread()
+        self._replay_buffer.add_path(path)
+
+    def add_paths(self, paths, lengths):
+        """Add several consecutive paths to the buffer at once.
+
+        Args:
+            paths (dict): A dict of arrays of shape (sum(lengths), flat_dim),
+                holding the paths one after the other.
+            lengths (list[int]): Length of each path.
+
+        """
+        self._stop_thread()
+        self._replay_buffer.add_paths(paths, lengths)
+
+    def add_episode_batch(self, episodes):
+        """Add a EpisodeBatch to the buffer.
+
+        Args:
+            episodes (EpisodeBatch): Episodes to add.
+
+        """
+        self._stop_thread()
+        self._replay_buffer.add_episode_batch(episodes)
+
+    def clear(self):
+        """Clear buffer."""
+        self._stop_thread()
+        self._replay_buffer.clear()
+
+    def update_priorities(self, indices, td_errors):
+        """Update the priorities of sampled transitions.
+
+        Minibatches already gathered keep the priorities they were sampled
+        with.
+
+        Args:
+            indices (torch.Tensor or numpy.ndarray): The 'index' of the
+                sampled batch.
+            td_errors (torch.Tensor or numpy.ndarray): TD error of each
+                transition.
+
+        """
+        with self._buffer_lock:
+            self._replay_buffer.update_priorities(indices, td_errors)
+
+    @staticmethod
+    def _allocate(array):
+        """Allocate a reusable output tensor like `array`."""
+        array = torch.as_tensor(array)
+        if array.device.type == 'cpu' and torch.cuda.is_available():
+            return torch.empty(array.shape, dtype=array.dtype, device='cpu',
+                               pin_memory=True)
+        return torch.empty_like(array)
+
+    def _allocate_slots(self, batch_size):
+        """Allocate one output slot per prefetched and per held minibatch."""
+        samples = self._replay_buffer.sample_transitions(batch_size)
+        self._slots = [{key: self._allocate(array)
+                        for key, array in samples.items()}
+                       for _ in range(self._n_prefetch + 1)]
+        self._events = [None] * len(self._slots)
+        self._batch_size = batch_size
+
+    def _run(self, device):
+        """Gather minibatches into free slots until stopped.
+
+        Args:
+            device (str): Default torch device of the learner.
+
+        """
+        torch.set_default_device(device)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop or self._free)
+                if self._stop:
+                    return
+                i = self._free.popleft()
+            try:
+                if self._events[i] is not None:
+                    # the copy of the last batch in this slot must be done
+                    self._events[i].synchronize()
+                with self._buffer_lock:
+                    self._replay_buffer.sample_transitions(
+                        self._batch_size, out=self._slots[i])
+            except Exception as e:  # pylint: disable=broad-except
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._ready.append(i)
+                self._cond.notify_all()
+
+    def _start_thread(self):
+        """Start gathering minibatches in the background."""
+        self._free = collections.deque(range(len(self._slots)))
+        self._ready.clear()
+        self._held = None
+        self._stop = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(str(torch.empty(0).device),),
+            daemon=True)
+        self._thread.start()
+
+    def _stop_thread(self):
+        """Stop the background thread and drop the prefetched minibatches."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def sample_transitions(self, batch_size):
+        """Return the next prefetched batch of transitions.
+
+        Args:
+            batch_size (int): Number of transitions to sample.
+
+        Returns:
+            dict: A dict of tensors of shape (batch_size, flat_dim) on the
+                default device.
+
+        Raises:
+            RuntimeError: If gathering failed in the background thread.
+
+        """
+        if batch_size != self._batch_size:
+            self._stop_thread()
+            self._allocate_slots(batch_size)
+        if self._thread is None:
+            self._start_thread()
+        with self._cond:
+            if self._held is not None:
+                self._free.append(self._held)
+                self._cond.notify_all()
+            self._cond.wait_for(lambda: self._ready or self._error)
+            if self._error is not None:
+                raise RuntimeError('Prefetching minibatches failed') \
+                    from self._error
+            self._held = self._ready.popleft()
+        device = torch.empty(0).device
+        slot = self._slots[self._held]
+        samples = {key: array.to(device, non_blocking=True)
+                   for key, array in slot.items()}
+        if any(array.is_pinned() for array in slot.values()) and \
+                device.type == 'cuda':
+            self._events[self._held] = torch.cuda.Event()
+            self._events[self._held].record()
+        return samples
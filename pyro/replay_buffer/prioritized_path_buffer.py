@@ -0,0 +1,130 @@
+"""A replay buffer that samples transitions by their priority."""
+import numpy as np
+import torch
+
+from pyro.replay_buffer.path_buffer import PathBuffer
+from pyro.replay_buffer.sum_tree import SumTree
+
+
+class PrioritizedPathBuffer(PathBuffer):
+    """A PathBuffer that samples transitions in proportion to a priority.
+
+    Implements proportional prioritised experience replay
+    (https://arxiv.org/abs/1511.05952). The priority of a transition is
+    (|td_error| + eps) ** alpha, new transitions get the largest priority
+    seen so far, and priorities are kept in a SumTree, so sampling a batch
+    and updating the priorities of a batch both take O(batch_size * log N)
+    time.
+
+    Batches are sampled with one transition per equal slice of the total
+    priority. Besides the keys of a PathBuffer, a batch has a 'weight' key
+    with the importance weights (N * P(i)) ** -beta, normalised by their
+    maximum, and an 'index' key to pass back to `update_priorities`.
+
+    Args:
+        capacity_in_transitions (int): Total memory allocated for the buffer.
+        env_spec (EnvSpec): Environment specification.
+        alpha (float): How much the priorities skew sampling, with 0 being
+            uniform sampling.
+        beta (float): How much the importance weights correct for the skew,
+            with 1 being a full correction.
+        eps (float): Priority added to every absolute TD error, so that no
+            transition stops being sampled.
+
+    """
+
+    def __init__(self, capacity_in_transitions, env_spec=None, alpha=0.6,
+                 beta=0.4, eps=1e-6):
+        super().__init__(capacity_in_transitions, env_spec)
+        self._alpha = alpha
+        self._beta = beta
+        self._eps = eps
+        self._max_priority = 1.
+        self._tree = SumTree(capacity_in_transitions)
+
+    def _set_max_priority(self, start, length):
+        """Give the `length` transitions written from `start` the largest
+        priority."""
+        idx = (start + np.arange(length)) % self._capacity
+        self._tree.update(idx, self._max_priority ** self._alpha)
+
+    def add_paths(self, paths, lengths):
+        """Add several consecutive paths to the buffer at once.
+
+        Args:
+            paths (dict): A dict of arrays of shape (sum(lengths), flat_dim),
+                holding the paths one after the other.
+            lengths (list[int]): Length of each path.
+
+        """
+        start = self._first_idx_of_next_path
+        super().add_paths(paths, lengths)
+        if sum(lengths) <= self._capacity:
+            # larger batches are added path by path through add_path
+            self._set_max_priority(start, sum(lengths))
+
+    def add_path(self, path):
+        """Add a path to the buffer.
+
+        Args:
+            path (dict): A dict of array of shape (path_len, flat_dim).
+
+        """
+        start = self._first_idx_of_next_path
+        super().add_path(path)
+        self._set_max_priority(start, self._get_path_length(path))
+
+    def sample_transitions(self, batch_size, out=None):
+        """Sample a batch of transitions by priority.
+
+        Args:
+            batch_size (int): Number of transitions to sample.
+            out (dict): If given, tensors of shape (batch_size, flat_dim) to
+                gather the transitions into instead of allocating new ones.
+
+        Returns:
+            dict: A dict of arrays of shape (batch_size, flat_dim), with the
+                importance weights under 'weight' and the indices of the
+                transitions under 'index'.
+
+        """
+        total = self._tree.total
+        values = (np.arange(batch_size) +
+                  np.random.uniform(size=batch_size)) * (total / batch_size)
+        idx = np.minimum(self._tree.find(values), self._transitions_stored - 1)
+        weights = (self._transitions_stored * self._tree[idx] /
+                   total) ** -self._beta
+        weights /= weights.max()
+        device = next(iter(self._buffer.values())).device
+        weights = torch.as_tensor(weights, dtype=torch.get_default_dtype(),
+                                  device=device).unsqueeze(-1)
+        index = torch.as_tensor(idx, device=device)
+        samples = self._gather(idx, out)
+        if out is None:
+            samples.update(weight=weights, index=index)
+        else:
+            out['weight'].copy_(weights)
+            out['index'].copy_(index)
+        return samples
+
+    def update_priorities(self, indices, td_errors):
+        """Set the priorities of a batch of transitions from their TD errors.
+
+        Args:
+            indices (torch.Tensor or numpy.ndarray): The 'index' of the
+                sampled batch.
+            td_errors (torch.Tensor or numpy.ndarray): TD error of each
+                transition.
+
+        """
+        indices = torch.as_tensor(indices).flatten().cpu().numpy()
+        priorities = torch.as_tensor(td_errors).detach().flatten().abs()
+        priorities = priorities.cpu().double().numpy() + self._eps
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._tree.update(indices, priorities ** self._alpha)
+
+    def clear(self):
+        """Clear buffer."""
+        super().clear()
+        self._max_priority = 1.
+        self._tree.clear()
@@ -0,0 +1,77 @@
+"""An array-backed sum-tree for prioritised sampling."""
+import numpy as np
+
+
+class SumTree:
+    """A binary tree whose every node holds the sum of its two children.
+
+    The tree is stored in one array, with the root at index 1, the children
+    of node `i` at `2 * i` and `2 * i + 1` and the `capacity` leaves from
+    index `size`, the smallest power of two not below `capacity`. Updating a
+    batch of leaves and finding the leaves of a batch of prefix sums both
+    take O(batch_size * log(capacity)) time, in log(capacity) vectorised
+    steps.
+
+    Args:
+        capacity (int): Number of leaves.
+
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._depth = max(int(np.ceil(np.log2(capacity))), 0)
+        self._size = 2 ** self._depth
+        self._tree = np.zeros(2 * self._size)
+
+    @property
+    def total(self):
+        """float: Sum of all the leaves."""
+        return self._tree[1]
+
+    def __getitem__(self, idx):
+        """Return the values of the leaves `idx`."""
+        return self._tree[self._size + np.asarray(idx)]
+
+    def update(self, idx, values):
+        """Set the values of the leaves `idx` and update their ancestors.
+
+        Args:
+            idx (numpy.ndarray): Indices of the leaves. If an index appears
+                more than once, its last value is kept.
+            values (numpy.ndarray or float): New values of the leaves.
+
+        """
+        nodes = self._size + np.asarray(idx)
+        self._tree[nodes] = values
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = (self._tree[2 * nodes] +
+                                 self._tree[2 * nodes + 1])
+
+    def find(self, values):
+        """Return the leaves at which the prefix sums reach `values`.
+
+        Leaf `i` is returned for every value in
+        [sum(leaves[:i]), sum(leaves[:i + 1])), so values drawn uniformly
+        from [0, total) select each leaf with probability proportional to
+        its value.
+
+        Args:
+            values (numpy.ndarray): Prefix sums, in [0, total).
+
+        Returns:
+            numpy.ndarray: Indices of the leaves.
+
+        """
+        values = np.array(values, dtype=self._tree.dtype)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = self._tree[2 * nodes]
+            go_right = values >= left
+            values -= left * go_right
+            nodes = 2 * nodes + go_right
+        return np.minimum(nodes - self._size, self._capacity - 1)
+
+    def clear(self):
+        """Set every leaf to zero."""
+        self._tree[:] = 0.
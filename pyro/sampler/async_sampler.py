@@ -0,0 +1,214 @@
+"""Sampler that collects episodes in a background thread."""
+import collections
+import copy
+import threading
+import time
+
+import torch
+
+from garage.sampler.sampler import Sampler
+
+
+class AsyncSampler(Sampler):
+    """Sampler that keeps sampling episodes while the learner trains.
+
+    Wraps another sampler and runs it in a background thread with a copy of
+    the policy. Every call to `obtain_samples` publishes the agent update as
+    the newest policy snapshot and returns the next batch of the thread.
+    Batch `i` is sampled with a snapshot at most `max_staleness` calls
+    older than the one published by call `i`, so the learner can train on
+    one batch while the next ones are sampled. With `max_staleness=0`
+    sampling is synchronous again.
+
+    The thread only runs while consecutive calls ask for the same number of
+    samples. A call with a different `num_samples` (such as the first call
+    that fills the replay buffer up to its minimum size) or with an
+    `env_update` stops the thread and is sampled synchronously, and the
+    thread is only started again by the next call that asks for the same
+    number of samples as the one before it, so it never samples a batch of
+    a size that is not asked for again.
+
+    Args:
+        sampler (Sampler): Sampler to run in the background.
+        agent (Policy): Policy being trained. It is copied when the thread
+            first starts, so the copy lives on the same device.
+        max_staleness (int): Number of snapshots by which the policy that
+            sampled a batch may lag behind the policy that asked for it.
+
+    """
+
+    def __init__(self, sampler, agent, max_staleness=1):
+        # pylint: disable=super-init-not-called
+        self._sampler = sampler
+        self._policy = agent
+        self._agent = None
+        self._max_staleness = max_staleness
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        self._error = None
+        self._num_samples = None
+        self._snapshot = None
+        self._n_published = 0
+        self._batches = collections.deque()
+        self._sampling_intervals = []
+
+    @property
+    def total_env_steps(self):
+        """int: Number of environment steps sampled by the wrapped sampler."""
+        return self._sampler.total_env_steps
+
+    def pop_sampling_intervals(self):
+        """Return the (start, end) times spent sampling since the last call.
+
+        Returns:
+            list[tuple[float, float]]: Intervals of `time.perf_counter`.
+
+        """
+        with self._cond:
+            intervals = self._sampling_intervals
+            self._sampling_intervals = []
+        return intervals
+
+    def _sample(self, itr, num_samples, env_update=None):
+        """Sample with the policy copy and record the time it took."""
+        start = time.perf_counter()
+        episodes = self._sampler.obtain_samples(itr, num_samples,
+                                                agent_update=self._agent,
+                                                env_update=env_update)
+        with self._cond:
+            self._sampling_intervals.append((start, time.perf_counter()))
+        return episodes
+
+    @staticmethod
+    def _copy_params(agent_update):
+        """Detach an agent update from the parameters being trained."""
+        if not isinstance(agent_update, dict):
+            agent_update = agent_update.state_dict()
+        return {k: v.detach().clone() for k, v in agent_update.items()}
+
+    def _run(self, device):
+        """Sample batches until stopped.
+
+        Args:
+            device (str): Default torch device of the learner.
+
+        """
+        torch.set_default_device(device)
+        i = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop or (
+                    self._n_published >= i + 2 - self._max_staleness))
+                if self._stop:
+                    return
+                snapshot = self._snapshot
+            try:
+                self._agent.set_param_values(snapshot)
+                episodes = self._sample(i, self._num_samples)
+            except Exception as e:  # pylint: disable=broad-except
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._batches.append(episodes)
+                self._cond.notify_all()
+            i += 1
+
+    def _start_thread(self, snapshot):
+        """Start sampling in the background from `snapshot`."""
+        self._snapshot = snapshot
+        self._n_published = 1
+        self._stop = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(str(torch.empty(0).device),),
+            daemon=True)
+        self._thread.start()
+
+    def _stop_thread(self):
+        """Stop the background thread and drop the batches it sampled."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._batches.clear()
+
+    def obtain_samples(self, itr, num_samples, agent_update, env_update=None):
+        """Collect at least a given number transitions (timesteps).
+
+        Args:
+            itr(int): The current iteration number. Using this argument is
+                deprecated.
+            num_samples (int): Minimum number of transitions / timesteps to
+                sample.
+            agent_update (object): Parameters of the agent, as returned by
+                `Policy.get_param_values`, or the agent itself.
+            env_update (object): Value which will be passed into the
+                `env_update_fn` before sampling episodes.
+
+        Returns:
+            EpisodeBatch: The batch of collected episodes.
+
+        Raises:
+            RuntimeError: If sampling failed in the background thread.
+
+        """
+        snapshot = self._copy_params(agent_update)
+        if self._agent is None:
+            self._agent = copy.deepcopy(self._policy)
+        if (self._thread is None or num_samples != self._num_samples
+                or env_update is not None):
+            repeated = (num_samples == self._num_samples
+                        and env_update is None)
+            self._stop_thread()
+            self._agent.set_param_values(snapshot)
+            episodes = self._sample(itr, num_samples, env_update)
+            self._num_samples = num_samples
+            if repeated:
+                self._start_thread(snapshot)
+            return episodes
+        with self._cond:
+            self._snapshot = snapshot
+            self._n_published += 1
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._batches or self._error)
+            error = self._error
+            if error is None:
+                return self._batches.popleft()
+        # the next call samples synchronously and restarts the thread
+        self._stop_thread()
+        raise RuntimeError('Background sampling failed') from error
+
+    def obtain_exact_episodes(self,
+                              n_eps_per_worker,
+                              agent_update,
+                              env_update=None):
+        """Sample an exact number of episodes per worker, synchronously.
+
+        Args:
+            n_eps_per_worker (int): Exact number of episodes to gather for
+                each worker.
+            agent_update (object): Parameters of the agent, as returned by
+                `Policy.get_param_values`, or the agent itself.
+            env_update (object): Value which will be passed into the
+                `env_update_fn` before sampling episodes.
+
+        Returns:
+            EpisodeBatch: Batch of gathered episodes.
+
+        """
+        self._stop_thread()
+        self._num_samples = None
+        return self._sampler.obtain_exact_episodes(n_eps_per_worker,
+                                                   agent_update,
+                                                   env_update=env_update)
+
+    def shutdown_worker(self):
+        """Stop the background thread and shutdown the wrapped sampler."""
+        self._stop_thread()
+        self._sampler.shutdown_worker()
@@ -0,0 +1,364 @@
+"""Sampler that runs VectorWorkers in a pool of processes."""
+import copy
+import queue
+
+import cloudpickle
+import psutil
+import torch
+import torch.multiprocessing as mp
+
+from pyro import EpisodeBatch
+from pyro.sampler.vector_worker import VectorWorker
+from garage.experiment.deterministic import get_seed
+from garage.sampler.sampler import Sampler
+from garage.sampler.worker_factory import WorkerFactory
+
+
+class MultiprocessingSampler(Sampler):
+    """Sampler that splits the parallel rollouts of a VectorWorker across
+    processes.
+
+    Each of the `n_workers` processes owns a shard of the `n_parallel`
+    rollouts of the environment, and seeds its own random number generators
+    with `seed + worker_number`, so every process samples its own model
+    parameters. The policy parameters live in shared memory: an agent update
+    is copied into them once, and each process loads them before its next
+    rollout. Finished episodes are sent back through `torch.multiprocessing`
+    queues, which move tensors through shared memory instead of pickling
+    their contents.
+
+    Every process samples one vectorised rollout of its shard per round, so a
+    round gives the same episodes as one `VectorWorker.rollout` over all
+    `n_parallel` rollouts.
+
+    A batch received from a process keeps one file descriptor open per
+    tensor for as long as it lives in shared memory. Each round is therefore
+    copied out of shared memory as soon as it is received, so only the
+    batches of one round, a dozen or so descriptors per process, are open
+    at a time, however many rounds a call to `obtain_samples` takes.
+
+    The sampler raises a RuntimeError instead of waiting forever when a
+    process dies, e.g. while it is spawned or from an error in a rollout.
+
+    Args:
+        agents (Policy): Agent to use to sample episodes. It is copied to
+            every process.
+        envs (Environment): Environment from which episodes are sampled. It
+            is copied to every process.
+        worker_factory (WorkerFactory): Pickleable factory for creating
+            workers. Its workers must implement `set_n_parallel`, like
+            `VectorWorker`. Either this param or params after this are
+            required to construct a sampler.
+        max_episode_length(int): Params used to construct a worker factory.
+            The maximum length episodes which will be sampled.
+        is_tf_worker (bool): Whether it is workers for TFTrainer.
+        seed(int): The seed to use to initialize random number generators.
+        n_workers(int): The number of processes to use. It is capped at the
+            `n_parallel` of the environment.
+        worker_class(type): Class of the workers.
+        worker_args (dict or None): Additional arguments that should be passed
+            to the worker.
+        start_method (str): Start method of the processes. 'spawn' is safe
+            when CUDA is initialised in the main process.
+        poll_interval (float): Seconds between checks that the processes are
+            alive while waiting for their episodes.
+
+    """
+
+    def __init__(
+            self,
+            agents,
+            envs,
+            *,  # After this require passing by keyword.
+            worker_factory=None,
+            max_episode_length=None,
+            is_tf_worker=False,
+            seed=get_seed(),
+            n_workers=psutil.cpu_count(logical=False),
+            worker_class=VectorWorker,
+            worker_args=None,
+            start_method='spawn',
+            poll_interval=1.):
+        # pylint: disable=super-init-not-called
+        if worker_factory is None and max_episode_length is None:
+            raise TypeError('Must construct a sampler from WorkerFactory or'
+                            'parameters (at least max_episode_length)')
+        n_parallel = envs.n_parallel
+        if isinstance(worker_factory, WorkerFactory):
+            self._factory = worker_factory
+        else:
+            self._factory = WorkerFactory(
+                max_episode_length=max_episode_length,
+                is_tf_worker=is_tf_worker,
+                seed=seed,
+                n_workers=min(n_workers, n_parallel),
+                worker_class=worker_class,
+                worker_args=worker_args)
+        n_workers = self._factory.n_workers
+        self._shards = [n_parallel // n_workers + (i < n_parallel % n_workers)
+                        for i in range(n_workers)]
+        if min(self._shards) == 0:
+            raise ValueError('Cannot split {} parallel rollouts across {} '
+                             'workers.'.format(n_parallel, n_workers))
+        self._agent = agents
+        self._env = envs
+        self._start_method = start_method
+        self._poll_interval = poll_interval
+        self._params = {
+            k: v.detach().to('cpu', copy=True).share_memory_()
+            for k, v in agents.state_dict().items()
+        }
+        self._agent_version = 0
+        self._start_workers()
+        self.total_env_steps = 0
+
+    @classmethod
+    def from_worker_factory(cls, worker_factory, agents, envs):
+        """Construct this sampler.
+
+        Args:
+            worker_factory (WorkerFactory): Pickleable factory for creating
+                workers. Should be transmitted to other processes / nodes where
+                work needs to be done, then workers should be constructed
+                there.
+            agents (Agent): Agent to use to sample episodes.
+            envs (Environment): Environment from which episodes are sampled.
+
+        Returns:
+            Sampler: An instance of `cls`.
+
+        """
+        return cls(agents, envs, worker_factory=worker_factory)
+
+    def _start_workers(self):
+        """Start one process per shard of the parallel rollouts."""
+        ctx = mp.get_context(self._start_method)
+        self._to_sampler = ctx.Queue()
+        self._to_worker = [ctx.Queue() for _ in self._shards]
+        agent = cloudpickle.dumps(self._agent)
+        env = cloudpickle.dumps(self._env)
+        device = str(torch.empty(0).device)
+        self._workers = [
+            ctx.Process(target=run_worker,
+                        kwargs=dict(factory=self._factory,
+                                    to_worker=to_worker,
+                                    to_sampler=self._to_sampler,
+                                    worker_number=worker_number,
+                                    n_parallel=n_parallel,
+                                    agent=agent,
+                                    env=env,
+                                    params=self._params,
+                                    device=device),
+                        daemon=True)
+            for worker_number, (to_worker, n_parallel) in enumerate(
+                zip(self._to_worker, self._shards))
+        ]
+        for w in self._workers:
+            w.start()
+
+    def _update_params(self, agent_update):
+        """Copy an agent update into the shared policy parameters.
+
+        Args:
+            agent_update (dict or Policy or None): Parameters of the agent, as
+                returned by `Policy.get_param_values`, or the agent itself.
+
+        """
+        if agent_update is None:
+            return
+        if not isinstance(agent_update, dict):
+            agent_update = agent_update.state_dict()
+        with torch.no_grad():
+            for k, v in agent_update.items():
+                self._params[k].copy_(v)
+        self._agent_version += 1
+
+    def _rollout_round(self, n_rollouts, env_updates):
+        """Sample `n_rollouts` rollouts of every shard.
+
+        Args:
+            n_rollouts (int): Number of vectorised rollouts per process.
+            env_updates (list): One environment update per process.
+
+        Returns:
+            list[EpisodeBatch]: The batch of each process, in worker order.
+
+        """
+        for to_worker, env_up in zip(self._to_worker, env_updates):
+            to_worker.put(('rollout',
+                           (self._agent_version, n_rollouts, env_up)))
+        batches = [None] * len(self._workers)
+        for _ in self._workers:
+            worker_number, batch = self._receive()
+            batches[worker_number] = batch
+        return batches
+
+    def _receive(self):
+        """Wait for the next batch of a process.
+
+        Returns:
+            tuple[int, EpisodeBatch]: The number of the process and its batch.
+
+        Raises:
+            RuntimeError: If a process died.
+
+        """
+        while True:
+            try:
+                return self._to_sampler.get(timeout=self._poll_interval)
+            except queue.Empty:
+                pass
+            for worker_number, w in enumerate(self._workers):
+                if not w.is_alive():
+                    raise RuntimeError(
+                        'Sampler process {} exited with code {}'.format(
+                            worker_number, w.exitcode))
+
+    def obtain_samples(self, itr, num_samples, agent_update, env_update=None):
+        """Collect at least a given number transitions (timesteps).
+
+        Args:
+            itr(int): The current iteration number. Using this argument is
+                deprecated.
+            num_samples (int): Minimum number of transitions / timesteps to
+                sample.
+            agent_update (object): Parameters of the agent, as returned by
+                `Policy.get_param_values`, or the agent itself.
+            env_update (object): Value which will be passed into the
+                `env_update_fn` before sampling episodes. If a list is passed
+                in, it must have length exactly `factory.n_workers`, and will
+                be spread across the workers.
+
+        Returns:
+            EpisodeBatch: The batch of collected episodes.
+
+        """
+        self._update_params(agent_update)
+        env_updates = self._factory.prepare_worker_messages(
+            env_update, preprocess=copy.deepcopy)
+        batches = []
+        completed_samples = 0
+        while completed_samples < num_samples:
+            # concatenating copies the round out of shared memory
+            round_batch = EpisodeBatch.concatenate(
+                *self._rollout_round(1, env_updates))
+            env_updates = [None] * len(self._workers)
+            completed_samples += len(round_batch.actions)
+            batches.append(round_batch)
+        samples = EpisodeBatch.concatenate(*batches)
+        self.total_env_steps += sum(samples.lengths)
+        return samples
+
+    def obtain_exact_episodes(self,
+                              n_eps_per_worker,
+                              agent_update,
+                              env_update=None):
+        """Sample an exact number of vectorised rollouts per worker.
+
+        Args:
+            n_eps_per_worker (int): Exact number of vectorised rollouts to
+                gather for each worker.
+            agent_update (object): Parameters of the agent, as returned by
+                `Policy.get_param_values`, or the agent itself.
+            env_update (object): Value which will be passed into the
+                `env_update_fn` before samplin episodes. If a list is passed
+                in, it must have length exactly `factory.n_workers`, and will
+                be spread across the workers.
+
+        Returns:
+            EpisodeBatch: Batch of gathered episodes. Always in worker
+                order. In other words, first all episodes from worker 0,
+                then all episodes from worker 1, etc.
+
+        """
+        self._update_params(agent_update)
+        env_updates = self._factory.prepare_worker_messages(
+            env_update, preprocess=copy.deepcopy)
+        batches = self._rollout_round(n_eps_per_worker, env_updates)
+        samples = EpisodeBatch.concatenate(*batches)
+        self.total_env_steps += sum(samples.lengths)
+        return samples
+
+    def shutdown_worker(self):
+        """Shutdown the worker processes."""
+        for to_worker in self._to_worker:
+            to_worker.put(('exit', None))
+        for w in self._workers:
+            w.join()
+        self._workers = []
+
+    def __getstate__(self):
+        """Get the pickle state.
+
+        Returns:
+            dict: The pickled state.
+
+        """
+        return dict(factory=self._factory,
+                    agent=self._agent,
+                    env=self._env,
+                    start_method=self._start_method,
+                    poll_interval=self._poll_interval)
+
+    def __setstate__(self, state):
+        """Unpickle the state.
+
+        Args:
+            state (dict): Unpickled state.
+
+        """
+        self.__init__(state['agent'],
+                      state['env'],
+                      worker_factory=state['factory'],
+                      start_method=state['start_method'],
+                      poll_interval=state.get('poll_interval', 1.))
+
+
+def run_worker(factory, to_worker, to_sampler, worker_number, n_parallel,
+               agent, env, params, device):
+    """Run a worker process until it receives the "exit" message.
+
+    On a "rollout" message it loads the shared policy parameters if they
+    changed, applies the environment update, samples the requested number of
+    vectorised rollouts of its shard and sends them back as one batch.
+
+    Args:
+        factory (WorkerFactory): Pickleable factory for creating workers.
+        to_worker (multiprocessing.Queue): Queue to send commands to the
+            worker.
+        to_sampler (multiprocessing.Queue): Queue to send episodes back to the
+            sampler.
+        worker_number (int): Number of this worker.
+        n_parallel (int): Number of parallel rollouts in the shard of this
+            worker.
+        agent (bytes): Cloudpickled agent.
+        env (bytes): Cloudpickled environment.
+        params (dict[str, torch.Tensor]): Shared policy parameters.
+        device (str): Default torch device of the main process.
+
+    """
+    # one thread per process, otherwise the processes fight over the cores
+    torch.set_num_threads(1)
+    torch.set_default_device(device)
+    inner_worker = factory(worker_number)
+    inner_worker.set_n_parallel(n_parallel)
+    inner_worker.update_agent(cloudpickle.loads(agent))
+    inner_worker.update_env(cloudpickle.loads(env))
+    version = 0
+
+    while True:
+        tag, contents = to_worker.get()
+        if tag == 'rollout':
+            agent_version, n_rollouts, env_update = contents
+            if agent_version != version:
+                inner_worker.update_agent(params)
+                version = agent_version
+            inner_worker.update_env(env_update)
+            batches = [inner_worker.rollout() for _ in range(n_rollouts)]
+            to_sampler.put((worker_number, EpisodeBatch.concatenate(*batches)))
+        elif tag == 'exit':
+            inner_worker.shutdown()
+            return
+        else:
+            raise AssertionError('Unknown tag {} with contents {}'.format(
+                tag, contents))
@@ -5,7 +5,6 @@ import time
 import numpy as np
 import torch
 
-from collections import defaultdict
 from garage.np import truncate_tensor_dict
 from torch.nn.functional import pad
 
@@ -21,6 +20,43 @@ def transpose_list(lst):
     return np.stack(lst).transpose()
 
 
+def write_step(buffers, key, value, step, n_parallel, max_length):
+    """Write one time step of a vectorised rollout into a preallocated
+    buffer.
+
+    `buffers[key]` is allocated on first use with shape
+    (n_parallel, max_length, ...), so a rollout is assembled in place
+    instead of being stacked from per-step lists. Non-tensor values are
+    broadcast across the parallel rollouts as floats.
+
+    Args:
+        buffers (dict[str, torch.Tensor]): Rollout buffers, by key.
+        key (str): Buffer to write to.
+        value (torch.Tensor or float): Value of shape (n_parallel, ...), or
+            a scalar.
+        step (int): Time step to write.
+        n_parallel (int): Number of parallel rollouts.
+        max_length (int): Maximum length of a rollout.
+
+    """
+    value = torch.as_tensor(value)
+    if key not in buffers:
+        dtype = value.dtype if value.dim() else torch.get_default_dtype()
+        buffers[key] = torch.empty(
+            (n_parallel, max_length) + value.shape[1:],
+            dtype=dtype, device=value.device)
+    buffers[key][:, step] = value
+
+
+def flatten_episodes(buffer, length):
+    """Flatten an (n_parallel, max_length, ...) rollout buffer to
+    (n_parallel * length, ...), one episode after the other.
+
+    This is a view when the rollouts filled the whole buffer.
+    """
+    return buffer[:, :length].flatten(0, 1)
+
+
 def rollout(env,
             agent,
             *,
@@ -62,19 +98,23 @@ def rollout(env,
             * dones(torch.Tensor): Array of termination signals.
 
     """
-    observations = []
-    actions = []
-    rewards = []
-    agent_infos = defaultdict(list)
-    env_infos = defaultdict(list)
-    dones = []
+    steps = {}
+    agent_infos = {}
+    env_infos = {}
     o, _ = env.reset(n_parallel=n_parallel)
     agent.reset()
+    incremental = callable(getattr(agent, 'get_actions_incremental', None))
     path_length = 0
     if animated:
         env.render()
     while path_length < (max_path_length or np.inf):
-        a, agent_info = agent.get_actions(o)
+        if incremental:
+            # only the newest history row has not been pooled yet
+            start = max(path_length - 1, 0)
+            a, agent_info = agent.get_actions_incremental(
+                o[:, start:path_length])
+        else:
+            a, agent_info = agent.get_actions(o)
         if deterministic and 'mean' in agent_info:
             a = agent_info['mean']
         a_shape = (n_parallel,) + env.action_space.shape[1:]
@@ -83,17 +123,18 @@ def rollout(env,
         d, env_info = env_step.terminal, env_step.env_info
         d = d * torch.ones_like(r)
         o = pad(o, (0, 0, 0, max_path_length - path_length, 0, 0))
-        observations.append(o)
-        rewards.append(r)
-        actions.append(a)
+        for key, value in [('observations', o), ('rewards', r),
+                           ('actions', a), ('dones', d)]:
+            write_step(steps, key, value, path_length, n_parallel,
+                       max_path_length)
         for k, v in agent_info.items():
-            agent_infos[k].append(v)
+            write_step(agent_infos, k, v, path_length, n_parallel,
+                       max_path_length)
         for k, v in env_info.items():
             if hasattr(v, 'shape'):
-                env_infos[k].append(v.squeeze())
-            else:
-                env_infos[k].append([v] * n_parallel)
-        dones.append(d)
+                v = v.squeeze()
+            write_step(env_infos, k, v, path_length, n_parallel,
+                       max_path_length)
         path_length += 1
         if env_step.terminal:
             break
@@ -104,26 +145,16 @@ def rollout(env,
             time.sleep(timestep / speedup)
 
     for k, v in agent_infos.items():
-        agent_infos[k] = torch.cat(torch.split(torch.stack(v, dim=1), 1), dim=1
-                                   ).squeeze(0)
+        agent_infos[k] = flatten_episodes(v, path_length)
     for k, v in env_infos.items():
-        if torch.is_tensor(v[0]):
-            env_infos[k] = torch.cat(
-                torch.split(torch.stack(v, dim=1), 1), dim=1).squeeze(0)
-        else:
-            env_infos[k] = torch.cat(
-                torch.split(torch.as_tensor(v), 1), dim=1).squeeze(0)
+        env_infos[k] = flatten_episodes(v, path_length)
     return dict(
-        observations=torch.cat(
-            torch.split(torch.stack(observations, dim=1), 1), dim=1).squeeze(0),
-        actions=torch.cat(
-            torch.split(torch.stack(actions, dim=1), 1), dim=1).squeeze(0),
-        rewards=torch.cat(
-            torch.split(torch.stack(rewards, dim=1), 1), dim=1).squeeze(0),
+        observations=flatten_episodes(steps['observations'], path_length),
+        actions=flatten_episodes(steps['actions'], path_length),
+        rewards=flatten_episodes(steps['rewards'], path_length),
         agent_infos=agent_infos,
         env_infos=env_infos,
-        dones=torch.cat(
-            torch.split(torch.stack(dones, dim=1), 1), dim=1).squeeze(0),
+        dones=flatten_episodes(steps['dones'], path_length),
     )
 
 
@@ -1,9 +1,8 @@
 """A worker class for environments that receive a vector of actions and return a
  vector of states. Not to be confused with vec_worker, which handles a vector of
  environments."""
-from collections import defaultdict
-
 from pyro import EpisodeBatch
+from pyro.sampler.utils import flatten_episodes, write_step
 from garage.sampler.default_worker import DefaultWorker
 
 import torch
@@ -20,17 +19,25 @@ class VectorWorker(DefaultWorker):
                          max_episode_length=max_episode_length,
                          worker_number=worker_number)
         self._n_parallel = None
+        self._shard_size = None
         self._prev_mask = None
-        self._masks = []
+        self._incremental = False
         self._last_masks = []
-        self._rewards = []
-        self._actions = []
-        self._terminals = []
-        self._env_infos = defaultdict(list)
+        # (n_parallel, max_episode_length, ...) buffers of the rollout
+        self._steps = {}
+        self._agent_infos = {}
+        self._env_infos = {}
 
     def update_env(self, env_update):
         super().update_env(env_update)
-        self._n_parallel = self.env.n_parallel
+        self._n_parallel = self._shard_size or self.env.n_parallel
+
+    def set_n_parallel(self, n_parallel):
+        """Sample `n_parallel` rollouts at a time instead of the
+        `n_parallel` of the env, e.g. a shard of them in one of several
+        processes."""
+        self._shard_size = n_parallel
+        self._n_parallel = n_parallel
 
     def pad_observation(self, obs):
         pad_shape = list(obs.shape)
@@ -42,6 +49,17 @@ class VectorWorker(DefaultWorker):
              torch.zeros_like(pad, dtype=torch.bool)], dim=1)[..., :1]
         return padded_obs, mask
 
+    def write_observation(self, obs):
+        """Copy the newest history row of `obs` into the padded observation
+        and validity mask kept for the current rollout, in place."""
+        t = obs.shape[1] - 1
+        self._prev_obs[:, t] = obs[:, t]
+        self._prev_mask[:, t] = True
+
+    def _write_step(self, buffers, key, value):
+        """Write `value` into the current time step of `buffers[key]`."""
+        write_step(buffers, key, value, self._path_length, self._n_parallel,
+                   self._max_episode_length)
 
     def start_rollout(self):
         """Begin a new rollout."""
@@ -49,6 +67,8 @@ class VectorWorker(DefaultWorker):
         self._prev_obs, _ = self.env.reset(n_parallel=self._n_parallel)
         self._prev_obs, self._prev_mask = self.pad_observation(self._prev_obs)
         self.agent.reset()
+        self._incremental = callable(
+            getattr(self.agent, 'get_actions_incremental', None))
 
     def step_rollout(self, deterministic):
         """Take a vector of time-steps in the current rollout
@@ -58,29 +78,34 @@ class VectorWorker(DefaultWorker):
             indicating termination or due to reaching `max_episode_length`.
         """
         if self._path_length < self._max_episode_length:
-            a, agent_info = self.agent.get_actions(
-                self._prev_obs, self._prev_mask)
+            if self._incremental:
+                # only the row written after the previous step is new
+                start = max(self._path_length - 1, 0)
+                a, agent_info = self.agent.get_actions_incremental(
+                    self._prev_obs[:, start:self._path_length],
+                    self._prev_mask[:, start:self._path_length])
+            else:
+                a, agent_info = self.agent.get_actions(
+                    self._prev_obs, self._prev_mask)
             if deterministic and 'mean' in agent_info:
                 a = agent_info['mean']
             a_shape = (self._n_parallel,) + self.env.action_space.shape[1:]
             env_step = self.env.step(a.reshape(a_shape))
             next_o, r = env_step.observation, env_step.reward
             d, env_info = env_step.terminal, env_step.env_info
-            self._observations.append(self._prev_obs)
-            self._rewards.append(r)
-            self._actions.append(a)
+            self._write_step(self._steps, 'observations', self._prev_obs)
+            self._write_step(self._steps, 'rewards', r)
+            self._write_step(self._steps, 'actions', a)
             for k, v in agent_info.items():
-                self._agent_infos[k].append(v)
+                self._write_step(self._agent_infos, k, v)
             for k, v in env_info.items():
-                self._env_infos[k].append(v)
-            self._masks.append(self._prev_mask)
-            self._path_length += 1
+                self._write_step(self._env_infos, k, v)
+            self._write_step(self._steps, 'masks', self._prev_mask)
             # TODO: make sure we want to use step_Type and not simply booleans
-            self._terminals.append(d * torch.ones_like(r))
+            self._write_step(self._steps, 'terminals', d * torch.ones_like(r))
+            self._path_length += 1
             if not env_step.terminal:
-                next_o, next_mask = self.pad_observation(next_o)
-                self._prev_obs = next_o
-                self._prev_mask = next_mask
+                self.write_observation(next_o)
                 return False
         self._lengths = self._path_length * torch.ones(self._n_parallel,
                                                        dtype=torch.int)
@@ -92,67 +117,37 @@ class VectorWorker(DefaultWorker):
         """Collect the current rollout of vectors, convert it to a vector of
         rollouts, and clear the internal buffer
 
+        The rollout was written into (n_parallel, max_episode_length, ...)
+        buffers during `step_rollout`, so each field is just flattened to
+        (n_parallel * length, ...), without copying when the episodes ran
+        to `max_episode_length`.
+
         Returns:
             garage.EpisodeBatch: A batch of the episodes completed since
                 the last call to collect_rollout().
         """
-        observations = torch.cat(
-            torch.split(torch.stack(self._observations, dim=1), 1),
-            dim=1
-        ).squeeze(0)
-        self._observations = []
+        length = self._path_length
+        steps = {k: flatten_episodes(v, length)
+                 for k, v in self._steps.items()}
+        agent_infos = {k: flatten_episodes(v, length)
+                       for k, v in self._agent_infos.items()}
+        env_infos = {k: flatten_episodes(v, length)
+                     for k, v in self._env_infos.items()}
+        self._steps = {}
+        self._agent_infos = {}
+        self._env_infos = {}
         last_observations = torch.cat(self._last_observations)
         self._last_observations = []
-        masks = torch.cat(
-            torch.split(torch.stack(self._masks, dim=1), 1),
-            dim=1
-        ).squeeze(0)
-        self._masks = []
         last_masks = torch.cat(self._last_masks)
         self._last_masks = []
-        actions = torch.cat(
-            torch.split(torch.stack(self._actions, dim=1), 1),
-            dim=1
-        ).squeeze(0)
-        self._actions = []
-        rewards = torch.cat(
-            torch.split(torch.stack(self._rewards, dim=1), 1),
-            dim=1
-        ).squeeze(0)
-        self._rewards = []
-        terminals = torch.cat(
-            torch.split(torch.stack(self._terminals, dim=1), 1),
-            dim=1
-        ).squeeze(0)
-        self._terminals = []
-        env_infos = self._env_infos
-        self._env_infos = defaultdict(list)
-        agent_infos = self._agent_infos
-        self._agent_infos = defaultdict(list)
-        for k, v in agent_infos.items():
-            agent_infos[k] = torch.cat(
-                torch.split(torch.stack(v, dim=1), 1),
-                dim=1
-            ).squeeze(0)
-        zs = torch.zeros((self._n_parallel, self._lengths[0]))
-        for k, v in env_infos.items():
-            if torch.is_tensor(v[0]):
-                env_infos[k] = torch.cat(
-                    torch.split(torch.stack(v, dim=1), 1),
-                    dim=1
-                ).squeeze(0)
-            else:
-                env_infos[k] = torch.cat(
-                    torch.split(torch.as_tensor(v).float() + zs, 1),
-                    dim=1
-                ).squeeze(0)
         lengths = self._lengths
         self._lengths = []
         episode_infos = dict()
-        return EpisodeBatch(self.env.spec, episode_infos, observations,
-                            last_observations, masks, last_masks, actions,
-                            rewards, dict(env_infos), dict(agent_infos),
-                            terminals, lengths)
+        return EpisodeBatch(self.env.spec, episode_infos,
+                            steps['observations'], last_observations,
+                            steps['masks'], last_masks, steps['actions'],
+                            steps['rewards'], env_infos, agent_infos,
+                            steps['terminals'], lengths)
 
     def rollout(self, deterministic=False):
         """Sample a single vectorised rollout of the agent in the environment.
@@ -0,0 +1,105 @@
+"""
+A script to time the imports of the entry points of the pyro package, and to
+catch regressions of the import time.
+
+Every module is imported `n_repeats` times, each time in a fresh
+interpreter, and the fastest import is reported along with the number of
+modules it loaded and which of the heavy optional dependencies, e.g.
+tensorflow or ray, it pulled in. With `--save` the times are written to a
+JSON file; with `--baseline` they are compared to such a file, and the
+script exits with an error if any import is more than `tolerance` slower
+than its baseline, or imports a heavy dependency that it did not.
+
+example:
+
+    python -m scripts.benchmark_import_time --save=import_times.json
+    python -m scripts.benchmark_import_time --baseline=import_times.json
+"""
+
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "pyro",
+    "pyro.envs",
+    "pyro.experiment",
+    "pyro.models.adaptive_experiment_model",
+    "pyro.envs.adaptive_design_env",
+    "pyro.algos.redq",
+    "pyro.experiment.trainer",
+]
+
+HEAVY = ["tensorflow", "ray", "mujoco_py", "dm_control", "metaworld"]
+
+TIME_IMPORT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, len(sys.modules), ','.join(heavy))
+"""
+
+
+def time_import(module, n_repeats):
+    best = None
+    for _ in range(n_repeats):
+        out = subprocess.run(
+            [sys.executable, "-c",
+             TIME_IMPORT.format(module=module, heavy=HEAVY)],
+            check=True, capture_output=True, text=True)
+        elapsed, n_modules, heavy = (out.stdout.strip().split("\n")[-1]
+                                     .split(" ") + [""])[:3]
+        if best is None or float(elapsed) < best["time"]:
+            best = dict(time=float(elapsed), n_modules=int(n_modules),
+                        heavy=[name for name in heavy.split(",") if name])
+    return best
+
+
+def main(modules, n_repeats, save, baseline, tolerance):
+    results = {}
+    print(f"{'module':<40}{'time (ms)':>12}{'modules':>10}  heavy")
+    for module in modules:
+        results[module] = time_import(module, n_repeats)
+        result = results[module]
+        print(f"{module:<40}{1e3 * result['time']:>12.1f}"
+              f"{result['n_modules']:>10}  {','.join(result['heavy'])}")
+    if save is not None:
+        with open(save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved import times to {save}")
+    if baseline is not None:
+        with open(baseline) as f:
+            reference = json.load(f)
+        regressions = []
+        for module, result in results.items():
+            if module not in reference:
+                continue
+            if result["time"] > (1 + tolerance) * reference[module]["time"]:
+                regressions.append(
+                    f"{module}: {1e3 * result['time']:.1f} ms against "
+                    f"{1e3 * reference[module]['time']:.1f} ms")
+            new_heavy = set(result["heavy"]) - set(reference[module]["heavy"])
+            if new_heavy:
+                regressions.append(
+                    f"{module}: now imports {', '.join(sorted(new_heavy))}")
+        if regressions:
+            print("import time regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print(f"no import time regressions against {baseline}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", default=",".join(MODULES),
+                        type=lambda s: s.split(","))
+    parser.add_argument("--n-repeats", default=5, type=int)
+    parser.add_argument("--save", default=None, type=str)
+    parser.add_argument("--baseline", default=None, type=str)
+    parser.add_argument("--tolerance", default=0.2, type=float)
+    args = parser.parse_args()
+    main(args.modules, args.n_repeats, args.save, args.baseline,
+         args.tolerance)
@@ -0,0 +1,115 @@
+"""
+A script to check the closed-form `log_likelihood` kernels of the Source,
+CES and Docking models against the traced likelihoods of their Pyro models,
+and to benchmark the steps per second of an AdaptiveDesignEnv with either.
+
+For every model, an episode of `budget` uniformly random designs is run in
+an AdaptiveDesignEnv with L contrastive samples, and at every step the
+log-likelihoods of the kernel are compared with `traced_likelihoods` on the
+same outcome, design and thetas. The env is then timed over `n_episodes`
+episodes with the kernel, as picked by `get_likelihoods`, and with the
+traced likelihoods, as before the kernels existed.
+
+example:
+
+    python -m scripts.benchmark_likelihood --l=1e5 --n-parallel=10
+"""
+
+
+import argparse
+import time
+
+import torch
+
+from pyro.envs.adaptive_design_env import AdaptiveDesignEnv
+from pyro.models.adaptive_experiment_model import CESModel, DockingModel, \
+    SourceModel
+from pyro.spaces.batch_box import BatchBox
+
+
+def make_envs(l, n_parallel, budget):
+    source_d, ces_d, docking_d = 2, 6, 1
+    return {
+        "source": AdaptiveDesignEnv(
+            BatchBox(low=-4., high=4., shape=(1, 1, 1, source_d)),
+            BatchBox(low=torch.as_tensor([-4.] * source_d + [-3.]),
+                     high=torch.as_tensor([4.] * source_d + [10.])),
+            SourceModel(n_parallel=n_parallel, d=source_d, k=2), budget, l),
+        "ces": AdaptiveDesignEnv(
+            BatchBox(low=0.01, high=100, shape=(1, 1, 1, ces_d)),
+            BatchBox(low=torch.zeros((ces_d + 1,)),
+                     high=torch.as_tensor([100.] * ces_d + [1.])),
+            CESModel(n_parallel=n_parallel, n_elbo_steps=1000,
+                     n_elbo_samples=10, d=ces_d), budget, l),
+        "docking": AdaptiveDesignEnv(
+            BatchBox(low=-75., high=0., shape=(1, 1, 1, docking_d)),
+            BatchBox(low=torch.as_tensor([-75.] * 2 * docking_d),
+                     high=torch.as_tensor([1.] * 2 * docking_d)),
+            DockingModel(n_parallel=n_parallel, d=docking_d), budget, l),
+    }
+
+
+def random_design(env, n_parallel):
+    low, high = env.action_space.low, env.action_space.high
+    return low + (high - low) * torch.rand((n_parallel,) + low.shape[1:])
+
+
+def validate(env, n_parallel, budget):
+    """Largest absolute and relative error of the kernel over an episode."""
+    env.reset(n_parallel)
+    abs_error, rel_error = 0., 0.
+    for _ in range(budget):
+        design = random_design(env, n_parallel)
+        y = env.model.run_experiment(design, env.theta0)
+        kernel = env.model.log_likelihood(y, design, env.thetas)
+        traced = env.model.traced_likelihoods(y, design, env.thetas)
+        assert kernel.shape == traced.shape, (kernel.shape, traced.shape)
+        error = (kernel - traced).abs()
+        finite = torch.isfinite(traced)
+        assert torch.equal(finite, torch.isfinite(kernel))
+        abs_error = max(abs_error, error[finite].max().item())
+        rel_error = max(rel_error, (error[finite] / traced[finite].abs()
+                                    .clamp(min=1.)).max().item())
+        env.step(design)
+    return abs_error, rel_error
+
+
+def steps_per_second(env, n_parallel, budget, n_episodes, seed):
+    torch.manual_seed(seed)
+    n_steps, elapsed = 0, 0.
+    for _ in range(n_episodes):
+        env.reset(n_parallel)
+        designs = [random_design(env, n_parallel) for _ in range(budget)]
+        start = time.perf_counter()
+        for design in designs:
+            env.step(design)
+        elapsed += time.perf_counter() - start
+        n_steps += budget
+    return n_steps / elapsed
+
+
+def main(l, n_parallel, budget, n_episodes, seed):
+    print(f"l={l} n_parallel={n_parallel} budget={budget}")
+    print(f"{'model':<10}{'max |err|':>12}{'max rel err':>14}"
+          f"{'traced steps/s':>16}{'kernel steps/s':>16}{'speedup':>10}")
+    for name, env in make_envs(l, n_parallel, budget).items():
+        torch.manual_seed(seed)
+        abs_error, rel_error = validate(env, n_parallel, budget)
+        kernel = steps_per_second(env, n_parallel, budget, n_episodes, seed)
+        # the likelihoods of the env before the kernels existed
+        env.model.get_likelihoods = env.model.traced_likelihoods
+        traced = steps_per_second(env, n_parallel, budget, n_episodes, seed)
+        print(f"{name:<10}{abs_error:>12.3e}{rel_error:>14.3e}"
+              f"{traced:>16.2f}{kernel:>16.2f}{kernel / traced:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--l", default="1e5", type=float)
+    parser.add_argument("--n-parallel", default="10", type=int)
+    parser.add_argument("--budget", default="10", type=int)
+    parser.add_argument("--n-episodes", default="3", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(l=int(args.l), n_parallel=args.n_parallel, budget=args.budget,
+         n_episodes=args.n_episodes, seed=args.seed)
@@ -0,0 +1,97 @@
+"""
+A script to benchmark ListBuffer against the list-of-rows storage it used to
+have, where every row of every key was a separate numpy array in a Python
+list.
+
+example:
+
+    python -m scripts.benchmark_list_buffer --capacity=1000000 --dim=8
+    --path-length=30 --batch-size=4096
+"""
+
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from pyro.replay_buffer import ListBuffer
+
+
+class _Rows(list):
+    """A Python list holding one numpy array per row."""
+
+    @property
+    def shape(self):
+        return (len(self),) + self[0].shape
+
+
+class LegacyListBuffer(ListBuffer):
+    """ListBuffer with its previous storage and sampling."""
+
+    def sample_transitions(self, batch_size, out=None):
+        idx = np.random.randint(self._transitions_stored, size=batch_size)
+        return {key: np.array([buf_arr[i] for i in idx])
+                for key, buf_arr in self._buffer.items()}
+
+    def _get_or_allocate_key(self, key, array):
+        buf_arr = self._buffer.get(key, None)
+        if buf_arr is None:
+            buf_arr = _Rows(np.zeros((self._capacity,) + array.shape[1:],
+                                     dtype=array.dtype))
+            self._buffer[key] = buf_arr
+        return buf_arr
+
+
+def nbytes(buffer):
+    total = 0
+    for buf_arr in buffer._buffer.values():
+        if isinstance(buf_arr, list):
+            total += sys.getsizeof(buf_arr)
+            total += sum(sys.getsizeof(row) for row in buf_arr)
+        else:
+            total += buf_arr.nbytes
+    return total
+
+
+def benchmark(buffer_cls, capacity, dim, path_length, batch_size, n_samples):
+    buffer = buffer_cls(capacity)
+    path = dict(observation=np.random.randn(path_length, dim),
+                action=np.random.randn(path_length, 1),
+                reward=np.random.randn(path_length, 1))
+    start = time.perf_counter()
+    for _ in range(capacity // path_length):
+        buffer.add_path(path)
+    fill_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n_samples):
+        buffer.sample_transitions(batch_size)
+    sample_time = (time.perf_counter() - start) / n_samples
+    return fill_time, sample_time, nbytes(buffer)
+
+
+def main(capacity, dim, path_length, batch_size, n_samples, seed):
+    print(f"capacity={capacity} dim={dim} path_length={path_length} "
+          f"batch_size={batch_size}")
+    print(f"{'buffer':<18}{'fill (s)':>12}{'sample (ms)':>14}{'MiB':>10}")
+    for buffer_cls in [LegacyListBuffer, ListBuffer]:
+        np.random.seed(seed)
+        fill_time, sample_time, size = benchmark(
+            buffer_cls, capacity, dim, path_length, batch_size, n_samples)
+        print(f"{buffer_cls.__name__:<18}{fill_time:>12.3f}"
+              f"{1e3 * sample_time:>14.3f}{size / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", default="1e6", type=float)
+    parser.add_argument("--dim", default="8", type=int)
+    parser.add_argument("--path-length", default="30", type=int)
+    parser.add_argument("--batch-size", default="4096", type=int)
+    parser.add_argument("--n-samples", default="20", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(capacity=int(args.capacity), dim=args.dim,
+         path_length=args.path_length, batch_size=args.batch_size,
+         n_samples=args.n_samples, seed=args.seed)
@@ -0,0 +1,107 @@
+"""
+A script to check a policy exported by `export_policy.py` against the
+snapshot it was exported from, and to compare their cold starts.
+
+The designs of the mean action of the snapshot policy, computed with the
+normalisation of the snapshot env as in `source.py`, are compared with those
+of the exported module on random histories of every length up to
+`max_length`. The cold start, i.e. the imports, the load and the first
+design, is timed in a fresh interpreter for each, `n_repeats` times.
+
+example:
+
+    python -m scripts.benchmark_policy_export \
+        --src=data/local/experiment/params.pkl --max-length=20
+"""
+
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+import torch
+
+from export_policy import export, find_normalized_env
+from propose_design import DesignProposer
+
+SNAPSHOT_COLD_START = """
+import time
+start = time.perf_counter()
+import joblib
+import torch
+data = joblib.load({src!r})
+pi, norm_env = data['algo'].policy, data['env']._env
+hist = torch.zeros((1, 0, {obs_dim}))
+act = pi.get_actions(norm_env._apply_normalize_obs(hist))[0]
+norm_env._scale_action(act)
+print(time.perf_counter() - start)
+"""
+
+EXPORTED_COLD_START = """
+import time
+start = time.perf_counter()
+import torch
+from propose_design import DesignProposer
+DesignProposer({dest!r})(torch.zeros((1, 0, {obs_dim})))
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(code, n_repeats):
+    times = []
+    for _ in range(n_repeats):
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True)
+        times.append(float(out.stdout.split()[-1]))
+    return 1e3 * min(times), 1e3 * sum(times) / len(times)
+
+
+def main(src, max_length, n_parallel, n_repeats, seed):
+    torch.manual_seed(seed)
+    data = joblib.load(src)
+    policy = data['algo'].policy
+    norm_env = find_normalized_env(data['env'])
+    with tempfile.TemporaryDirectory() as directory:
+        dest = os.path.join(directory, "policy.pt")
+        export(policy, norm_env, dest)
+        proposer = DesignProposer(dest)
+        obs_low = norm_env.observation_space.low.float().cpu()
+        obs_high = norm_env.observation_space.high.float().cpu()
+        max_err = 0.
+        for length in range(max_length + 1):
+            hist = obs_low + (obs_high - obs_low) * torch.rand(
+                n_parallel, length, proposer.obs_dim)
+            with torch.no_grad():
+                _, info = policy.get_actions(
+                    norm_env._apply_normalize_obs(hist))
+                expected = norm_env._scale_action(info['mean']).reshape(
+                    n_parallel, -1)
+            design = proposer(hist).reshape(n_parallel, -1)
+            max_err = max(max_err,
+                          (design - expected).abs().max().item())
+        print(f"max |exported - snapshot| design over histories of length "
+              f"0 to {max_length}: {max_err:.3g}")
+
+        print(f"{'cold start':>12}{'min (ms)':>12}{'mean (ms)':>12}")
+        for name, code in [
+                ("snapshot", SNAPSHOT_COLD_START.format(
+                    src=src, obs_dim=proposer.obs_dim)),
+                ("exported", EXPORTED_COLD_START.format(
+                    dest=dest, obs_dim=proposer.obs_dim))]:
+            best, mean = cold_start(code, n_repeats)
+            print(f"{name:>12}{best:>12.1f}{mean:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--src", type=str)
+    parser.add_argument("--max-length", default=20, type=int)
+    parser.add_argument("--n-parallel", default=10, type=int)
+    parser.add_argument("--n-repeats", default=5, type=int)
+    parser.add_argument("--seed", default=1, type=int)
+    args = parser.parse_args()
+    main(args.src, args.max_length, args.n_parallel, args.n_repeats,
+         args.seed)
@@ -0,0 +1,74 @@
+"""
+A script to validate the RK4 kernel of PreyModel against torchdiffeq, and to
+benchmark the throughput of the PreyModel likelihood with every solver.
+
+example:
+
+    python -m scripts.benchmark_prey_ode --l=1e5 --n-parallel=10
+"""
+
+
+import argparse
+import time
+
+import torch
+from torchdiffeq import odeint
+
+from pyro.models.adaptive_experiment_model import PreyModel, holling3, \
+    holling3_exact, holling_rk4
+
+
+def timeit(fn, n_repeats):
+    start = time.perf_counter()
+    for _ in range(n_repeats):
+        fn()
+    return (time.perf_counter() - start) / n_repeats
+
+
+def validate(model, thetas, max_design):
+    a = thetas["a"].flatten()
+    th = thetas["th"].flatten()
+    n0 = torch.randint(1, max_design + 1, a.shape).float()
+    reference = odeint(lambda t, n: holling3(a, th, t, n), n0,
+                       torch.tensor([0., model.tau]), method="rk4",
+                       options={'step_size': 1.})[-1]
+    rk4_error = (holling_rk4(holling3, a, th, n0, model.tau) -
+                 reference).abs().max()
+    exact_error = (holling3_exact(a, th, n0, model.tau) -
+                   reference).abs().median()
+    print(f"max |rk4 - torchdiffeq| = {rk4_error:.3e}")
+    print(f"median |exact - torchdiffeq| = {exact_error:.3e}")
+
+
+def main(l, n_parallel, max_design, n_repeats, seed):
+    torch.manual_seed(seed)
+    model = PreyModel(n_parallel=n_parallel)
+    thetas = model.sample_theta(l + 1)
+    design = torch.randint(1, max_design + 1, (n_parallel, 1, 1, 1)).float()
+    y = model.run_experiment(design, {k: v[0] for k, v in thetas.items()})
+
+    validate(model, thetas, max_design)
+    print(f"l={l} n_parallel={n_parallel}")
+    print(f"{'likelihood':<28}{'time (ms)':>12}{'thetas/s':>14}")
+    runs = [('traced, odeint', 'odeint', model.traced_likelihoods),
+            ('closed form, odeint', 'odeint', model.get_likelihoods),
+            ('closed form, rk4', 'rk4', model.get_likelihoods),
+            ('closed form, exact', 'exact', model.get_likelihoods)]
+    for name, solver, fn in runs:
+        model.solver = solver
+        elapsed = timeit(lambda: fn(y, design, thetas), n_repeats)
+        print(f"{name:<28}{1e3 * elapsed:>12.3f}"
+              f"{(l + 1) * n_parallel / elapsed:>14.3e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--l", default="1e5", type=float)
+    parser.add_argument("--n-parallel", default="10", type=int)
+    parser.add_argument("--max-design", default="300", type=int)
+    parser.add_argument("--n-repeats", default="10", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(l=int(args.l), n_parallel=args.n_parallel,
+         max_design=args.max_design, n_repeats=args.n_repeats,
+         seed=args.seed)
@@ -0,0 +1,65 @@
+"""
+A script to benchmark the samples of theta drawn at every reset of an
+AdaptiveDesignEnv, traced from the model with `sample_theta` or served by a
+`PriorBank`.
+
+example:
+
+    python -m scripts.benchmark_prior_bank --model=ces --l=1e5 --n-parallel=10
+"""
+
+
+import argparse
+import time
+
+import torch
+
+from pyro.models.adaptive_experiment_model import CESModel, DockingModel, \
+    PreyModel, SourceModel
+from pyro.models.prior_bank import PriorBank
+
+MODELS = {
+    'ces': CESModel,
+    'docking': DockingModel,
+    'prey': PreyModel,
+    'source': SourceModel,
+}
+
+
+def timeit(fn, n_repeats):
+    start = time.perf_counter()
+    for _ in range(n_repeats):
+        fn()
+    return (time.perf_counter() - start) / n_repeats
+
+
+def main(model_name, l, n_parallel, bank_size, bank_dir, n_repeats, seed):
+    torch.manual_seed(seed)
+    model = MODELS[model_name](n_parallel=n_parallel)
+    bank = PriorBank(model, bank_size, directory=bank_dir)
+    fill_time = timeit(bank.refill, 1)
+
+    print(f"model={model_name} l={l} n_parallel={n_parallel} "
+          f"bank_size={bank_size}")
+    print(f"{'operation':<28}{'time (ms)':>12}")
+    print(f"{'PriorBank fill':<28}{1e3 * fill_time:>12.3f}")
+    for name, fn in [('model.sample_theta', model.sample_theta),
+                     ('PriorBank.sample_theta', bank.sample_theta)]:
+        print(f"{name:<28}"
+              f"{1e3 * timeit(lambda: fn(l + 1), n_repeats):>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="ces", type=str,
+                        choices=list(MODELS))
+    parser.add_argument("--l", default="1e5", type=float)
+    parser.add_argument("--n-parallel", default="10", type=int)
+    parser.add_argument("--bank-size", default="1e7", type=float)
+    parser.add_argument("--bank-dir", default=None, type=str)
+    parser.add_argument("--n-repeats", default="10", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(model_name=args.model, l=int(args.l), n_parallel=args.n_parallel,
+         bank_size=int(args.bank_size), bank_dir=args.bank_dir,
+         n_repeats=args.n_repeats, seed=args.seed)
@@ -0,0 +1,77 @@
+"""
+A script to check the logsumexp of the rewards of an AdaptiveDesignEnv
+against `torch.logsumexp`, and to benchmark it across numbers of contrastive
+samples L.
+
+For every L, log-likelihoods of `n_steps` experiments are accumulated as in
+`AdaptiveDesignEnv.get_reward`, and the logsumexp over the contrastive
+samples after every step is compared with a float64 reference: the products
+and their logsumexp computed in float64 throughout. The log-likelihoods are
+regenerated from the seed for every run, so memory does not grow with
+n_steps.
+
+example:
+
+    python -m scripts.benchmark_reward --ls=1e3,1e4,1e5,1e6 --n-parallel=10
+"""
+
+
+import argparse
+import time
+
+import torch
+
+from pyro.envs.log_sum_exp import LogSumExpReducer
+
+
+def step_log_probs(l, n_parallel, n_steps, seed):
+    torch.manual_seed(seed)
+    for _ in range(n_steps):
+        yield torch.randn(l + 1, n_parallel) * 5 - 10
+
+
+def run(log_probs, reduce, dtype=torch.float32):
+    log_products, out, elapsed = None, [], 0.
+    for step in log_probs:
+        if log_products is None:
+            log_products = torch.zeros_like(step, dtype=dtype)
+        log_products += step
+        start = time.perf_counter()
+        out.append(reduce(log_products))
+        elapsed += time.perf_counter() - start
+    return torch.stack(out).double(), elapsed / len(out)
+
+
+def main(ls, n_parallel, n_steps, seed):
+    print(f"n_parallel={n_parallel} n_steps={n_steps}")
+    print(f"{'L':>10}{'reduction':>28}{'time (ms)':>12}"
+          f"{'max |err|':>12}")
+    for l in ls:
+        args = (l, n_parallel, n_steps, seed)
+        reference, _ = run(step_log_probs(*args),
+                           lambda x: torch.logsumexp(x, dim=0),
+                           dtype=torch.float64)
+        results = {}
+        for name, reduce in [
+                ('torch.logsumexp', lambda x: torch.logsumexp(x, dim=0)),
+                ('LogSumExpReducer', LogSumExpReducer()),
+                ('LogSumExpReducer float64',
+                 LogSumExpReducer(reduce_dtype=torch.float64))]:
+            results[name], elapsed = run(step_log_probs(*args), reduce)
+            error = (results[name] - reference).abs().max()
+            print(f"{l:>10}{name:>28}{1e3 * elapsed:>12.3f}{error:>12.3e}")
+        current = (results['LogSumExpReducer'] -
+                   results['torch.logsumexp']).abs().max()
+        print(f"{l:>10}{'float32 vs torch.logsumexp':>28}{'':>12}"
+              f"{current:>12.3e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ls", default="1e3,1e4,1e5,1e6", type=str)
+    parser.add_argument("--n-parallel", default="10", type=int)
+    parser.add_argument("--n-steps", default="30", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(ls=[int(float(l)) for l in args.ls.split(",")],
+         n_parallel=args.n_parallel, n_steps=args.n_steps, seed=args.seed)
@@ -0,0 +1,132 @@
+"""
+A script to benchmark how a VectorWorker assembles a vectorised rollout into
+the fields of an EpisodeBatch, against the per-step lists it used before.
+
+Both layouts are fed the same synthetic time steps of `n_parallel` rollouts
+of length `budget`: the padded history and mask the agent saw, the action,
+reward, terminal, the `mean` and `log_std` agent infos and a `y` env info.
+
+- lists: every step pads the new history with `torch.cat` and appends each
+  field to a Python list; the rollout is then assembled with
+  `torch.cat(torch.split(torch.stack(x, dim=1), 1), dim=1).squeeze(0)`.
+- buffers: every step writes the newest history row in place and each
+  field into a preallocated (n_parallel, budget, ...) buffer with
+  `write_step`; the rollout is assembled with `flatten_episodes`.
+
+The assembled fields of both layouts are checked to be equal.
+
+example:
+
+    python -m scripts.benchmark_rollout_assembly --n-parallel=1000 --budget=30
+"""
+
+
+import argparse
+import time
+
+import torch
+
+from pyro.sampler.utils import flatten_episodes, write_step
+
+
+def make_steps(n_parallel, budget, obs_dim, action_dim):
+    history = torch.randn(n_parallel, budget, obs_dim)
+    steps = [dict(action=torch.randn(n_parallel, action_dim),
+                  reward=torch.randn(n_parallel),
+                  mean=torch.randn(n_parallel, action_dim),
+                  log_std=torch.randn(n_parallel, action_dim),
+                  y=torch.randn(n_parallel))
+             for _ in range(budget)]
+    return history, steps
+
+
+def pad_observation(obs, budget):
+    pad_shape = list(obs.shape)
+    pad_shape[1] = budget - pad_shape[1]
+    pad = torch.zeros(pad_shape)
+    mask = torch.cat([torch.ones_like(obs, dtype=torch.bool),
+                      torch.zeros_like(pad, dtype=torch.bool)], dim=1)[..., :1]
+    return torch.cat([obs, pad], dim=1), mask
+
+
+def assemble(values):
+    return torch.cat(torch.split(torch.stack(values, dim=1), 1),
+                     dim=1).squeeze(0)
+
+
+def with_lists(history, steps, budget):
+    fields = {key: [] for key in ['observations', 'masks', 'actions',
+                                  'rewards', 'terminals', 'mean', 'log_std',
+                                  'y']}
+    obs, mask = pad_observation(history[:, :1], budget)
+    for t, step in enumerate(steps):
+        fields['observations'].append(obs)
+        fields['masks'].append(mask)
+        fields['actions'].append(step['action'])
+        fields['rewards'].append(step['reward'])
+        fields['terminals'].append(
+            float(t == budget - 1) * torch.ones_like(step['reward']))
+        for key in ['mean', 'log_std', 'y']:
+            fields[key].append(step[key])
+        if t < budget - 1:
+            obs, mask = pad_observation(history[:, :t + 2], budget)
+    return {key: assemble(values) for key, values in fields.items()}
+
+
+def with_buffers(history, steps, budget):
+    n_parallel = history.shape[0]
+    buffers = {}
+    obs, mask = pad_observation(history[:, :1], budget)
+    for t, step in enumerate(steps):
+        for key, value in [('observations', obs), ('masks', mask),
+                           ('actions', step['action']),
+                           ('rewards', step['reward']),
+                           ('terminals', float(t == budget - 1) *
+                            torch.ones_like(step['reward'])),
+                           ('mean', step['mean']),
+                           ('log_std', step['log_std']), ('y', step['y'])]:
+            write_step(buffers, key, value, t, n_parallel, budget)
+        if t < budget - 1:
+            obs[:, t + 1] = history[:, t + 1]
+            mask[:, t + 1] = True
+    return {key: flatten_episodes(buffer, budget)
+            for key, buffer in buffers.items()}
+
+
+def timeit(fn, n_repeats):
+    best = float('inf')
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n_parallel, budget, obs_dim, action_dim, n_repeats, seed):
+    torch.manual_seed(seed)
+    history, steps = make_steps(n_parallel, budget, obs_dim, action_dim)
+    reference = with_lists(history, steps, budget)
+    fields = with_buffers(history, steps, budget)
+    for key, value in reference.items():
+        assert torch.equal(fields[key], value), key
+    print(f"n_parallel={n_parallel} budget={budget} obs_dim={obs_dim} "
+          f"action_dim={action_dim}: fields are equal")
+    print(f"{'layout':<10}{'time (ms)':>12}{'speedup':>10}")
+    lists = timeit(lambda: with_lists(history, steps, budget), n_repeats)
+    buffers = timeit(lambda: with_buffers(history, steps, budget), n_repeats)
+    print(f"{'lists':<10}{1e3 * lists:>12.1f}{1.:>10.2f}")
+    print(f"{'buffers':<10}{1e3 * buffers:>12.1f}{lists / buffers:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-parallel", default="1000", type=int)
+    parser.add_argument("--budget", default="30", type=int)
+    parser.add_argument("--obs-dim", default="3", type=int)
+    parser.add_argument("--action-dim", default="2", type=int)
+    parser.add_argument("--n-repeats", default="10", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(n_parallel=args.n_parallel, budget=args.budget,
+         obs_dim=args.obs_dim, action_dim=args.action_dim,
+         n_repeats=args.n_repeats, seed=args.seed)
@@ -0,0 +1,155 @@
+"""
+A script to benchmark the REDQ gradient step with a history encoder shared
+by the policy and the critics against separate encoders, on the Source and
+CES configurations of the `Adaptive_*_REDQ` scripts.
+
+A replay buffer is filled once per configuration with episodes of a random
+policy, and every layout is then trained from the same buffer for
+`n_steps` gradient steps of `minibatch_size` transitions, after `n_warmup`
+untimed ones. The layouts are:
+
+- separate: every network has its own encoder (`--shared-encoder false`).
+- shared: one AdaptiveHistoryEncoder for the policy and the critics
+  (`--shared-encoder true`).
+- separate, fused / shared, fused: the same with the critics fused into an
+  EnsembleAdaptiveMLPQFunction (`--fused-ensemble true`).
+
+example:
+
+    python -m scripts.benchmark_shared_encoder --minibatch-size=4096 \
+        --ens-size=2 --n-steps=20
+"""
+
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from pyro.algos import REDQ
+from pyro.envs import AdaptiveDesignEnv, GymEnv, normalize
+from pyro.models.adaptive_experiment_model import CESModel, SourceModel
+from pyro.modules import AdaptiveHistoryEncoder
+from pyro.policies import AdaptiveTanhGaussianPolicy
+from pyro.q_functions.adaptive_mlp_q_function import AdaptiveMLPQFunction
+from pyro.q_functions.ensemble_adaptive_mlp_q_function import \
+    EnsembleAdaptiveMLPQFunction
+from pyro.replay_buffer import PathBuffer
+from pyro.sampler.local_sampler import LocalSampler
+from pyro.sampler.vector_worker import VectorWorker
+from pyro.spaces.batch_box import BatchBox
+
+LAYER_SIZE = 128
+
+LAYOUTS = [("separate", False, False), ("shared", True, False),
+           ("separate, fused", False, True), ("shared, fused", True, True)]
+
+
+def make_env(config, n_parallel, budget, n_cont_samples):
+    if config == "source":
+        d = 2
+        model = SourceModel(n_parallel=n_parallel, d=d, k=2)
+        design_space = BatchBox(low=-4., high=4., shape=(1, 1, 1, d))
+        obs_space = BatchBox(low=torch.as_tensor([-4.] * d + [-3.]),
+                             high=torch.as_tensor([4.] * d + [10.]))
+    else:
+        d = 6
+        model = CESModel(n_parallel=n_parallel, n_elbo_steps=1000,
+                         n_elbo_samples=10, d=d)
+        design_space = BatchBox(low=0.01, high=100, shape=(1, 1, 1, d))
+        obs_space = BatchBox(low=torch.zeros((d + 1,)),
+                             high=torch.as_tensor([100.] * d + [1.]))
+    return GymEnv(normalize(
+        AdaptiveDesignEnv(design_space, obs_space, model, budget,
+                          n_cont_samples),
+        normalize_obs=True))
+
+
+def make_networks(env, shared_encoder, fused_ensemble, ens_size):
+    encoder_args = dict(encoder_sizes=[LAYER_SIZE, LAYER_SIZE],
+                        encoder_nonlinearity=nn.ReLU,
+                        encoder_output_nonlinearity=None,
+                        encoding_dim=LAYER_SIZE // 2)
+    emitter_args = dict(emitter_sizes=[LAYER_SIZE, LAYER_SIZE],
+                        emitter_nonlinearity=nn.ReLU,
+                        emitter_output_nonlinearity=None)
+    encoder = None
+    if shared_encoder:
+        encoder = AdaptiveHistoryEncoder(env_spec=env.spec, **encoder_args)
+    policy = AdaptiveTanhGaussianPolicy(
+        env_spec=env.spec, init_std=np.sqrt(1 / 3), min_std=np.exp(-20.),
+        max_std=np.exp(0.), encoder=encoder, **encoder_args, **emitter_args)
+    if fused_ensemble:
+        qfs = EnsembleAdaptiveMLPQFunction(
+            env_spec=env.spec, ens_size=ens_size, encoder=encoder,
+            **encoder_args, **emitter_args)
+    else:
+        qfs = [AdaptiveMLPQFunction(env_spec=env.spec, encoder=encoder,
+                                    **encoder_args, **emitter_args)
+               for _ in range(ens_size)]
+    return policy, qfs
+
+
+def fill_buffer(env, n_transitions, budget, ens_size):
+    policy, _ = make_networks(env, False, False, ens_size)
+    sampler = LocalSampler(agents=policy, envs=env, max_episode_length=budget,
+                           worker_class=VectorWorker)
+    buffer = PathBuffer(capacity_in_transitions=n_transitions)
+    while buffer.n_transitions_stored < n_transitions:
+        buffer.add_episode_batch(
+            sampler.obtain_samples(0, n_transitions, policy))
+    return sampler, buffer
+
+
+def time_layout(env, sampler, buffer, shared_encoder, fused_ensemble, args):
+    policy, qfs = make_networks(env, shared_encoder, fused_ensemble,
+                                args.ens_size)
+    redq = REDQ(env_spec=env.spec, policy=policy, qfs=qfs,
+                replay_buffer=buffer, sampler=sampler,
+                gradient_steps_per_itr=1, min_buffer_size=1,
+                buffer_batch_size=args.minibatch_size, M=args.M,
+                discount=1., fixed_alpha=None)
+    for _ in range(args.n_warmup):
+        redq.train_once()
+    start = time.perf_counter()
+    for _ in range(args.n_steps):
+        redq.train_once()
+    return (time.perf_counter() - start) / args.n_steps
+
+
+def main(args):
+    torch.manual_seed(args.seed)
+    print(f"minibatch_size={args.minibatch_size} ens_size={args.ens_size} "
+          f"M={args.M} budget={args.budget}")
+    print(f"{'config':<10}{'layout':<20}{'ms/step':>10}{'speedup':>10}")
+    for config in args.configs:
+        env = make_env(config, args.n_parallel, args.budget,
+                       args.n_cont_samples)
+        sampler, buffer = fill_buffer(env, args.buffer_size, args.budget,
+                                      args.ens_size)
+        baseline = None
+        for name, shared_encoder, fused_ensemble in LAYOUTS:
+            elapsed = time_layout(env, sampler, buffer, shared_encoder,
+                                  fused_ensemble, args)
+            baseline = baseline or elapsed
+            print(f"{config:<10}{name:<20}{1e3 * elapsed:>10.1f}"
+                  f"{baseline / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", default="source,ces",
+                        type=lambda s: s.split(","))
+    parser.add_argument("--minibatch-size", default="4096", type=int)
+    parser.add_argument("--ens-size", default="2", type=int)
+    parser.add_argument("--M", default="2", type=int)
+    parser.add_argument("--budget", default="30", type=int)
+    parser.add_argument("--n-parallel", default="100", type=int)
+    parser.add_argument("--n-cont-samples", default="1000", type=int)
+    parser.add_argument("--buffer-size", default="30000", type=int)
+    parser.add_argument("--n-warmup", default="3", type=int)
+    parser.add_argument("--n-steps", default="20", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""
+A script to benchmark prioritised sampling with a SumTree against uniform
+sampling and against sampling with `np.random.choice`, which is O(N) per
+batch.
+
+example:
+
+    python -m scripts.benchmark_sum_tree --capacity=1000000 --batch-size=4096
+"""
+
+
+import argparse
+import time
+
+import numpy as np
+
+from pyro.replay_buffer import SumTree
+
+
+def timeit(fn, n_repeats):
+    start = time.perf_counter()
+    for _ in range(n_repeats):
+        fn()
+    return (time.perf_counter() - start) / n_repeats
+
+
+def main(capacity, batch_size, n_repeats, seed):
+    np.random.seed(seed)
+    priorities = np.random.exponential(size=capacity)
+    tree = SumTree(capacity)
+    build_time = timeit(lambda: tree.update(np.arange(capacity), priorities),
+                        1)
+
+    def sample_tree():
+        values = (np.arange(batch_size) + np.random.uniform(
+            size=batch_size)) * (tree.total / batch_size)
+        return tree.find(values)
+
+    def update_tree():
+        idx = np.random.randint(capacity, size=batch_size)
+        tree.update(idx, np.random.exponential(size=batch_size))
+
+    def sample_uniform():
+        return np.random.randint(capacity, size=batch_size)
+
+    def sample_choice():
+        return np.random.choice(capacity, size=batch_size,
+                                p=priorities / priorities.sum())
+
+    print(f"capacity={capacity} batch_size={batch_size}")
+    print(f"{'operation':<28}{'time (ms)':>12}")
+    print(f"{'SumTree build':<28}{1e3 * build_time:>12.3f}")
+    for name, fn in [('SumTree sample', sample_tree),
+                     ('SumTree update', update_tree),
+                     ('uniform randint', sample_uniform),
+                     ('np.random.choice with p', sample_choice)]:
+        print(f"{name:<28}{1e3 * timeit(fn, n_repeats):>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", default="1e6", type=float)
+    parser.add_argument("--batch-size", default="4096", type=int)
+    parser.add_argument("--n-repeats", default="100", type=int)
+    parser.add_argument("--seed", default="1", type=int)
+    args = parser.parse_args()
+    main(capacity=int(args.capacity), batch_size=args.batch_size,
+         n_repeats=args.n_repeats, seed=args.seed)
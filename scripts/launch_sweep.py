@@ -0,0 +1,223 @@
+"""
+A script to run a sweep of trials of one of the `Adaptive_*` experiment
+scripts in a pool of worker processes, as a replacement for launching one
+process per seed or configuration from a shell loop.
+
+The sweep is described by a JSON spec over the arguments of the `main`
+function of the script:
+
+    {
+        "script": "Adaptive_Source_REDQ",
+        "base": {"n_parallel": 100, "budget": 30, "n_rl_itr": 20001,
+                 "n_cont_samples": 100000, "bound_type": "lower"},
+        "grid": {"id": [1, 2, 3], "tau": [0.001, 0.005]},
+        "trials": [{"pi_lr": 0.0001}, {"pi_lr": 0.0003}]
+    }
+
+Every entry of `trials` (by default a single empty one) is combined with
+every point of the product of `grid`, on top of `base`. As on the command
+line of the scripts, `id` picks the seed from the `seeds` of the script and
+`bound_type` is one of "lower", "upper" or "terminal". Each trial logs to
+`<sweep_dir>/trials/<trial>/<attempt>`.
+
+Each worker imports the script once and runs its trials one after the
+other, with `threads_per_trial` torch threads and, when there are enough
+cores, pinned to cores of its own. The parent process appends a line per
+finished trial to `<sweep_dir>/results.jsonl`, with the trial arguments, its
+status and the last row of its `progress.csv`. Rerunning the same command
+skips the trials already done there and reruns the others, so a sweep
+resumes after a crash.
+
+With `--shared-prior-bank`, trials with a `prior_bank_size` and no
+`prior_bank_dir` share a memory-mapped PriorBank in
+`<sweep_dir>/prior_bank/<key>` with the trials that differ from them only by
+their seed. A shared pool is drawn once and never redrawn
+(`prior_bank_refresh=0`), so it should hold at least as many samples as a
+trial draws.
+
+example:
+
+    python -m scripts.launch_sweep --spec=sweep.json \
+        --sweep-dir=results/source_sweep --n-workers=4 --threads-per-trial=2
+"""
+
+
+import argparse
+import csv
+import hashlib
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+RESULTS_FILE = "results.jsonl"
+SEED_KEYS = ("id", "seed")
+
+
+def make_trials(spec):
+    grid = spec.get("grid", {})
+    names = sorted(grid)
+    trials = []
+    for trial in spec.get("trials", [{}]):
+        for values in itertools.product(*(grid[name] for name in names)):
+            args = dict(spec.get("base", {}))
+            args.update(trial)
+            args.update(zip(names, values))
+            trials.append(args)
+    return trials
+
+
+def trial_key(args, exclude=()):
+    canonical = json.dumps(
+        {k: v for k, v in args.items() if k not in exclude}, sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+
+def read_results(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a crashed sweep may be cut short
+                    continue
+                if result["status"] == "done":
+                    done.add(result["trial"])
+    return done
+
+
+def last_progress(log_dir):
+    path = os.path.join(log_dir, "progress.csv")
+    if not os.path.exists(path):
+        return None
+    row = None
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            pass
+    return row
+
+
+def init_worker(core_slots, threads_per_trial):
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads_per_trial)
+    cores = core_slots.get()
+    if cores is not None:
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(threads_per_trial)
+    torch.set_num_interop_threads(1)
+
+
+def run_trial(script, args, log_dir):
+    from dowel import logger
+    from pyro.envs.adaptive_design_env import LOWER, UPPER, TERMINAL
+    module = importlib.import_module(script)
+    kwargs = dict(args)
+    if "id" in kwargs:
+        kwargs["seed"] = module.seeds[kwargs.pop("id") - 1]
+    if isinstance(kwargs.get("bound_type"), str):
+        kwargs["bound_type"] = {"lower": LOWER, "upper": UPPER,
+                                "terminal": TERMINAL}[kwargs["bound_type"]]
+    kwargs["log_dir"] = log_dir
+    kwargs.setdefault("log_info", f"input params: {args}")
+    start = time.time()
+    try:
+        module.main(**kwargs)
+    except Exception:
+        # wrap_experiment only removes its log outputs when it returns
+        logger.remove_all()
+        return dict(status="failed", error=traceback.format_exc(),
+                    elapsed=time.time() - start)
+    return dict(status="done", elapsed=time.time() - start,
+                progress=last_progress(log_dir))
+
+
+def core_slots_for(n_workers, threads_per_trial):
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * n_workers
+    cores = sorted(os.sched_getaffinity(0))
+    if n_workers * threads_per_trial > len(cores):
+        return [None] * n_workers
+    return [set(cores[i * threads_per_trial:(i + 1) * threads_per_trial])
+            for i in range(n_workers)]
+
+
+def main(spec_file, sweep_dir, n_workers, threads_per_trial,
+         shared_prior_bank):
+    with open(spec_file) as f:
+        spec = json.load(f)
+    os.makedirs(sweep_dir, exist_ok=True)
+    with open(os.path.join(sweep_dir, "spec.json"), "w") as f:
+        json.dump(spec, f, indent=2)
+    results_path = os.path.join(sweep_dir, RESULTS_FILE)
+    done = read_results(results_path)
+
+    pending = []
+    for args in make_trials(spec):
+        trial = trial_key(args)
+        if trial in done:
+            continue
+        if shared_prior_bank and args.get("prior_bank_size", 0) > 0 and \
+                args.get("prior_bank_dir") is None:
+            bank_dir = os.path.join(sweep_dir, "prior_bank",
+                                    trial_key(args, SEED_KEYS))
+            # a shared pool is never redrawn, see PriorBank
+            args = dict(args, prior_bank_dir=bank_dir, prior_bank_reuse=True,
+                        prior_bank_refresh=0)
+        pending.append((trial, args))
+    print(f"{len(done)} trials done, {len(pending)} to run")
+    if not pending:
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    core_slots = ctx.Queue()
+    for cores in core_slots_for(n_workers, threads_per_trial):
+        core_slots.put(cores)
+    pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx,
+                               initializer=init_worker,
+                               initargs=(core_slots, threads_per_trial))
+    with pool, open(results_path, "a") as results:
+        futures = {}
+        for trial, args in pending:
+            # a trial rerun after a crash logs to a new attempt directory
+            trial_dir = os.path.join(sweep_dir, "trials", trial)
+            attempt = len(os.listdir(trial_dir)) \
+                if os.path.isdir(trial_dir) else 0
+            log_dir = os.path.join(trial_dir, str(attempt))
+            future = pool.submit(run_trial, spec["script"], args, log_dir)
+            futures[future] = (trial, args, log_dir)
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                trial, args, log_dir = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    # e.g. a worker killed by the OOM killer
+                    result = dict(status="failed",
+                                  error=traceback.format_exc())
+                result.update(trial=trial, script=spec["script"],
+                              args=args, log_dir=log_dir)
+                results.write(json.dumps(result, default=str) + "\n")
+                results.flush()
+                os.fsync(results.fileno())
+                print(f"trial {trial} {result['status']} "
+                      f"({len(futures)} remaining)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spec", type=str)
+    parser.add_argument("--sweep-dir", type=str)
+    parser.add_argument("--n-workers", default=1, type=int)
+    parser.add_argument("--threads-per-trial", default=1, type=int)
+    parser.add_argument("--shared-prior-bank", action="store_true")
+    args = parser.parse_args()
+    main(args.spec, args.sweep_dir, args.n_workers, args.threads_per_trial,
+         args.shared_prior_bank)
@@ -0,0 +1,54 @@
+"""
+A script to aggregate a column of one or more ResultsStores, e.g. the
+`.results` directories written by `source.py`, `ces.py`, `prey.py`,
+`SMC_prey.py` and `select_policy_env.py`, without loading them in memory.
+
+The count, mean, standard deviation and standard error of the column are
+printed for each combination of the `by` columns, e.g. the sPCE of each
+method at each step, across seeds and parallel runs.
+
+example:
+
+    python -m scripts.summarise_results --stores=run_outputs/source/exp.results \
+        --column=spce --by=typ,step
+"""
+
+
+import argparse
+
+import numpy as np
+
+from pyro.experiment.results_store import ResultsStore
+
+
+def main(stores, column, by):
+    summaries = {}
+    for directory in stores:
+        for key, stats in ResultsStore(directory).summarise(
+                column, by).items():
+            # merge the stores through their sums
+            count, total, total_sq = summaries.get(key, (0, 0., 0.))
+            summaries[key] = (
+                count + stats["count"],
+                total + stats["count"] * stats["mean"],
+                total_sq + stats["count"] * (stats["std"] ** 2
+                                             + stats["mean"] ** 2))
+    print("".join(f"{name:>16}" for name in [*by, "count", "mean", "std",
+                                              "se"]))
+    for key in sorted(summaries):
+        count, total, total_sq = summaries[key]
+        mean = total / count
+        std = np.sqrt(max(total_sq / count - mean ** 2, 0.))
+        print("".join(f"{str(value):>16}" for value in key)
+              + f"{count:>16}{mean:>16.4f}{std:>16.4f}"
+              f"{std / np.sqrt(count):>16.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=lambda s: s.split(","))
+    parser.add_argument("--column", default="spce", type=str)
+    parser.add_argument("--by", default="", type=lambda s: [
+        name for name in s.split(",") if name])
+    args = parser.parse_args()
+    main(args.stores, args.column, args.by)
@@ -8,6 +8,7 @@ import torch
 
 from time import time
 from pyro.envs.adaptive_design_env import LOWER, UPPER, TERMINAL
+from pyro.experiment.results_store import ResultsStore
 from pyro.util import set_seed
 
 from pyro.models.adaptive_experiment_model import SourceModel, CESModel
@@ -19,7 +20,8 @@ device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 if torch.cuda.is_available():
     torch.set_default_device(device)
 
-def make_source_env(d, k, n_parallel, budget, n_cont_samples, bound_type, true_model=None):
+def make_source_env(d, k, n_parallel, budget, n_cont_samples, bound_type, true_model=None,
+                    chunk_size=None):
     model = SourceModel(n_parallel=n_parallel, d=d, k=k)
     design_space = BatchBox(low=-4., high=4., shape=(1, 1, 1, d))
     obs_space = BatchBox(low=torch.as_tensor([-4.] * d + [-3.]), high=torch.as_tensor([4.] * d + [10.]))
@@ -29,11 +31,12 @@ def make_source_env(d, k, n_parallel, budget, n_cont_samples, bound_type, true_m
                 AdaptiveDesignEnv(
                     design_space, obs_space, model, budget,
                     n_cont_samples, true_model=true_model,
-                    bound_type=bound_type),
+                    bound_type=bound_type, chunk_size=chunk_size),
                     normalize_obs=True))
     return env
 
-def make_ces_env(d, n_parallel, budget, n_cont_samples, bound_type, true_model=None):
+def make_ces_env(d, n_parallel, budget, n_cont_samples, bound_type, true_model=None,
+                 chunk_size=None):
     model = CESModel(n_parallel=n_parallel, n_elbo_steps=1000, n_elbo_samples=10)
     design_space = BatchBox(low=0.01, high=100, shape=(1, 1, 1, d))
     obs_space = BatchBox(low=torch.zeros((d+1,)), high=torch.as_tensor([100.] * d + [1.]))
@@ -42,16 +45,16 @@ def make_ces_env(d, n_parallel, budget, n_cont_samples, bound_type, true_model=N
                 AdaptiveDesignEnv(
                     design_space, obs_space, model, budget,
                     n_cont_samples, true_model=true_model,
-                    bound_type=bound_type),
+                    bound_type=bound_type, chunk_size=chunk_size),
                     normalize_obs=True))
     return env
 
 def main(src, results, dest, n_contrastive_samples, n_parallel,
-         seq_length, edit_type, n_samples, seed, bound_type, env, source_d = 2, source_k = 2, ces_d = 6):
+         seq_length, edit_type, n_samples, seed, bound_type, env, source_d = 2, source_k = 2, ces_d = 6,
+         chunk_size=None):
     set_seed(seed)
     if edit_type != 'a' and edit_type != 'w':
         sys.exit(f"inadmissible edit_type: {edit_type}")
-    torch.set_printoptions(threshold=int(1e10))
     data = joblib.load(src)
     print(f"loaded data from {src}")
     if hasattr(data['algo'], '_sampler'):
@@ -60,9 +63,11 @@ def main(src, results, dest, n_contrastive_samples, n_parallel,
     algo = data['algo']
 
     if env.lower() == "source":
-        env = make_source_env(source_d, source_k, n_parallel, seq_length, n_contrastive_samples, bound_type)
+        env = make_source_env(source_d, source_k, n_parallel, seq_length, n_contrastive_samples, bound_type,
+                              chunk_size=chunk_size)
     elif env.lower() == "ces":
-        env = make_ces_env(ces_d, n_parallel, seq_length, n_contrastive_samples, bound_type)
+        env = make_ces_env(ces_d, n_parallel, seq_length, n_contrastive_samples, bound_type,
+                           chunk_size=chunk_size)
 
     pi = algo.policy
     # qf1, qf2 = algo._qf2, algo._qf2
@@ -130,8 +135,12 @@ def main(src, results, dest, n_contrastive_samples, n_parallel,
             for j in range(rep):
                 env.reset(n_parallel=n_parallel)
                 for k, v in theta0.items():
-                    env.env.thetas[k][0] = \
-                        v[j * n_parallel:(j + 1) * n_parallel]
+                    if env.env.chunk_size:
+                        env.env.theta0[k] = \
+                            v[j * n_parallel:(j + 1) * n_parallel]
+                    else:
+                        env.env.thetas[k][0] = \
+                            v[j * n_parallel:(j + 1) * n_parallel]
                 rewards.append([])
                 for i in range(seq_length):
                     y = ys[i]
@@ -158,8 +167,15 @@ def main(src, results, dest, n_contrastive_samples, n_parallel,
             src,
             str(sum_rewards.mean().item()),
             str(sum_rewards.std().item() / np.sqrt(sum_rewards.numel())),
-            str(cumsum_rewards.transpose(1, 0))
         ]) + "\n")
+    # one row per step, with the rewards of every sampled rollout
+    with ResultsStore(dest + '.results', shard_size=seq_length) as store:
+        if edit_type == 'w':
+            store.clear()
+        for step in range(seq_length):
+            store.append({'src': src, 'seed': seed, 'bound_type': bound_type,
+                          'step': step, 'reward': rewards[step],
+                          'cumsum_reward': cumsum_rewards[step]})
 
 
 if __name__ == "__main__":
@@ -179,9 +195,11 @@ if __name__ == "__main__":
     parser.add_argument("--source_d", default=2, type=int)
     parser.add_argument("--source_k", default=2, type=int)
     parser.add_argument("--ces_d", default=6, type=int)
+    parser.add_argument("--chunk_size", default=None, type=int)
     args = parser.parse_args()
     bound_type = {
         "lower": LOWER, "upper": UPPER, "terminal": TERMINAL}[args.bound_type]
     main(args.src, args.results, args.dest, args.n_contrastive_samples,
          args.n_parallel, args.seq_length, args.edit_type, args.n_samples,
-         args.seed, bound_type, env=args.env, source_d=args.source_d, source_k=args.source_k, ces_d=args.ces_d)
+         args.seed, bound_type, env=args.env, source_d=args.source_d, source_k=args.source_k, ces_d=args.ces_d,
+         chunk_size=args.chunk_size)
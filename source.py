@@ -6,7 +6,6 @@ import joblib
 import logging
 from torch.distributions import transform_to
 import os
-import pickle
 import pyro
 import pyro.contrib.gp as gp
 import pyro.distributions as dist
@@ -21,7 +20,10 @@ from pyro.contrib.oed.eig import elbo_learn, opt_eig_ape_loss
 from pyro.contrib.oed.differentiable_eig import differentiable_pce_eig
 from pyro.contrib.util import iter_plates_to_shape, lexpand
 from pyro.envs.adaptive_design_env import AdaptiveDesignEnv, UPPER, LOWER
+from pyro.experiment.results_store import ResultsStore
 from pyro.models.adaptive_experiment_model import SourceModel
+from pyro.models.smc_posterior import SMCPosterior
+from propose_design import DesignProposer
 from torch.distributions import Normal
 
 # TODO read from torch float spec
@@ -68,7 +70,7 @@ def neg_loss(loss):
 
 def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
          num_gradient_steps, num_samples, num_contrast_samples, num_acquisition,
-         loglevel, policy_src, post_eig):
+         loglevel, policy_src, post_eig, posterior, num_particles):
     numeric_level = getattr(logging, loglevel.upper(), None)
     if not isinstance(numeric_level, int):
         raise ValueError("Invalid log level: {}".format(loglevel))
@@ -79,12 +81,10 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
         experiment_name = output_dir + "{}".format(datetime.datetime.now().isoformat())
     else:
         experiment_name = output_dir + experiment_name
-    results_file = experiment_name + '.result_stream.pickle'
-    results_file = os.path.join(os.path.dirname(__file__), results_file)
-    try:
-        os.remove(results_file)
-    except OSError:
-        logging.info("File {} does not exist yet".format(results_file))
+    results_dir = os.path.join(os.path.dirname(__file__),
+                               experiment_name + '.results')
+    results_store = ResultsStore(results_dir, shard_size=num_steps)
+    results_store.clear()
     typs = typs.split(",")
 
     for typ in typs:
@@ -109,6 +109,9 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
         env_upper.reset(num_parallel)
         spce, snmc = 0, 0
         model = SourceModel(n_parallel=num_parallel)
+        if posterior == 'smc':
+            smc = SMCPosterior(SourceModel(n_parallel=num_parallel),
+                               num_particles=num_particles)
         init_entropy = dist.Normal(model.theta_mu, model.theta_sig).entropy()
         init_entropy = init_entropy.sum(dim=(-1, -2)).mean(dim=-1)
         true_theta = env_lower.theta0
@@ -161,19 +164,27 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
                 if step == 0:
                     # load policy
                     assert policy_src is not None, "no source found for policy"
-                    pi_data = joblib.load(policy_src)
-                    pi = pi_data['algo'].policy
-                    norm_env = pi_data['env']._env
+                    if policy_src.endswith(".pt"):
+                        # exported by export_policy.py
+                        proposer = DesignProposer(
+                            policy_src, device=torch.empty(0).device)
+                    else:
+                        proposer = None
+                        pi_data = joblib.load(policy_src)
+                        pi = pi_data['algo'].policy
+                        norm_env = pi_data['env']._env
                     hist = torch.zeros((num_parallel, 0, design_dim + 1))
                 else:
                     hist = torch.cat(
                         [d_stars.squeeze(-2), y_stars.transpose(1, 2)], dim=-1)
-                norm_hist = norm_env._apply_normalize_obs(hist)
-                act = pi.get_actions(norm_hist)[0]
+                if proposer is not None:
+                    d_star = proposer(hist, deterministic=False)
+                else:
+                    norm_hist = norm_env._apply_normalize_obs(hist)
+                    act = pi.get_actions(norm_hist)[0]
+                    d_star = norm_env._scale_action(act)
                 d_star = torch.reshape(
-                    norm_env._scale_action(act),
-                    (num_parallel, num_acquisition, 1, design_dim)
-                )
+                    d_star, (num_parallel, num_acquisition, 1, design_dim))
 
             elif typ == "rand":
                 d_star = -8 + 16 * torch.rand((num_parallel, num_acquisition, 1, design_dim))
@@ -198,17 +209,22 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
             # don't bother inferring posteriors for random designs
             if typ == 'pce' or post_eig:
                 t1 = time.time()
-                model.reset(num_parallel)
-                prior = model.make_model()
-
-                # pyro.set_rng_seed(10)
-                loss = elbo_learn(
-                    prior, d_stars, ["y"], ["theta"], elbo_n_samples, elbo_n_steps,
-                    partial(elboguide, dim=num_parallel), {"y": y_stars}, optim.Adam({"lr": elbo_lr})
-                )
+                if posterior == 'smc':
+                    smc.run_experiment(d_star, y_star)
+                    theta_mu, theta_var = smc.get_mean_and_variance("theta")
+                    theta_sig = theta_var.sqrt()
+                else:
+                    model.reset(num_parallel)
+                    prior = model.make_model()
+
+                    # pyro.set_rng_seed(10)
+                    loss = elbo_learn(
+                        prior, d_stars, ["y"], ["theta"], elbo_n_samples, elbo_n_steps,
+                        partial(elboguide, dim=num_parallel), {"y": y_stars}, optim.Adam({"lr": elbo_lr})
+                    )
+                    theta_mu = pyro.param("theta_mu").detach().data.clone()
+                    theta_sig = pyro.param("theta_sig").detach().data.clone()
                 logging.info(f'posterior learning time {time.time() - t1}')
-                theta_mu = pyro.param("theta_mu").detach().data.clone()
-                theta_sig = pyro.param("theta_sig").detach().data.clone()
                 model.theta_mu, model.theta_sig = theta_mu, theta_sig
 
                 logging.info(f"theta_mu {theta_mu}\ntheta_sig {theta_sig}")
@@ -227,12 +243,9 @@ def main(num_steps, num_parallel, experiment_name, typs, seed, lengthscale,
             logging.info(f"spce {spce} {spce.shape}")
             results['snmc'] = snmc
             logging.info(f"snmc {snmc} {snmc.shape}")
-            for key, val in results.items():
-                if hasattr(val, "cpu"):
-                    results[key] = val.cpu()
+            results_store.append(results)
 
-            with open(results_file, 'ab') as f:
-                pickle.dump(results, f)
+    results_store.close()
 
 
 if __name__ == "__main__":
@@ -253,7 +266,11 @@ if __name__ == "__main__":
     parser.add_argument("--post-eig", dest="post_eig",
                         action='store_true')
     parser.set_defaults(post_eig=False)
+    parser.add_argument("--posterior", default="elbo", type=str,
+                        choices=["elbo", "smc"])
+    parser.add_argument("--num-particles", default=1000, type=int)
     args = parser.parse_args()
     main(args.num_steps, args.num_parallel, args.name, args.typs, args.seed, args.lengthscale,
          args.num_gradient_steps, args.num_samples, args.num_contrast_samples, args.num_acquisition,
-         args.loglevel, args.policy_src, args.post_eig)
+         args.loglevel, args.policy_src, args.post_eig, args.posterior,
+         args.num_particles)